@@ -0,0 +1,40 @@
+"""ensure_spatial_indexes
+
+Revision ID: b7d2c4e81a90
+Revises: f91e0d8d3d28
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2c4e81a90'
+down_revision: Union[str, Sequence[str], None] = 'f91e0d8d3d28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column) pairs queried by /api/v1/spatial and the map tiles.
+# Index names follow GeoAlchemy2's idx_<table>_<column> convention, so tables
+# created with the automatic spatial index are left untouched.
+SPATIAL_COLUMNS = [
+    ('sensors', 'location'),
+    ('monitoring_facilities', 'location'),
+    ('hydrological_stations', 'location'),
+    ('chainage_coordinates', 'location'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column in SPATIAL_COLUMNS:
+        op.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} USING gist ({column})')
+        op.execute(f'ANALYZE {table}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The indexes may predate this revision (created by GeoAlchemy2), so they are kept.
+    pass
@@ -0,0 +1,31 @@
+"""add_facility_centerline
+
+Revision ID: c4a9e2f7d315
+Revises: b7d2c4e81a90
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a9e2f7d315'
+down_revision: Union[str, Sequence[str], None] = 'b7d2c4e81a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('monitoring_facilities', sa.Column('centerline', geoalchemy2.types.Geometry(geometry_type='LINESTRINGZ', srid=4549, from_text='ST_GeomFromEWKT', name='geometry', nullable=True), nullable=True))
+    op.add_column('monitoring_facilities', sa.Column('chainage_start', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('monitoring_facilities', 'chainage_start')
+    op.drop_column('monitoring_facilities', 'centerline')
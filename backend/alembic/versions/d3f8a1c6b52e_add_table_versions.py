@@ -0,0 +1,43 @@
+"""add_table_versions
+
+Revision ID: d3f8a1c6b52e
+Revises: c4a9e2f7d315
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.table_version import VERSIONED_TABLES, version_trigger_ddl
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f8a1c6b52e'
+down_revision: Union[str, Sequence[str], None] = 'c4a9e2f7d315'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The init revision runs create_all, which already creates this table and the triggers on fresh databases
+    if not sa.inspect(op.get_bind()).has_table('table_versions'):
+        op.create_table(
+            'table_versions',
+            sa.Column('table_name', sa.String(length=64), nullable=False),
+            sa.Column('version', sa.BigInteger(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+            sa.PrimaryKeyConstraint('table_name'),
+        )
+    for statement in version_trigger_ddl():
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in VERSIONED_TABLES:
+        op.execute(f'DROP TRIGGER IF EXISTS trg_{table}_version ON {table}')
+    op.execute('DROP FUNCTION IF EXISTS bump_table_version()')
+    op.drop_table('table_versions')
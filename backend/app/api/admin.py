@@ -4,6 +4,8 @@ Admin API endpoints for data management with pagination, filtering, and CRUD ope
 from typing import Optional, Generic, TypeVar, List, Any
 from datetime import datetime
 from fastapi import APIRouter, Query, HTTPException, Depends
+import shapely
+from geoalchemy2 import WKTElement
 from pydantic import BaseModel, Field
 from sqlalchemy import select, func, or_, desc, asc
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -11,9 +13,13 @@ from sqlalchemy.orm import selectinload
 
 from app.database import get_session
 from app.models.sensor import Sensor, SensorMetric
-from app.models.facility import MonitoringFacility, MonitoringSection, SensorType
+from app.models.facility import MonitoringFacility, MonitoringSection
 from app.models.reading import SensorReading
 from app.models.hydrological import HydrologicalStation
+from app.tasks import stats_snapshot_service
+from app.utils.versions import etag_guard
+from app.utils.catalog import get_catalog
+from app.utils.linear_ref import resolve_chainage_locations
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -131,6 +137,9 @@ class FacilityUpdate(BaseModel):
     name: Optional[str] = None
     facility_type: Optional[str] = None
     location_desc: Optional[str] = None
+    # Tunnel/channel centerline as LINESTRING Z WKT in EPSG:4549, vertices in chainage order
+    centerline_wkt: Optional[str] = None
+    chainage_start: Optional[float] = None
 
 
 class SectionAdminOut(BaseModel):
@@ -246,6 +255,7 @@ async def create_sensor(
     )
     db.add(sensor)
     await db.commit()
+    stats_snapshot_service.mark_dirty()
     await db.refresh(sensor)
 
     return SensorAdminOut(
@@ -281,6 +291,7 @@ async def update_sensor(
         sensor.status = data.status
 
     await db.commit()
+    stats_snapshot_service.mark_dirty()
     await db.refresh(sensor)
 
     return SensorAdminOut(
@@ -308,6 +319,7 @@ async def delete_sensor(
 
     sensor.status = "deleted"
     await db.commit()
+    stats_snapshot_service.mark_dirty()
     return {"message": "Sensor deleted", "id": sensor_id}
 
 
@@ -665,6 +677,16 @@ async def update_facility(
         facility.facility_type = data.facility_type
     if data.location_desc is not None:
         facility.location_desc = data.location_desc
+    if data.centerline_wkt is not None:
+        try:
+            line = shapely.from_wkt(data.centerline_wkt)
+        except shapely.errors.GEOSException:
+            line = None
+        if line is None or line.geom_type != "LineString" or len(line.coords) < 2:
+            raise HTTPException(status_code=400, detail="centerline_wkt must be a LINESTRING with at least 2 points")
+        facility.centerline = WKTElement(shapely.force_3d(line).wkt, srid=4549)
+    if data.chainage_start is not None:
+        facility.chainage_start = data.chainage_start
 
     await db.commit()
     await db.refresh(facility)
@@ -870,12 +892,26 @@ class SensorTypeOut(BaseModel):
         from_attributes = True
 
 
-@router.get("/sensor_types", response_model=list[SensorTypeOut])
+@router.get("/sensor_types", response_model=list[SensorTypeOut], dependencies=[Depends(etag_guard("sensor_types"))])
 async def list_sensor_types(db: AsyncSession = Depends(get_session)):
     """List all sensor types for dropdown/select options."""
-    result = await db.execute(select(SensorType).order_by(SensorType.name))
-    types = result.scalars().all()
+    cat = await get_catalog(db, "sensor_types")
+    types = sorted(cat.sensor_types.values(), key=lambda t: t.name)
     return [
         SensorTypeOut(id=t.id, code=t.code, name=t.name, unit=t.unit)
         for t in types
     ]
+
+
+# ============ Chainage (linear referencing) ============
+
+@router.post("/chainage/resolve")
+async def resolve_chainage(
+    facility_id: Optional[int] = Query(None, description="Restrict to one facility"),
+    overwrite: bool = Query(False, description="Re-locate rows that already have a location"),
+    db: AsyncSession = Depends(get_session),
+):
+    """Locate chainage points along their facility centerline in one pass."""
+    return await resolve_chainage_locations(
+        db, [facility_id] if facility_id is not None else None, overwrite
+    )
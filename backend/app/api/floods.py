@@ -0,0 +1,87 @@
+"""
+洪水淹没范围 API：按缩放级别简化的分时刻淹没面与分时刻统计
+
+事件来自 model_products 中的 flood_event 产品（没有时使用模拟事件），淹没 GeoJSON
+按 raster_root 解析，只在版本变化时载入一次（app.utils.flood_inundation）；
+生成的 GeoJSON 进入内存 + 磁盘两级缓存。
+"""
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.tiles import MAX_ZOOM
+from app.config import get_settings
+from app.database import get_session
+from app.utils.catalog import get_catalog
+from app.utils.flood_inundation import FULL_RES_ZOOM, FloodInundation, flood_events, flood_products
+from app.utils.tile_cache import TileCache
+from app.utils.versions import etag_matches
+
+router = APIRouter(prefix="/floods", tags=["floods"])
+
+_settings = get_settings()
+flood_cache = TileCache(_settings.tile_cache_dir or None, _settings.flood_cache_items, suffix="geojson")
+
+
+async def _event(session: AsyncSession, event_id: str) -> dict:
+    cat = await get_catalog(session, "model_products")
+    event = flood_events(cat.model_products.values()).get(event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Flood event not found")
+    return event
+
+
+async def _inundation(event_id: str, event: dict) -> FloodInundation:
+    try:
+        return await flood_products.get(event_id, event)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Inundation file not found")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid inundation GeoJSON: {e}")
+
+
+@router.get("/{event_id}/inundation")
+async def get_inundation(
+    event_id: str,
+    request: Request,
+    step: int = Query(0, ge=0, description="时刻下标"),
+    zoom: int = Query(10, ge=0, le=MAX_ZOOM, description="地图缩放级别，决定简化容差与坐标位数"),
+    session: AsyncSession = Depends(get_session),
+):
+    """某时刻的淹没范围 GeoJSON（保留原要素属性，properties.step 为时刻下标）"""
+    event = await _event(session, event_id)
+    try:
+        _, token = flood_products.event_token(event_id, event)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Inundation file not found")
+    # 原始分辨率及以上的缩放级别共用一个结果
+    zoom = min(zoom, FULL_RES_ZOOM)
+    etag = f'"flood-{event_id}-{token}-{step}-{zoom}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (f"flood-{event_id}", token, zoom, step, 0)
+    data = await flood_cache.get(key)
+    if data is None:
+        inundation = await _inundation(event_id, event)
+        if step >= inundation.step_count:
+            raise HTTPException(status_code=404, detail="Time step out of range")
+        data = await asyncio.to_thread(inundation.step_geojson, step, zoom)
+        await flood_cache.put(key, data)
+    return Response(content=data, media_type="application/geo+json", headers=headers)
+
+
+@router.get("/{event_id}/inundation/stats")
+async def get_inundation_stats(event_id: str, session: AsyncSession = Depends(get_session)):
+    """各时刻的淹没面积（km²）、平均/最大水深（m）、水量（m³）与要素数"""
+    event = await _event(session, event_id)
+    inundation = await _inundation(event_id, event)
+    return JSONResponse({
+        "event_id": event_id,
+        "version": inundation.version,
+        "step_count": inundation.step_count,
+        "steps": inundation.stats,
+    })
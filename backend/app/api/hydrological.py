@@ -1,9 +1,11 @@
 """水文站 API 路由"""
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select, desc
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, desc, func, or_, true
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -15,47 +17,106 @@ from app.schemas.hydrological import (
     StationReadingOut,
     StationReadingsResponse,
 )
+from app.utils.columnar import build_columnar, epoch_ms, json_floats
+from app.utils.hydraulics import HydraulicTable, get_hydraulic_table
 
 router = APIRouter(prefix="/hydrological_stations", tags=["hydrological"])
 
 
-async def get_latest_readings(session: AsyncSession, station_id: int) -> dict:
-    """获取站点最新读数"""
-    # 查找该站点关联的传感器
-    sensor_stmt = select(Sensor).where(Sensor.hydrological_station_id == station_id)
-    sensors = (await session.execute(sensor_stmt)).scalars().all()
+STATION_METRICS = ("flow_rate", "velocity", "water_level")
+
+
+def station_snapshot_stmt():
+    """
+    站点最新读数快照（单条 SQL）
+
+    每个指标通过 LATERAL 子查询取最新一条读数（走 metric_id + reading_time 索引），
+    同一站点多个传感器的同名指标取时间最新者，再按站点透视为
+    flow_rate / velocity / water_level 三列及最新时间。站点左连接，无读数时各列为 NULL。
+    """
+    latest = (
+        select(SensorReading.value_num, SensorReading.reading_time)
+        .where(SensorReading.metric_id == SensorMetric.id)
+        .order_by(desc(SensorReading.reading_time))
+        .limit(1)
+        .lateral("latest")
+    )
+    per_metric = (
+        select(
+            Sensor.hydrological_station_id.label("station_id"),
+            SensorMetric.metric_key,
+            latest.c.value_num,
+            latest.c.reading_time,
+        )
+        .join(SensorMetric, SensorMetric.sensor_id == Sensor.id)
+        .join(latest, true())
+        .where(
+            Sensor.hydrological_station_id.is_not(None),
+            SensorMetric.metric_key.in_(STATION_METRICS),
+        )
+        .distinct(Sensor.hydrological_station_id, SensorMetric.metric_key)
+        .order_by(
+            Sensor.hydrological_station_id,
+            SensorMetric.metric_key,
+            desc(latest.c.reading_time),
+        )
+        .subquery()
+    )
+    pivot = (
+        select(
+            per_metric.c.station_id,
+            *[
+                func.max(per_metric.c.value_num).filter(per_metric.c.metric_key == key).label(key)
+                for key in STATION_METRICS
+            ],
+            func.max(per_metric.c.reading_time).label("latest_time"),
+        )
+        .group_by(per_metric.c.station_id)
+        .subquery()
+    )
+    return (
+        select(
+            HydrologicalStation,
+            pivot.c.flow_rate,
+            pivot.c.velocity,
+            pivot.c.water_level,
+            pivot.c.latest_time,
+        )
+        .outerjoin(pivot, pivot.c.station_id == HydrologicalStation.id)
+        .order_by(HydrologicalStation.id)
+    )
 
-    latest = {
-        "flow_rate": None,
-        "velocity": None,
-        "water_level": None,
-        "time": None,
+
+def _latest_from_row(row) -> dict:
+    return {
+        "flow_rate": row.flow_rate,
+        "velocity": row.velocity,
+        "water_level": row.water_level,
+        "time": row.latest_time.isoformat() if row.latest_time else None,
     }
 
-    for sensor in sensors:
-        # 获取每个指标的最新读数
-        for metric_key in ["flow_rate", "velocity", "water_level"]:
-            metric_stmt = select(SensorMetric).where(
-                SensorMetric.sensor_id == sensor.id,
-                SensorMetric.metric_key == metric_key,
-            )
-            metric = (await session.execute(metric_stmt)).scalars().first()
-            if metric:
-                reading_stmt = (
-                    select(SensorReading)
-                    .where(SensorReading.metric_id == metric.id)
-                    .order_by(desc(SensorReading.reading_time))
-                    .limit(1)
-                )
-                reading = (await session.execute(reading_stmt)).scalars().first()
-                if reading:
-                    latest[metric_key] = reading.value_num
-                    if latest["time"] is None or (
-                        reading.reading_time and reading.reading_time.isoformat() > latest["time"]
-                    ):
-                        latest["time"] = reading.reading_time.isoformat() if reading.reading_time else None
-
-    return latest
+
+async def get_station_snapshots(
+    session: AsyncSession,
+    station_ids: Optional[list[int]] = None,
+    is_simulated: Optional[bool] = None,
+) -> list[tuple[HydrologicalStation, dict]]:
+    """获取站点及其最新读数，一次数据库往返"""
+    stmt = station_snapshot_stmt()
+    if station_ids is not None:
+        stmt = stmt.where(HydrologicalStation.id.in_(station_ids))
+    if is_simulated is not None:
+        stmt = stmt.where(HydrologicalStation.is_simulated == is_simulated)
+    rows = (await session.execute(stmt)).all()
+    return [(row.HydrologicalStation, _latest_from_row(row)) for row in rows]
+
+
+async def get_latest_readings(session: AsyncSession, station_id: int) -> dict:
+    """获取站点最新读数"""
+    snapshots = await get_station_snapshots(session, [station_id])
+    if snapshots:
+        return snapshots[0][1]
+    return {key: None for key in (*STATION_METRICS, "time")}
 
 
 @router.get("", response_model=list[HydrologicalStationOut])
@@ -64,15 +125,8 @@ async def list_stations(
     session: AsyncSession = Depends(get_session),
 ):
     """获取水文站列表"""
-    stmt = select(HydrologicalStation)
-    if is_simulated is not None:
-        stmt = stmt.where(HydrologicalStation.is_simulated == is_simulated)
-
-    stations = (await session.execute(stmt)).scalars().all()
-
     results = []
-    for station in stations:
-        latest = await get_latest_readings(session, station.id)
+    for station, latest in await get_station_snapshots(session, is_simulated=is_simulated):
         results.append(
             HydrologicalStationOut(
                 id=station.id,
@@ -98,13 +152,12 @@ async def get_station(
     session: AsyncSession = Depends(get_session),
 ):
     """获取单个水文站详情"""
-    stmt = select(HydrologicalStation).where(HydrologicalStation.id == station_id)
-    station = (await session.execute(stmt)).scalars().first()
-    if not station:
+    snapshots = await get_station_snapshots(session, [station_id])
+    if not snapshots:
         from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Station not found")
 
-    latest = await get_latest_readings(session, station.id)
+    station, latest = snapshots[0]
     return HydrologicalStationOut(
         id=station.id,
         station_code=station.station_code,
@@ -120,6 +173,18 @@ async def get_station(
     )
 
 
+def _columnar_response(station: HydrologicalStation, rows) -> JSONResponse:
+    """列式输出：站点信息 + 对齐的时间轴与指标数组"""
+    return JSONResponse(
+        {
+            "station_id": station.id,
+            "station_code": station.station_code,
+            "station_name": station.station_name,
+            **build_columnar(rows),
+        }
+    )
+
+
 @router.get("/{station_id}/readings", response_model=StationReadingsResponse)
 async def get_station_readings(
     station_id: int,
@@ -127,9 +192,10 @@ async def get_station_readings(
     end_time: Optional[datetime] = Query(None, description="结束时间"),
     metric: Optional[str] = Query(None, description="指标类型: flow_rate, velocity, water_level"),
     limit: int = Query(100, le=1000, description="返回数量限制"),
+    format: Literal["rows", "columnar"] = Query("rows", description="输出格式: rows 逐条, columnar 列式宽表"),
     session: AsyncSession = Depends(get_session),
 ):
-    """获取站点历史读数"""
+    """获取站点历史读数（format=columnar 时返回 epoch 毫秒时间轴与每个指标的对齐数组）"""
     # 获取站点
     stmt = select(HydrologicalStation).where(HydrologicalStation.id == station_id)
     station = (await session.execute(stmt)).scalars().first()
@@ -143,6 +209,8 @@ async def get_station_readings(
     sensor_ids = [s.id for s in sensors]
 
     if not sensor_ids:
+        if format == "columnar":
+            return _columnar_response(station, [])
         return StationReadingsResponse(
             station_id=station.id,
             station_code=station.station_code,
@@ -159,6 +227,8 @@ async def get_station_readings(
     metric_map = {m.id: m for m in metrics}
 
     if not metrics:
+        if format == "columnar":
+            return _columnar_response(station, [])
         return StationReadingsResponse(
             station_id=station.id,
             station_code=station.station_code,
@@ -167,6 +237,28 @@ async def get_station_readings(
             total_count=0,
         )
 
+    # 列式输出直接取列元组，不构建 ORM/Pydantic 对象
+    if format == "columnar":
+        column_stmt = (
+            select(
+                SensorReading.reading_time,
+                SensorReading.metric_id,
+                SensorReading.sensor_id,
+                SensorMetric.metric_key,
+                SensorMetric.unit,
+                SensorReading.value_num,
+            )
+            .join(SensorMetric, SensorMetric.id == SensorReading.metric_id)
+            .where(SensorReading.metric_id.in_(list(metric_map)))
+            .order_by(desc(SensorReading.reading_time))
+            .limit(limit)
+        )
+        if start_time:
+            column_stmt = column_stmt.where(SensorReading.reading_time >= start_time)
+        if end_time:
+            column_stmt = column_stmt.where(SensorReading.reading_time <= end_time)
+        return _columnar_response(station, (await session.execute(column_stmt)).all())
+
     # 获取读数
     reading_stmt = (
         select(SensorReading)
@@ -199,6 +291,78 @@ async def get_station_readings(
     )
 
 
+async def get_station_hydraulic_table(session: AsyncSession, station_id: int) -> Optional[HydraulicTable]:
+    """站点断面水力查找表；站点不存在时抛出 404，无断面几何时返回 None"""
+    stmt = select(func.ST_AsBinary(HydrologicalStation.cross_section)).where(HydrologicalStation.id == station_id)
+    result = (await session.execute(stmt)).first()
+    if result is None:
+        raise HTTPException(status_code=404, detail="Station not found")
+    return get_hydraulic_table(result[0])
+
+
+async def station_metric_series(
+    session: AsyncSession,
+    station_id: int,
+    metric_key: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    exclude_flags: tuple = (),
+):
+    """站点某指标的历史序列（时间升序），返回 (时间列表, float64 数组)；exclude_flags 为剔除的 quality_flag"""
+    stmt = (
+        select(SensorReading.reading_time, SensorReading.value_num)
+        .join(SensorMetric, SensorMetric.id == SensorReading.metric_id)
+        .join(Sensor, Sensor.id == SensorMetric.sensor_id)
+        .where(Sensor.hydrological_station_id == station_id, SensorMetric.metric_key == metric_key)
+        .order_by(SensorReading.reading_time)
+    )
+    if start_time:
+        stmt = stmt.where(SensorReading.reading_time >= start_time)
+    if end_time:
+        stmt = stmt.where(SensorReading.reading_time <= end_time)
+    if exclude_flags:
+        stmt = stmt.where(or_(SensorReading.quality_flag.is_(None), SensorReading.quality_flag.not_in(exclude_flags)))
+    if limit:
+        stmt = stmt.limit(limit)
+    rows = (await session.execute(stmt)).all()
+    times = [r[0] for r in rows]
+    values = np.array([r[1] for r in rows], dtype=float)
+    return times, values
+
+
+@router.get("/{station_id}/hydraulics")
+async def get_station_hydraulics(
+    station_id: int,
+    levels: Optional[str] = Query(None, description="逗号分隔的水位（m，与断面高程同一基准）；缺省时使用站点水位历史"),
+    start_time: Optional[datetime] = Query(None, description="开始时间"),
+    end_time: Optional[datetime] = Query(None, description="结束时间"),
+    limit: Optional[int] = Query(None, ge=1, description="历史水位数量限制"),
+    session: AsyncSession = Depends(get_session),
+):
+    """断面水力要素：过水面积、水面宽、湿周、水力半径（列式数组）"""
+    table = await get_station_hydraulic_table(session, station_id)
+    if table is None:
+        raise HTTPException(status_code=404, detail="Station has no cross-section geometry")
+
+    payload = {"station_id": station_id, "bed_min": table.bed_min, "bank_max": table.bank_max}
+    if levels is not None:
+        try:
+            stages = np.array([float(v) for v in levels.split(",")], dtype=float)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="levels must be comma-separated numbers")
+        if not np.isfinite(stages).all():
+            raise HTTPException(status_code=400, detail="levels must be finite numbers")
+    else:
+        times, stages = await station_metric_series(session, station_id, "water_level", start_time, end_time, limit)
+        payload["time"] = [epoch_ms(t) for t in times]
+
+    result = table.evaluate(stages)
+    payload["water_level"] = json_floats(stages)
+    payload.update({key: json_floats(values) for key, values in result.items()})
+    return JSONResponse(payload)
+
+
 # 独立的流量数据端点
 flow_router = APIRouter(tags=["hydrological"])
 
@@ -209,15 +373,8 @@ async def list_flow_rates(
     session: AsyncSession = Depends(get_session),
 ):
     """获取所有站点最新流量数据"""
-    stmt = select(HydrologicalStation)
-    if is_simulated is not None:
-        stmt = stmt.where(HydrologicalStation.is_simulated == is_simulated)
-
-    stations = (await session.execute(stmt)).scalars().all()
-
     results = []
-    for station in stations:
-        latest = await get_latest_readings(session, station.id)
+    for station, latest in await get_station_snapshots(session, is_simulated=is_simulated):
         results.append(
             FlowRateOut(
                 station_id=station.id,
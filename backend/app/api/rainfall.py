@@ -0,0 +1,211 @@
+"""
+降水格网分析 API：点位时序提取、流域面雨量统计与等值线
+
+时序与统计来自 rain_grid 栅格产品构成的时空立方体（app.utils.rain_cube），
+产品或文件变化后首次请求时重建；等值线按单帧生成（app.tasks.isohyet_pregen）。
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, Literal, Optional, Tuple
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.tiles import MAX_ZOOM
+from app.config import get_settings
+from app.database import get_session
+from app.models import HydrologicalStation
+from app.tasks import isohyet_service
+from app.utils.catalog import get_catalog
+from app.utils.columnar import json_floats
+from app.utils.isohyets import DEFAULT_THRESHOLDS, parse_thresholds
+from app.utils.rain_cube import RainCube, basin_geometries, rain_cube_service
+from app.utils.raster_io import RasterFormatError
+from app.utils.versions import content_token, etag_matches
+
+router = APIRouter(prefix="/rainfall", tags=["rainfall"])
+
+# 流域名 → (来源, 几何)，按矢量产品与测站表版本缓存
+_basin_cache: Dict[str, object] = {"token": None, "basins": {}}
+
+
+async def _cube(session: AsyncSession) -> RainCube:
+    cat = await get_catalog(session, "raster_products")
+    try:
+        return await rain_cube_service.get(cat.raster_products.values())
+    except RasterFormatError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+async def _basins(session: AsyncSession) -> Tuple[str, dict]:
+    token = content_token(["vector_products", "hydrological_stations"])
+    if _basin_cache["token"] != token:
+        cat = await get_catalog(session, "vector_products")
+        rows = (await session.execute(
+            select(HydrologicalStation.basin_name, func.ST_X(HydrologicalStation.location), func.ST_Y(HydrologicalStation.location))
+            .where(HydrologicalStation.basin_name.is_not(None), HydrologicalStation.location.is_not(None))
+        )).all()
+        points = {}
+        for name, lng, lat in rows:
+            points.setdefault(name, []).append((lng, lat))
+        _basin_cache["basins"] = basin_geometries(cat.vector_products.values(), get_settings().raster_root, points)
+        _basin_cache["token"] = token
+    return token, _basin_cache["basins"]
+
+
+def _window(cube: RainCube, start_time: Optional[datetime], end_time: Optional[datetime]) -> slice:
+    if start_time and end_time and end_time < start_time:
+        raise HTTPException(status_code=400, detail="end_time must not be before start_time")
+    return cube.time_slice(start_time, end_time)
+
+
+@router.get("/frames")
+async def list_rain_frames(session: AsyncSession = Depends(get_session)):
+    """立方体中的帧时刻（epoch 毫秒）、来源产品与格网范围"""
+    cube = await _cube(session)
+    geo = cube.geo
+    return JSONResponse({
+        "version": cube.token,
+        "time": cube.times.tolist(),
+        "product_id": cube.product_ids,
+        "grid": {
+            "west": geo.west, "north": geo.north, "east": geo.east, "south": geo.south,
+            "dlon": geo.dlon, "dlat": geo.dlat, "rows": geo.rows, "cols": geo.cols,
+        },
+    })
+
+
+@router.get("/drill")
+async def drill_rain_series(
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    station_id: Optional[int] = Query(None, description="水文站 id（代替 lng/lat）"),
+    start_time: Optional[datetime] = Query(None),
+    end_time: Optional[datetime] = Query(None),
+    session: AsyncSession = Depends(get_session),
+):
+    """某点（或水文站所在格元）的降水时序"""
+    if station_id is not None:
+        row = (await session.execute(
+            select(func.ST_X(HydrologicalStation.location), func.ST_Y(HydrologicalStation.location))
+            .where(HydrologicalStation.id == station_id)
+        )).first()
+        if row is None or row[0] is None:
+            raise HTTPException(status_code=404, detail="Station not found or has no location")
+        lng, lat = row
+    elif lng is None or lat is None:
+        raise HTTPException(status_code=400, detail="Either station_id or lng/lat is required")
+
+    cube = await _cube(session)
+    cell = cube.geo.locate(lng, lat)
+    if cell is None:
+        raise HTTPException(status_code=404, detail="Point is outside the rain grid")
+    window = _window(cube, start_time, end_time)
+    values = cube.pixel_series(*cell)[window]
+    cell_lng, cell_lat = cube.geo.centers(slice(cell[0], cell[0] + 1), slice(cell[1], cell[1] + 1))
+    return JSONResponse({
+        "version": cube.token,
+        "cell": {"row": cell[0], "col": cell[1], "lng": float(cell_lng[0]), "lat": float(cell_lat[0])},
+        "time": cube.times[window].tolist(),
+        "values": json_floats(values),
+        "total": float(np.nansum(values)) if np.isfinite(values).any() else None,
+    })
+
+
+def _zonal(cube: RainCube, token: str, name: str, geometry):
+    """流域掩膜与各帧统计（均按流域版本缓存在立方体上）"""
+    key = (name, token)
+    mask = cube.zone_mask(key, geometry)
+    return mask, cube.zonal_stats(key, mask)
+
+
+@router.get("/basins")
+async def list_basin_rainfall(
+    start_time: Optional[datetime] = Query(None),
+    end_time: Optional[datetime] = Query(None),
+    session: AsyncSession = Depends(get_session),
+):
+    """各流域在时段内的累计面雨量（各帧面均值之和）与最大格元值"""
+    cube = await _cube(session)
+    token, basins = await _basins(session)
+    window = _window(cube, start_time, end_time)
+    result = []
+    for name, (source, geometry) in sorted(basins.items()):
+        mask, stats = await asyncio.to_thread(_zonal, cube, token, name, geometry)
+        mean, peak = stats["mean"][window], stats["max"][window]
+        result.append({
+            "basin_name": name,
+            "boundary": source,
+            "pixel_count": mask.pixel_count,
+            "accumulated_mean": float(np.nansum(mean)) if np.isfinite(mean).any() else None,
+            "max": float(np.nanmax(peak)) if np.isfinite(peak).any() else None,
+        })
+    return JSONResponse({"version": cube.token, "time": cube.times[window].tolist(), "basins": result})
+
+
+@router.get("/basins/{basin_name}")
+async def get_basin_rainfall(
+    basin_name: str,
+    start_time: Optional[datetime] = Query(None),
+    end_time: Optional[datetime] = Query(None),
+    session: AsyncSession = Depends(get_session),
+):
+    """流域面雨量时序：面积加权均值、最大格元值、格元值之和与有效格元数"""
+    cube = await _cube(session)
+    token, basins = await _basins(session)
+    if basin_name not in basins:
+        raise HTTPException(status_code=404, detail="Basin not found")
+    source, geometry = basins[basin_name]
+    mask, stats = await asyncio.to_thread(_zonal, cube, token, basin_name, geometry)
+    window = _window(cube, start_time, end_time)
+    return JSONResponse({
+        "version": cube.token,
+        "basin_name": basin_name,
+        "boundary": source,
+        "pixel_count": mask.pixel_count,
+        "time": cube.times[window].tolist(),
+        "mean": json_floats(stats["mean"][window]),
+        "max": json_floats(stats["max"][window]),
+        "sum": json_floats(stats["sum"][window]),
+        "valid": stats["valid"][window].tolist(),
+    })
+
+
+@router.get("/isohyets/{product_id}")
+async def get_isohyets(
+    product_id: int,
+    request: Request,
+    thresholds: Optional[str] = Query(None, description="逗号分隔的阈值（mm），缺省为 0.1,10,25,50,100,250"),
+    zoom: int = Query(8, ge=0, le=MAX_ZOOM, description="地图缩放级别，决定网格层级与简化容差"),
+    kind: Literal["lines", "bands", "all"] = Query("all", description="lines: 等值线, bands: 分级面, all: 两者"),
+    band: int = Query(0, ge=0, description="多时刻文件中的时刻（波段）下标"),
+    session: AsyncSession = Depends(get_session),
+):
+    """单帧降水等值线/分级面 GeoJSON（properties.kind 为 isohyet 或 band）"""
+    try:
+        levels = parse_thresholds(thresholds) if thresholds else DEFAULT_THRESHOLDS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cat = await get_catalog(session, "raster_products")
+    product = cat.raster_products.get(product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Raster product not found")
+    try:
+        layer, token = isohyet_service.frame_key(product, band, levels, kind)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Raster file not found")
+
+    etag = f'"{layer}-{token}-{zoom}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        data = await isohyet_service.get(product, band, levels, zoom, kind)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Raster file not found")
+    except RasterFormatError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return Response(content=data, media_type="application/geo+json", headers=headers)
@@ -0,0 +1,68 @@
+"""
+栅格产品 PNG 瓦片路由
+
+/tiles/raster/{product_id}/{z}/{x}/{y}.png，目前用于 rain_grid 降水格网。
+文件按产品 path 相对 raster_root 解析并以 memmap 打开；解码后的栅格与概览层
+按文件修改时间缓存（app.utils.raster_tiles），渲染出的瓦片进入内存 + 磁盘两级缓存。
+"""
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.tiles import MAX_ZOOM
+from app.config import get_settings
+from app.database import get_session
+from app.utils.catalog import get_catalog
+from app.utils.raster_io import RasterFormatError, file_token, product_file
+from app.utils.raster_tiles import load_source, raster_sources, render_tile
+from app.utils.tile_cache import TileCache
+from app.utils.versions import etag_matches
+
+router = APIRouter(prefix="/tiles/raster", tags=["tiles"])
+
+_settings = get_settings()
+raster_tile_cache = TileCache(_settings.tile_cache_dir or None, _settings.tile_cache_items, suffix="png")
+
+
+@router.get("/{product_id}/{z}/{x}/{y}.png")
+async def get_raster_tile(
+    product_id: int,
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    band: int = Query(0, ge=0, description="多时刻文件中的时刻（波段）下标"),
+    session: AsyncSession = Depends(get_session),
+):
+    """获取栅格产品瓦片（瓦片范围内无数据时返回透明瓦片）"""
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+
+    cat = await get_catalog(session, "raster_products")
+    product = cat.raster_products.get(product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Raster product not found")
+    try:
+        path, mtime, variable = product_file(_settings.raster_root, product)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Raster file not found")
+
+    layer = f"raster-{product_id}-{band}"
+    # 只随本产品的文件变化，其他产品的增删改不会使已生成的瓦片失效
+    token = file_token(path, mtime, variable, band)
+    etag = f'"{layer}-{token}-{z}-{x}-{y}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (layer, token, z, x, y)
+    data = await raster_tile_cache.get(key)
+    if data is None:
+        try:
+            source = await raster_sources.get((path, mtime, variable, band), lambda: load_source(path, variable, band))
+        except RasterFormatError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        data = await asyncio.to_thread(render_tile, source, z, x, y)
+        await raster_tile_cache.put(key, data)
+    return Response(content=data, media_type="image/png", headers=headers)
@@ -0,0 +1,180 @@
+"""水位流量关系（率定曲线）API"""
+import asyncio
+from datetime import datetime
+from typing import Literal, Optional
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_session
+from app.models import HydrologicalStation, ModelProduct
+from app.api.hydrological import station_metric_series
+from app.utils.catalog import get_catalog
+from app.utils.columnar import epoch_ms, json_floats
+from app.utils.rating_curve import (
+    RATING_CURVE_PRODUCT_TYPE,
+    curve_from_product,
+    fit_rating_curve,
+    latest_rating_product,
+)
+from app.utils.versions import etag_guard
+
+router = APIRouter(prefix="/hydrological_stations", tags=["hydrological"])
+
+# 不参与拟合的雷达流量（可疑/无效/推算值）
+EXCLUDED_FLOW_FLAGS = ("suspect", "invalid", "derived")
+# 人工比测相对雷达流量的权重，以及与水位配对的最大时间差
+MANUAL_WEIGHT = 20.0
+MANUAL_MATCH_MS = 10 * 60 * 1000
+
+
+def _to_ms(times) -> np.ndarray:
+    return np.array([epoch_ms(t) for t in times], dtype=np.int64)
+
+
+def _nearest(sorted_ms: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """targets 中每个时刻在 sorted_ms 中最近元素的下标"""
+    right = np.clip(np.searchsorted(sorted_ms, targets), 0, len(sorted_ms) - 1)
+    left = np.clip(right - 1, 0, len(sorted_ms) - 1)
+    return np.where(np.abs(sorted_ms[left] - targets) <= np.abs(sorted_ms[right] - targets), left, right)
+
+
+async def load_stage_discharge_pairs(
+    session: AsyncSession,
+    station_id: int,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+):
+    """同一时刻的 (水位, 流量, 权重)；人工比测按最近水位配对并加权"""
+    level_times, levels = await station_metric_series(session, station_id, "water_level", start_time, end_time)
+    flow_times, flows = await station_metric_series(
+        session, station_id, "flow_rate", start_time, end_time, exclude_flags=EXCLUDED_FLOW_FLAGS
+    )
+    level_ms = _to_ms(level_times)
+    _, li, fi = np.intersect1d(level_ms, _to_ms(flow_times), return_indices=True)
+    h, q = levels[li], flows[fi]
+    w = np.ones_like(h)
+
+    manual_times, manual = await station_metric_series(session, station_id, "manual_flow_rate", start_time, end_time)
+    if len(manual) and len(level_ms):
+        manual_ms = _to_ms(manual_times)
+        idx = _nearest(level_ms, manual_ms)
+        matched = np.abs(level_ms[idx] - manual_ms) <= MANUAL_MATCH_MS
+        h = np.concatenate([h, levels[idx[matched]]])
+        q = np.concatenate([q, manual[matched]])
+        w = np.concatenate([w, np.full(int(matched.sum()), MANUAL_WEIGHT)])
+    return h, q, w
+
+
+def _curve_payload(product) -> dict:
+    return {
+        "product_id": product.id,
+        "station_id": product.meta["station_id"],
+        "version": product.version,
+        "valid_from": product.valid_from,
+        "valid_to": product.valid_to,
+        **curve_from_product(product).to_meta(),
+    }
+
+
+async def _latest_curve_product(session: AsyncSession, station_id: int):
+    cat = await get_catalog(session, "model_products")
+    return latest_rating_product(cat.model_products.values(), station_id)
+
+
+@router.get("/{station_id}/rating_curve", dependencies=[Depends(etag_guard("model_products"))])
+async def get_rating_curve(station_id: int, session: AsyncSession = Depends(get_session)):
+    """站点最新版本的率定曲线参数"""
+    product = await _latest_curve_product(session, station_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Rating curve not found")
+    return _curve_payload(product)
+
+
+@router.post("/{station_id}/rating_curve")
+async def fit_station_rating_curve(
+    station_id: int,
+    kind: Literal["power", "segmented"] = Query("power", description="power: 单一幂函数, segmented: 分段幂函数"),
+    n_segments: int = Query(2, ge=2, le=4, description="分段数（segmented）"),
+    start_time: Optional[datetime] = Query(None, description="率定数据开始时间"),
+    end_time: Optional[datetime] = Query(None, description="率定数据结束时间"),
+    session: AsyncSession = Depends(get_session),
+):
+    """用水位-流量配对数据拟合率定曲线，保存为新版本"""
+    station = (
+        await session.execute(select(HydrologicalStation).where(HydrologicalStation.id == station_id))
+    ).scalars().first()
+    if not station:
+        raise HTTPException(status_code=404, detail="Station not found")
+
+    h, q, w = await load_stage_discharge_pairs(session, station_id, start_time, end_time)
+    try:
+        curve = await asyncio.to_thread(fit_rating_curve, h, q, w, kind, n_segments)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    previous = await _latest_curve_product(session, station_id)
+    version_no = (previous.meta.get("version_no", 0) if previous else 0) + 1
+    product = ModelProduct(
+        domain="hydrology",
+        name=f"{station.station_name} 水位流量关系",
+        version=f"v{version_no}",
+        valid_from=start_time.isoformat() if start_time else None,
+        valid_to=end_time.isoformat() if end_time else None,
+        product_type=RATING_CURVE_PRODUCT_TYPE,
+        meta={
+            "station_id": station_id,
+            "version_no": version_no,
+            "fitted_at": datetime.now().isoformat(),
+            **curve.to_meta(),
+        },
+        is_simulated=station.is_simulated,
+    )
+    session.add(product)
+    await session.commit()
+    await session.refresh(product)
+    return _curve_payload(product)
+
+
+@router.get("/{station_id}/rating_curve/discharge")
+async def get_rating_discharge(
+    station_id: int,
+    start_time: Optional[datetime] = Query(None, description="开始时间"),
+    end_time: Optional[datetime] = Query(None, description="结束时间"),
+    limit: Optional[int] = Query(None, ge=1, description="水位数量限制"),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    用最新率定曲线把水位历史换算为流量（列式数组）。
+
+    observed 为同一时刻的有效雷达流量（缺失或可疑时为 null），
+    flow_rate 优先取实测，否则取率定流量。
+    """
+    product = await _latest_curve_product(session, station_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Rating curve not found")
+    curve = curve_from_product(product)
+
+    level_times, levels = await station_metric_series(session, station_id, "water_level", start_time, end_time, limit)
+    flow_times, flows = await station_metric_series(
+        session, station_id, "flow_rate", start_time, end_time, exclude_flags=EXCLUDED_FLOW_FLAGS
+    )
+    level_ms = _to_ms(level_times)
+    observed = np.full(len(levels), np.nan)
+    _, li, fi = np.intersect1d(level_ms, _to_ms(flow_times), return_indices=True)
+    observed[li] = flows[fi]
+
+    rated = curve.apply(levels)
+    return JSONResponse({
+        "station_id": station_id,
+        "version": product.version,
+        "time": level_ms.tolist(),
+        "water_level": json_floats(levels),
+        "observed": json_floats(observed),
+        "rated": json_floats(rated),
+        "flow_rate": json_floats(np.where(np.isnan(observed), rated, observed)),
+        "filled_count": int((np.isnan(observed) & ~np.isnan(rated)).sum()),
+    })
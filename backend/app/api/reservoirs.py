@@ -0,0 +1,124 @@
+"""水库库容与水量平衡 API"""
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_session
+from app.models import ModelProduct, MonitoringFacility
+from app.schemas.reservoir import CapacityCurveIn
+from app.tasks import stats_snapshot_service
+from app.utils.catalog import get_catalog
+from app.utils.columnar import epoch_ms, json_floats
+from app.utils.reservoir import (
+    LEVEL_CAPACITY_PRODUCT_TYPE,
+    CapacityCurve,
+    curve_from_product,
+    latest_capacity_product,
+    reservoir_engine,
+)
+from app.utils.versions import etag_guard
+
+router = APIRouter(prefix="/reservoirs", tags=["reservoirs"])
+
+
+def _curve_payload(product) -> dict:
+    return {
+        "product_id": product.id,
+        "facility_id": product.meta["facility_id"],
+        "version": product.version,
+        "valid_from": product.valid_from,
+        **curve_from_product(product).to_meta(),
+    }
+
+
+async def _latest_curve_product(session: AsyncSession, facility_id: int):
+    cat = await get_catalog(session, "model_products")
+    return latest_capacity_product(cat.model_products.values(), facility_id)
+
+
+@router.get("")
+async def list_reservoir_storage(
+    is_simulated: Optional[bool] = Query(None, description="是否模拟数据"),
+    session: AsyncSession = Depends(get_session),
+):
+    """各水库当前库容、库容占比与滚动水量平衡（增量更新）"""
+    series = await reservoir_engine.update(session)
+    return [
+        s.summary()
+        for fid, s in sorted(series.items())
+        if is_simulated is None or reservoir_engine.simulated.get(fid) == is_simulated
+    ]
+
+
+@router.get("/{facility_id}/capacity_curve", dependencies=[Depends(etag_guard("model_products"))])
+async def get_capacity_curve(facility_id: int, session: AsyncSession = Depends(get_session)):
+    """设施最新版本的水位-库容曲线"""
+    product = await _latest_curve_product(session, facility_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Capacity curve not found")
+    return _curve_payload(product)
+
+
+@router.post("/{facility_id}/capacity_curve")
+async def save_capacity_curve(
+    facility_id: int,
+    body: CapacityCurveIn,
+    session: AsyncSession = Depends(get_session),
+):
+    """保存水位-库容曲线为新版本"""
+    facility = (
+        await session.execute(select(MonitoringFacility).where(MonitoringFacility.id == facility_id))
+    ).scalars().first()
+    if not facility:
+        raise HTTPException(status_code=404, detail="Facility not found")
+    try:
+        curve = CapacityCurve.from_points(body.levels, body.storage, body.full_level, body.dead_level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    previous = await _latest_curve_product(session, facility_id)
+    version_no = (previous.meta.get("version_no", 0) if previous else 0) + 1
+    product = ModelProduct(
+        domain="hydrology",
+        name=f"{facility.name} 水位库容曲线",
+        version=f"v{version_no}",
+        valid_from=body.valid_from,
+        product_type=LEVEL_CAPACITY_PRODUCT_TYPE,
+        meta={"facility_id": facility_id, "version_no": version_no, **curve.to_meta()},
+        is_simulated=facility.is_simulated,
+    )
+    session.add(product)
+    await session.commit()
+    await session.refresh(product)
+    stats_snapshot_service.mark_dirty()
+    return _curve_payload(product)
+
+
+@router.get("/{facility_id}/storage")
+async def get_storage_series(
+    facility_id: int,
+    start_time: Optional[datetime] = Query(None, description="开始时间"),
+    end_time: Optional[datetime] = Query(None, description="结束时间"),
+    session: AsyncSession = Depends(get_session),
+):
+    """库容时间序列（列式数组，来自增量维护的内存序列）"""
+    series = (await reservoir_engine.update(session)).get(facility_id)
+    if series is None:
+        raise HTTPException(status_code=404, detail="Reservoir storage not available")
+    lo = np.searchsorted(series.times, epoch_ms(start_time), side="left") if start_time else 0
+    hi = np.searchsorted(series.times, epoch_ms(end_time), side="right") if end_time else len(series.times)
+    levels = series.levels[lo:hi]
+    return JSONResponse({
+        **series.summary(),
+        "series": {
+            "time": series.times[lo:hi].tolist(),
+            "water_level": json_floats(levels),
+            "storage": json_floats(series.storage[lo:hi]),
+            "capacity_percent": json_floats(series.curve.percent(levels)),
+        },
+    })
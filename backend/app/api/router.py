@@ -1,14 +1,31 @@
 from fastapi import APIRouter
-from .v1 import sensors, readings, products
+from .v1 import sensors, readings, products, spatial, twin
 from .hydrological import router as hydrological_router, flow_router
 from .admin import router as admin_router
+from .tiles import router as tiles_router
+from .raster_tiles import router as raster_tiles_router
+from .rating_curves import router as rating_curves_router
+from .reservoirs import router as reservoirs_router
+from .surfaces import router as surfaces_router
+from .rainfall import router as rainfall_router
+from .floods import router as floods_router
 
 api_router = APIRouter()
 api_router.include_router(sensors.router, prefix="/sensors", tags=["sensors"])
 api_router.include_router(
     readings.router, prefix="/readings", tags=["readings"])
+api_router.include_router(readings.arrow_router)
 api_router.include_router(
     products.router, prefix="/products", tags=["products"])
+api_router.include_router(spatial.router, prefix="/spatial", tags=["spatial"])
+api_router.include_router(twin.router, prefix="/twin", tags=["twin"])
 api_router.include_router(hydrological_router)
 api_router.include_router(flow_router)
+api_router.include_router(rating_curves_router)
+api_router.include_router(reservoirs_router)
+api_router.include_router(surfaces_router)
+api_router.include_router(rainfall_router)
+api_router.include_router(floods_router)
 api_router.include_router(admin_router)
+api_router.include_router(tiles_router)
+api_router.include_router(raster_tiles_router)
@@ -0,0 +1,164 @@
+"""断面传感器场插值曲面 API"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_session
+from app.models import Sensor, SensorReading
+from app.utils.catalog import get_catalog
+from app.utils.columnar import epoch_ms, json_floats
+from app.utils.interpolation import (
+    DEFAULT_CELLS,
+    IDW_NEIGHBORS,
+    IDW_POWER,
+    MAX_CELLS,
+    Grid,
+    SurfaceLayout,
+    local_plan_coords,
+    profile_coords,
+    surface_layouts,
+)
+from app.utils.versions import content_token
+
+router = APIRouter(prefix="/sections", tags=["surfaces"])
+
+# 单次请求的最大帧数
+MAX_FRAMES = 288
+
+
+async def _section_layout(session: AsyncSession, section_id: int, metric_key: str, method: str, plane: str,
+                          cells: int, neighbors: int, power: float):
+    """断面测点布局（测点 id、指标 id、坐标）与预计算权重；按目录版本与参数缓存"""
+    key = (section_id, metric_key, method, plane, cells, neighbors, power,
+           content_token(["sensors", "sensor_metrics"]))
+    cached = surface_layouts.get(key)
+    if cached is not None:
+        return cached
+
+    cat = await get_catalog(session, "sensors", "sensor_metrics")
+    points = []
+    for s in sorted(cat.sensors.values(), key=lambda s: s.id):
+        if s.section_id != section_id or s.lng is None or s.lat is None:
+            continue
+        metric = next((m for m in cat.metrics_by_sensor.get(s.id, ()) if m.metric_key == metric_key), None)
+        if metric is not None:
+            points.append((s.id, metric.id, s.lng, s.lat))
+
+    if plane == "profile" and points:
+        heights = dict((await session.execute(
+            select(Sensor.id, Sensor.install_elevation).where(Sensor.id.in_([p[0] for p in points]))
+        )).all())
+        points = [p + (heights[p[0]],) for p in points if heights.get(p[0]) is not None]
+    if len(points) < 2:
+        raise HTTPException(status_code=404, detail="Not enough located sensors for this section and metric")
+
+    ids = np.array([p[0] for p in points])
+    lng = np.array([p[2] for p in points])
+    lat = np.array([p[3] for p in points])
+    if plane == "profile":
+        nodes, frame = profile_coords(lng, lat, [p[4] for p in points])
+    else:
+        nodes, frame = local_plan_coords(lng, lat)
+    grid = Grid.around(nodes, cells)
+    surface = await asyncio.to_thread(SurfaceLayout, nodes, grid, method, k=neighbors, power=power)
+    layout = {
+        "sensor_ids": ids,
+        "metric_ids": [p[1] for p in points],
+        "frame": frame,
+        "surface": surface,
+    }
+    return surface_layouts.put(key, layout)
+
+
+async def _values_at(session: AsyncSession, metric_ids: list, frame_times: list, max_age: timedelta) -> np.ndarray:
+    """各测点在每个帧时刻的值（该时刻及之前 max_age 内最近的读数），形状 (测点数, 帧数)"""
+    stmt = (
+        select(SensorReading.metric_id, SensorReading.reading_time, SensorReading.value_num)
+        .where(SensorReading.metric_id.in_(metric_ids))
+        .where(SensorReading.reading_time >= frame_times[0] - max_age)
+        .where(SensorReading.reading_time <= frame_times[-1])
+        .where(SensorReading.value_num.is_not(None))
+        .order_by(SensorReading.metric_id, SensorReading.reading_time)
+    )
+    rows = (await session.execute(stmt)).all()
+    by_metric = {}
+    for metric_id, reading_time, value in rows:
+        by_metric.setdefault(metric_id, ([], []))
+        by_metric[metric_id][0].append(epoch_ms(reading_time))
+        by_metric[metric_id][1].append(value)
+
+    targets = np.array([epoch_ms(t) for t in frame_times], dtype=np.int64)
+    max_age_ms = int(max_age.total_seconds() * 1000)
+    values = np.full((len(metric_ids), len(targets)), np.nan)
+    for i, metric_id in enumerate(metric_ids):
+        if metric_id not in by_metric:
+            continue
+        times = np.array(by_metric[metric_id][0], dtype=np.int64)
+        idx = np.searchsorted(times, targets, side="right") - 1
+        ok = (idx >= 0) & (targets - times[np.maximum(idx, 0)] <= max_age_ms)
+        values[i, ok] = np.array(by_metric[metric_id][1], dtype=float)[idx[ok]]
+    return values
+
+
+@router.get("/{section_id}/surface")
+async def get_section_surface(
+    section_id: int,
+    metric_key: str = Query(..., description="指标键，如 pore_pressure / temperature / strain"),
+    time: Optional[datetime] = Query(None, description="单帧时刻（缺省为当前）"),
+    start_time: Optional[datetime] = Query(None, description="动画开始时刻"),
+    end_time: Optional[datetime] = Query(None, description="动画结束时刻"),
+    step_minutes: int = Query(60, ge=1, description="动画帧间隔（分钟）"),
+    max_age_minutes: int = Query(60, ge=1, description="取值时允许的最大读数滞后（分钟）"),
+    method: Literal["idw", "rbf"] = Query("idw", description="idw: 反距离加权, rbf: 薄板样条"),
+    plane: Literal["plan", "profile"] = Query("plan", description="plan: 平面, profile: 断面剖面（水平距离 × 高程）"),
+    cells: int = Query(DEFAULT_CELLS, ge=4, le=MAX_CELLS, description="网格最长边单元数"),
+    neighbors: int = Query(IDW_NEIGHBORS, ge=1, le=64, description="IDW 近邻数"),
+    power: float = Query(IDW_POWER, gt=0, le=6, description="IDW 幂次"),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    断面测点插值曲面。values 为每帧的网格值（行优先，y 由小到大），缺测处为 null。
+
+    权重按测点布局缓存，多帧请求只做一次矩阵乘法。
+    """
+    if start_time or end_time:
+        if not (start_time and end_time) or end_time < start_time:
+            raise HTTPException(status_code=400, detail="start_time and end_time must both be set and ordered")
+        step = timedelta(minutes=step_minutes)
+        count = int((end_time - start_time) / step) + 1
+        if count > MAX_FRAMES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_FRAMES} frames per request")
+        frame_times = [start_time + i * step for i in range(count)]
+    else:
+        frame_times = [time or datetime.now()]
+
+    layout = await _section_layout(session, section_id, metric_key, method, plane, cells, neighbors, power)
+    surface: SurfaceLayout = layout["surface"]
+    values = await _values_at(session, layout["metric_ids"], frame_times, timedelta(minutes=max_age_minutes))
+    frames = surface.evaluate(values)
+
+    finite = frames[np.isfinite(frames)]
+    return JSONResponse({
+        "section_id": section_id,
+        "metric_key": metric_key,
+        "method": method,
+        "plane": plane,
+        "frame": layout["frame"],
+        "grid": surface.grid.to_dict(),
+        "sensors": {
+            "id": layout["sensor_ids"].tolist(),
+            "x": surface.nodes[:, 0].tolist(),
+            "y": surface.nodes[:, 1].tolist(),
+        },
+        "time": [epoch_ms(t) for t in frame_times],
+        "sensor_values": [json_floats(values[:, i]) for i in range(len(frame_times))],
+        "values": [json_floats(f.ravel()) for f in frames],
+        "min": float(finite.min()) if finite.size else None,
+        "max": float(finite.max()) if finite.size else None,
+    })
@@ -0,0 +1,167 @@
+"""
+矢量瓦片（Mapbox Vector Tile）路由
+
+/tiles/{layer}/{z}/{x}/{y}.mvt，layer 为 sensors / stations / facilities。
+瓦片由 PostGIS ST_AsMVT 生成：先用 GiST 索引（&&）筛出瓦片范围内的点，
+再附带最新读数等属性；结果按数据版本（数据库 table_versions，重启后不变）缓存。
+设施图层进入内存 + 磁盘两级缓存；带最新读数的图层按时间桶滚动，只缓存在内存中。
+"""
+from typing import Callable, Dict, Literal, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select, desc, func, case, cast, String, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import get_session
+from app.models import Sensor, SensorMetric, SensorReading, HydrologicalStation, MonitoringFacility
+from app.api.hydrological import station_snapshot_stmt
+from app.utils.tile_cache import TileCache, version_token
+from app.utils.versions import etag_matches, sync_versions
+
+router = APIRouter(prefix="/tiles", tags=["tiles"])
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+MAX_ZOOM = 22
+
+_settings = get_settings()
+tile_cache = TileCache(_settings.tile_cache_dir or None, _settings.tile_cache_items)
+# 带最新读数的图层每个时间桶失效一次，写磁盘没有意义
+value_tile_cache = TileCache(None, _settings.tile_cache_items)
+
+
+def _tile_bounds(z: int, x: int, y: int):
+    """返回 (Web 墨卡托瓦片范围, 对应的 WGS84 范围)；后者用于命中 4326 几何上的索引"""
+    envelope = func.ST_TileEnvelope(z, x, y)
+    return envelope, func.ST_Transform(envelope, 4326)
+
+
+def _mvt_geom(location, envelope):
+    return func.ST_AsMVTGeom(func.ST_Transform(location, 3857), envelope).label("geom")
+
+
+def sensors_layer(z: int, x: int, y: int):
+    """传感器点位 + 最新一条读数（任一指标）及是否越限"""
+    envelope, bounds = _tile_bounds(z, x, y)
+    latest = (
+        select(SensorReading.value_num, SensorReading.reading_time)
+        .where(SensorReading.metric_id == SensorMetric.id)
+        .order_by(desc(SensorReading.reading_time))
+        .limit(1)
+        .lateral("latest")
+    )
+    sensor_latest = (
+        select(
+            SensorMetric.metric_key,
+            SensorMetric.unit,
+            latest.c.value_num,
+            latest.c.reading_time,
+            case(
+                (latest.c.value_num > SensorMetric.warn_high, 1),
+                (latest.c.value_num < SensorMetric.warn_low, 1),
+                else_=0,
+            ).label("alert"),
+        )
+        .join(latest, true())
+        .where(SensorMetric.sensor_id == Sensor.id)
+        .order_by(desc(latest.c.reading_time))
+        .limit(1)
+        .lateral("sensor_latest")
+    )
+    return (
+        select(
+            _mvt_geom(Sensor.location, envelope),
+            Sensor.id,
+            Sensor.point_code.label("code"),
+            Sensor.section_id,
+            Sensor.sensor_type_id,
+            Sensor.status,
+            Sensor.is_simulated,
+            sensor_latest.c.metric_key,
+            sensor_latest.c.unit,
+            sensor_latest.c.value_num.label("value"),
+            cast(sensor_latest.c.reading_time, String).label("time"),
+            sensor_latest.c.alert,
+        )
+        .outerjoin(sensor_latest, true())
+        .where(Sensor.location.op("&&")(bounds))
+    )
+
+
+def stations_layer(z: int, x: int, y: int):
+    """水文站点位 + 最新流量/流速/水位"""
+    envelope, bounds = _tile_bounds(z, x, y)
+    snapshot = station_snapshot_stmt().where(HydrologicalStation.location.op("&&")(bounds)).subquery()
+    return select(
+        _mvt_geom(snapshot.c.location, envelope),
+        snapshot.c.id,
+        snapshot.c.station_code.label("code"),
+        snapshot.c.station_name.label("name"),
+        snapshot.c.river_name,
+        snapshot.c.is_simulated,
+        snapshot.c.flow_rate,
+        snapshot.c.velocity,
+        snapshot.c.water_level,
+        cast(snapshot.c.latest_time, String).label("time"),
+    )
+
+
+def facilities_layer(z: int, x: int, y: int):
+    envelope, bounds = _tile_bounds(z, x, y)
+    return select(
+        _mvt_geom(MonitoringFacility.location, envelope),
+        MonitoringFacility.id,
+        MonitoringFacility.code,
+        MonitoringFacility.name,
+        MonitoringFacility.facility_type,
+        MonitoringFacility.is_simulated,
+    ).where(MonitoringFacility.location.op("&&")(bounds))
+
+
+# 图层 → (SQL 构造函数, 依赖表, 是否携带最新读数)
+LAYERS: Dict[str, Tuple[Callable, Tuple[str, ...], bool]] = {
+    "sensors": (sensors_layer, ("sensors", "sensor_metrics", "sensor_readings"), True),
+    "stations": (
+        stations_layer,
+        ("hydrological_stations", "sensors", "sensor_metrics", "sensor_readings"),
+        True,
+    ),
+    "facilities": (facilities_layer, ("monitoring_facilities",), False),
+}
+
+
+def tile_stmt(layer: str, z: int, x: int, y: int):
+    build, _, _ = LAYERS[layer]
+    features = build(z, x, y).subquery("features")
+    return select(func.ST_AsMVT(features.table_valued(), layer)).select_from(features)
+
+
+@router.get("/{layer}/{z}/{x}/{y}.mvt")
+async def get_tile(
+    layer: Literal["sensors", "stations", "facilities"],
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+):
+    """获取矢量瓦片（无要素时返回空瓦片）"""
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+
+    _, tables, has_values = LAYERS[layer]
+    await sync_versions()
+    token = version_token(tables, _settings.tile_values_ttl_sec if has_values else 0)
+    etag = f'"{layer}-{token}-{z}-{x}-{y}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    cache = value_tile_cache if has_values else tile_cache
+    key = (layer, token, z, x, y)
+    data = await cache.get(key)
+    if data is None:
+        data = (await session.execute(tile_stmt(layer, z, x, y))).scalar() or b""
+        data = bytes(data)
+        await cache.put(key, data)
+    return Response(content=data, media_type=MVT_MEDIA_TYPE, headers=headers)
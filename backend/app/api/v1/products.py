@@ -1,19 +1,21 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_session
-from app.models import ModelProduct, RasterProduct, VectorProduct
 from app.schemas.sensor import ProductOut
+from app.utils.catalog import get_catalog
+from app.utils.rating_curve import RATING_CURVE_PRODUCT_TYPE
+from app.utils.reservoir import LEVEL_CAPACITY_PRODUCT_TYPE
+from app.utils.versions import etag_guard
 
 router = APIRouter()
 
+# Stored as model products but read through their own endpoints, never listed
+INTERNAL_MODEL_PRODUCT_TYPES = frozenset({RATING_CURVE_PRODUCT_TYPE, LEVEL_CAPACITY_PRODUCT_TYPE})
 
-@router.get("/models", response_model=list[ProductOut])
+
+@router.get("/models", response_model=list[ProductOut], dependencies=[Depends(etag_guard("model_products"))])
 async def list_model_products(is_simulated: bool | None = None, session: AsyncSession = Depends(get_session)):
-    stmt = select(ModelProduct)
-    if is_simulated is not None:
-        stmt = stmt.where(ModelProduct.is_simulated == is_simulated)
-    rows = (await session.execute(stmt)).scalars().all()
+    cat = await get_catalog(session, "model_products")
     return [
         ProductOut(
             id=r.id,
@@ -27,16 +29,15 @@ async def list_model_products(is_simulated: bool | None = None, session: AsyncSe
             meta=r.meta,
             is_simulated=r.is_simulated,
         )
-        for r in rows
+        for r in cat.model_products.values()
+        if r.product_type not in INTERNAL_MODEL_PRODUCT_TYPES
+        and (is_simulated is None or r.is_simulated == is_simulated)
     ]
 
 
-@router.get("/rasters", response_model=list[ProductOut])
+@router.get("/rasters", response_model=list[ProductOut], dependencies=[Depends(etag_guard("raster_products"))])
 async def list_raster_products(is_simulated: bool | None = None, session: AsyncSession = Depends(get_session)):
-    stmt = select(RasterProduct)
-    if is_simulated is not None:
-        stmt = stmt.where(RasterProduct.is_simulated == is_simulated)
-    rows = (await session.execute(stmt)).scalars().all()
+    cat = await get_catalog(session, "raster_products")
     return [
         ProductOut(
             id=r.id,
@@ -50,16 +51,14 @@ async def list_raster_products(is_simulated: bool | None = None, session: AsyncS
             meta=r.meta,
             is_simulated=r.is_simulated,
         )
-        for r in rows
+        for r in cat.raster_products.values()
+        if is_simulated is None or r.is_simulated == is_simulated
     ]
 
 
-@router.get("/vectors", response_model=list[ProductOut])
+@router.get("/vectors", response_model=list[ProductOut], dependencies=[Depends(etag_guard("vector_products"))])
 async def list_vector_products(is_simulated: bool | None = None, session: AsyncSession = Depends(get_session)):
-    stmt = select(VectorProduct)
-    if is_simulated is not None:
-        stmt = stmt.where(VectorProduct.is_simulated == is_simulated)
-    rows = (await session.execute(stmt)).scalars().all()
+    cat = await get_catalog(session, "vector_products")
     return [
         ProductOut(
             id=r.id,
@@ -73,5 +72,6 @@ async def list_vector_products(is_simulated: bool | None = None, session: AsyncS
             meta=r.meta,
             is_simulated=r.is_simulated,
         )
-        for r in rows
+        for r in cat.vector_products.values()
+        if is_simulated is None or r.is_simulated == is_simulated
     ]
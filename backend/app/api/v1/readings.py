@@ -1,27 +1,39 @@
+import csv
+import io
+import json
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select, desc
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select, desc, asc
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_session
+from app.database import get_session, AsyncSessionLocal
 from app.models import SensorReading, SensorMetric
 from app.schemas.sensor import SensorReadingOut
+from app.utils.columnar import build_columnar
+from app.utils.arrow_stream import arrow_ipc_stream, parquet_stream, pa
 
 router = APIRouter()
+# Mounted without the /readings prefix so paths can carry a file extension
+arrow_router = APIRouter(tags=["readings"])
 
+# Rows fetched per server-side cursor round trip during export
+EXPORT_BATCH_SIZE = 5000
+EXPORT_COLUMNS = [
+    "id",
+    "sensor_id",
+    "metric_id",
+    "metric_key",
+    "reading_time",
+    "value_num",
+    "unit",
+    "quality_flag",
+    "is_simulated",
+]
 
-@router.get("", response_model=list[SensorReadingOut])
-async def list_readings(
-    limit: int = 100,
-    sensor_id: Optional[int] = None,
-    metric_key: Optional[str] = None,
-    start: Optional[datetime] = Query(None),
-    end: Optional[datetime] = Query(None),
-    is_simulated: Optional[bool] = None,
-    session: AsyncSession = Depends(get_session),
-):
-    stmt = select(SensorReading).join(SensorMetric)
+
+def _apply_filters(stmt, sensor_id, metric_key, start, end, is_simulated):
     if sensor_id:
         stmt = stmt.where(SensorReading.sensor_id == sensor_id)
     if metric_key:
@@ -32,7 +44,35 @@ async def list_readings(
         stmt = stmt.where(SensorReading.reading_time <= end)
     if is_simulated is not None:
         stmt = stmt.where(SensorReading.is_simulated == is_simulated)
+    return stmt
+
+
+@router.get("", response_model=list[SensorReadingOut])
+async def list_readings(
+    limit: int = 100,
+    sensor_id: Optional[int] = None,
+    metric_key: Optional[str] = None,
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    is_simulated: Optional[bool] = None,
+    format: Literal["rows", "columnar"] = Query("rows", description="rows: list of readings, columnar: time axis + per-metric arrays"),
+    session: AsyncSession = Depends(get_session),
+):
+    if format == "columnar":
+        stmt = select(
+            SensorReading.reading_time,
+            SensorReading.metric_id,
+            SensorReading.sensor_id,
+            SensorMetric.metric_key,
+            SensorMetric.unit,
+            SensorReading.value_num,
+        ).join(SensorMetric, SensorMetric.id == SensorReading.metric_id)
+    else:
+        stmt = select(SensorReading).join(SensorMetric)
+    stmt = _apply_filters(stmt, sensor_id, metric_key, start, end, is_simulated)
     stmt = stmt.order_by(desc(SensorReading.reading_time)).limit(limit)
+    if format == "columnar":
+        return JSONResponse(build_columnar((await session.execute(stmt)).all()))
     rows = (await session.execute(stmt)).scalars().all()
     return [
         SensorReadingOut(
@@ -46,3 +86,120 @@ async def list_readings(
         )
         for r in rows
     ]
+
+
+def _format_ndjson(rows) -> str:
+    return "".join(
+        json.dumps(
+            dict(zip(EXPORT_COLUMNS, (*r[:4], r[4].isoformat(), *r[5:]))),
+            ensure_ascii=False,
+        )
+        + "\n"
+        for r in rows
+    )
+
+
+def _format_csv(rows) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows((*r[:4], r[4].isoformat(), *r[5:]) for r in rows)
+    return buf.getvalue()
+
+
+async def _stream_batches(stmt):
+    """Yield row batches from a server-side cursor."""
+    # The request-scoped session is closed before a streaming body is sent,
+    # so the export owns its session for the lifetime of the cursor.
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for batch in result.partitions():
+            yield batch
+
+
+async def _stream_export(stmt, fmt: str):
+    """Stream rows from a server-side cursor, one batch at a time."""
+    if fmt == "csv":
+        yield ",".join(EXPORT_COLUMNS) + "\n"
+    formatter = _format_csv if fmt == "csv" else _format_ndjson
+    async for batch in _stream_batches(stmt):
+        yield formatter(batch)
+
+
+def _export_stmt(sensor_id, metric_key, start, end, is_simulated, limit):
+    stmt = select(
+        SensorReading.id,
+        SensorReading.sensor_id,
+        SensorReading.metric_id,
+        SensorMetric.metric_key,
+        SensorReading.reading_time,
+        SensorReading.value_num,
+        SensorReading.unit,
+        SensorReading.quality_flag,
+        SensorReading.is_simulated,
+    ).join(SensorMetric, SensorMetric.id == SensorReading.metric_id)
+    stmt = _apply_filters(stmt, sensor_id, metric_key, start, end, is_simulated)
+    stmt = stmt.order_by(asc(SensorReading.reading_time), asc(SensorReading.id))
+    if limit:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+@router.get("/export")
+async def export_readings(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    sensor_id: Optional[int] = None,
+    metric_key: Optional[str] = None,
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    is_simulated: Optional[bool] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Stream readings as NDJSON or CSV in time order with constant server memory."""
+    stmt = _export_stmt(sensor_id, metric_key, start, end, is_simulated, limit)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"readings.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        _stream_export(stmt, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@arrow_router.get("/readings.arrow")
+async def export_readings_arrow(
+    sensor_id: Optional[int] = None,
+    metric_key: Optional[str] = None,
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    is_simulated: Optional[bool] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Stream readings as an Arrow IPC stream (read with pyarrow.ipc.open_stream)."""
+    if pa is None:
+        raise HTTPException(status_code=501, detail="pyarrow is not installed")
+    stmt = _export_stmt(sensor_id, metric_key, start, end, is_simulated, limit)
+    return StreamingResponse(
+        arrow_ipc_stream(_stream_batches(stmt)),
+        media_type="application/vnd.apache.arrow.stream",
+        headers={"Content-Disposition": 'attachment; filename="readings.arrow"'},
+    )
+
+
+@arrow_router.get("/readings.parquet")
+async def export_readings_parquet(
+    sensor_id: Optional[int] = None,
+    metric_key: Optional[str] = None,
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    is_simulated: Optional[bool] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Stream readings as Parquet, one row group per cursor batch."""
+    if pa is None:
+        raise HTTPException(status_code=501, detail="pyarrow is not installed")
+    stmt = _export_stmt(sensor_id, metric_key, start, end, is_simulated, limit)
+    return StreamingResponse(
+        parquet_stream(_stream_batches(stmt)),
+        media_type="application/vnd.apache.parquet",
+        headers={"Content-Disposition": 'attachment; filename="readings.parquet"'},
+    )
@@ -1,20 +1,70 @@
-from fastapi import APIRouter, Depends
+import json
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_session
-from app.models import Sensor, SensorMetric
-from app.schemas.sensor import SensorOut, SensorMetricOut
-from geoalchemy2.shape import to_shape
+from app.models import SensorMetric
+from app.schemas.sensor import SensorOut, SensorMetricOut, SensorClusterOut
+from app.utils.versions import etag_guard
+from app.utils.catalog import get_catalog
+from app.utils.clustering import sensor_clusters, warning_levels
+from app.tasks.realtime_push import check_warnings
+from app.api.v1.spatial import parse_bbox
 
 router = APIRouter()
 
 
-@router.get("", response_model=list[SensorOut])
-async def list_sensors(is_simulated: bool | None = None, session: AsyncSession = Depends(get_session)):
-    stmt = select(Sensor)
+# Features serialized per chunk of the streamed GeoJSON body
+GEOJSON_CHUNK_SIZE = 1000
+
+
+def _sensor_feature(s) -> dict:
+    return {
+        "type": "Feature",
+        "id": s.id,
+        "geometry": {"type": "Point", "coordinates": [s.lng, s.lat]} if s.lng is not None else None,
+        "properties": {
+            "code": s.point_code,
+            "section_id": s.section_id,
+            "sensor_type_id": s.sensor_type_id,
+            "status": s.status,
+            "is_simulated": s.is_simulated,
+        },
+    }
+
+
+def _geojson_chunks(sensors):
+    """Yield a FeatureCollection incrementally, GEOJSON_CHUNK_SIZE features at a time."""
+    yield '{"type":"FeatureCollection","features":['
+    for start in range(0, len(sensors), GEOJSON_CHUNK_SIZE):
+        chunk = ",".join(
+            json.dumps(_sensor_feature(s), ensure_ascii=False, separators=(",", ":"))
+            for s in sensors[start:start + GEOJSON_CHUNK_SIZE]
+        )
+        yield ("," if start else "") + chunk
+    yield "]}"
+
+
+@router.get("", response_model=list[SensorOut], dependencies=[Depends(etag_guard("sensors"))])
+async def list_sensors(
+    response: Response,
+    is_simulated: bool | None = None,
+    format: Literal["json", "geojson"] = Query("json", description="geojson: streamed FeatureCollection"),
+    session: AsyncSession = Depends(get_session),
+):
+    # Coordinates are projected with ST_X/ST_Y when the catalog loads,
+    # so no geometry is decoded per request
+    cat = await get_catalog(session, "sensors")
+    sensors = sorted(cat.sensors.values(), key=lambda s: s.id)
     if is_simulated is not None:
-        stmt = stmt.where(Sensor.is_simulated == is_simulated)
-    sensors = (await session.execute(stmt)).scalars().all()
+        sensors = [s for s in sensors if s.is_simulated == is_simulated]
+    if format == "geojson":
+        # A returned response bypasses the injected one, so carry over etag_guard's headers
+        headers = {k: response.headers[k] for k in ("ETag", "Cache-Control") if k in response.headers}
+        return StreamingResponse(_geojson_chunks(sensors), media_type="application/geo+json", headers=headers)
     return [
         SensorOut(
             id=s.id,
@@ -22,14 +72,33 @@ async def list_sensors(is_simulated: bool | None = None, session: AsyncSession =
             section_id=s.section_id,
             sensor_type_id=s.sensor_type_id,
             is_simulated=s.is_simulated,
-            lng=to_shape(s.location).x if s.location is not None else None,
-            lat=to_shape(s.location).y if s.location is not None else None,
+            lng=s.lng,
+            lat=s.lat,
         )
         for s in sensors
     ]
 
 
-@router.get("/{sensor_id}/metrics", response_model=list[SensorMetricOut])
+@router.get("/clusters", response_model=list[SensorClusterOut])
+async def list_sensor_clusters(
+    zoom: int = Query(..., ge=0, le=22, description="Map zoom level"),
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat (WGS84)"),
+    session: AsyncSession = Depends(get_session),
+):
+    """Sensors aggregated into screen-space grid cells for the given zoom level."""
+    cat = await get_catalog(session, "sensors")
+    sensor_clusters.sync(cat.sensors)
+    # Alert levels are normally kept fresh by the realtime push task
+    if sensor_clusters.levels_stale():
+        sensor_clusters.set_levels(warning_levels(await check_warnings()))
+    return sensor_clusters.query(zoom, parse_bbox(bbox) if bbox else None)
+
+
+@router.get(
+    "/{sensor_id}/metrics",
+    response_model=list[SensorMetricOut],
+    dependencies=[Depends(etag_guard("sensor_metrics"))],
+)
 async def list_sensor_metrics(sensor_id: int, session: AsyncSession = Depends(get_session)):
     stmt = select(SensorMetric).where(SensorMetric.sensor_id == sensor_id)
     metrics = (await session.execute(stmt)).scalars().all()
@@ -0,0 +1,133 @@
+"""Viewport and nearest-neighbour queries over point geometries.
+
+Both query kinds are answered by the GiST indexes on the location columns:
+bbox queries use ST_Intersects against an envelope, near queries order by the
+KNN ``<->`` operator so only the k closest index entries are visited.
+"""
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_session
+from app.models import Sensor, HydrologicalStation
+from app.schemas.sensor import SpatialSensorOut
+from app.schemas.hydrological import SpatialStationOut
+from app.utils.versions import etag_guard
+
+router = APIRouter()
+
+MAX_K = 1000
+
+
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """Parse ``minLng,minLat,maxLng,maxLat``."""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be minLng,minLat,maxLng,maxLat")
+    if min_lng > max_lng or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="bbox min must not exceed max")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def parse_point(near: str) -> Tuple[float, float]:
+    """Parse ``lng,lat``."""
+    try:
+        lng, lat = (float(v) for v in near.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="near must be lng,lat")
+    return lng, lat
+
+
+def spatial_filter(stmt, geom_col, bbox: Optional[str], near: Optional[str], k: int):
+    """
+    Restrict stmt to a bbox or the k nearest rows to a point.
+
+    Returns (stmt, distance_column); distance_column is None for bbox queries.
+    """
+    if (bbox is None) == (near is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of bbox or near")
+    if bbox is not None:
+        envelope = func.ST_MakeEnvelope(*parse_bbox(bbox), 4326)
+        return stmt.where(func.ST_Intersects(geom_col, envelope)), None
+    point = func.ST_SetSRID(func.ST_MakePoint(*parse_point(near)), 4326)
+    distance = func.ST_DistanceSphere(geom_col, point).label("distance_m")
+    stmt = stmt.add_columns(distance).where(geom_col.isnot(None))
+    return stmt.order_by(geom_col.op("<->")(point)).limit(k), distance
+
+
+@router.get("/sensors", response_model=list[SpatialSensorOut], dependencies=[Depends(etag_guard("sensors"))])
+async def spatial_sensors(
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat (WGS84)"),
+    near: Optional[str] = Query(None, description="lng,lat (WGS84)"),
+    k: int = Query(10, ge=1, le=MAX_K, description="Number of nearest sensors for near queries"),
+    is_simulated: Optional[bool] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """Sensors inside a bbox, or the k nearest sensors ordered by distance."""
+    stmt = select(
+        Sensor.id,
+        Sensor.point_code,
+        Sensor.section_id,
+        Sensor.sensor_type_id,
+        Sensor.is_simulated,
+        func.ST_X(Sensor.location),
+        func.ST_Y(Sensor.location),
+    )
+    if is_simulated is not None:
+        stmt = stmt.where(Sensor.is_simulated == is_simulated)
+    stmt, distance = spatial_filter(stmt, Sensor.location, bbox, near, k)
+    rows = (await session.execute(stmt)).all()
+    return [
+        SpatialSensorOut(
+            id=row[0],
+            code=row[1],
+            section_id=row[2],
+            sensor_type_id=row[3],
+            is_simulated=row[4],
+            lng=row[5],
+            lat=row[6],
+            distance_m=row[7] if distance is not None else None,
+        )
+        for row in rows
+    ]
+
+
+@router.get(
+    "/stations",
+    response_model=list[SpatialStationOut],
+    dependencies=[Depends(etag_guard("hydrological_stations"))],
+)
+async def spatial_stations(
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat (WGS84)"),
+    near: Optional[str] = Query(None, description="lng,lat (WGS84)"),
+    k: int = Query(10, ge=1, le=MAX_K, description="Number of nearest stations for near queries"),
+    is_simulated: Optional[bool] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """Hydrological stations inside a bbox, or the k nearest ordered by distance."""
+    stmt = select(
+        HydrologicalStation.id,
+        HydrologicalStation.station_code,
+        HydrologicalStation.station_name,
+        HydrologicalStation.is_simulated,
+        func.ST_X(HydrologicalStation.location),
+        func.ST_Y(HydrologicalStation.location),
+    )
+    if is_simulated is not None:
+        stmt = stmt.where(HydrologicalStation.is_simulated == is_simulated)
+    stmt, distance = spatial_filter(stmt, HydrologicalStation.location, bbox, near, k)
+    rows = (await session.execute(stmt)).all()
+    return [
+        SpatialStationOut(
+            id=row[0],
+            station_code=row[1],
+            station_name=row[2],
+            is_simulated=row[3],
+            lng=row[4],
+            lat=row[5],
+            distance_m=row[6] if distance is not None else None,
+        )
+        for row in rows
+    ]
@@ -0,0 +1,87 @@
+"""Packed binary frames for the 3D twin scene.
+
+One request returns ECEF positions, latest values and alert levels for every
+located sensor in a single little-endian buffer (layout documented in
+app.utils.twin_frame). Positions only change with the sensor catalog, so they
+are computed once per catalog version and can be skipped by clients that
+already hold them.
+"""
+from typing import Optional
+
+import numpy as np
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_session
+from app.models import Sensor
+from app.utils.catalog import get_catalog, latest_readings
+from app.utils.clustering import sensor_clusters, warning_levels
+from app.utils.twin_frame import TwinLayout, pack_frame, twin_layouts
+from app.utils.versions import content_token
+from app.tasks.realtime_push import check_warnings
+
+router = APIRouter()
+
+
+async def _current_layout(session: AsyncSession, cat) -> TwinLayout:
+    version = content_token(["sensors"])
+    layout = twin_layouts.get(version)
+    if layout is not None:
+        return layout
+    located = [s for s in cat.sensors.values() if s.lng is not None and s.lat is not None]
+    located.sort(key=lambda s: s.id)
+    # install_elevation is orthometric; the geoid offset is ignored for display purposes
+    heights = dict((await session.execute(select(Sensor.id, Sensor.install_elevation))).all())
+    return twin_layouts.put(TwinLayout.build(
+        version,
+        [s.id for s in located],
+        [s.lng for s in located],
+        [s.lat for s in located],
+        [heights.get(s.id) for s in located],
+    ))
+
+
+def _value_metric_ids(cat, sensor_ids, metric_key: Optional[str]) -> list:
+    """Metric feeding each sensor's value: metric_key if given, else the sensor's first metric."""
+    result = []
+    for sensor_id in sensor_ids:
+        metrics = sorted(cat.metrics_by_sensor.get(int(sensor_id), ()), key=lambda m: m.id)
+        if metric_key is not None:
+            metrics = [m for m in metrics if m.metric_key == metric_key]
+        result.append(metrics[0].id if metrics else None)
+    return result
+
+
+@router.get("/frame", response_class=Response)
+async def get_twin_frame(
+    metric_key: Optional[str] = Query(None, description="Metric to report; defaults to each sensor's first metric"),
+    positions_version: Optional[str] = Query(None, description="Omit positions when this matches the current layout"),
+    session: AsyncSession = Depends(get_session),
+):
+    """Positions (float64 ECEF), latest values (float32), alert levels (uint8) and sensor ids."""
+    cat = await get_catalog(session, "sensors", "sensor_metrics")
+    layout = await _current_layout(session, cat)
+
+    metric_ids = _value_metric_ids(cat, layout.sensor_ids, metric_key)
+    latest = await latest_readings(session, [m for m in metric_ids if m is not None])
+    values = np.array(
+        [latest[m].value_num if m in latest and latest[m].value_num is not None else np.nan for m in metric_ids],
+        dtype=np.float32,
+    )
+
+    # Alert levels are normally kept fresh by the realtime push task
+    if sensor_clusters.levels_stale():
+        sensor_clusters.set_levels(warning_levels(await check_warnings()))
+    levels = np.array([sensor_clusters.levels.get(int(s), 0) for s in layout.sensor_ids], dtype=np.uint8)
+
+    include_positions = positions_version != layout.version
+    return Response(
+        content=pack_frame(layout, values, levels, include_positions),
+        media_type="application/octet-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Twin-Positions-Version": layout.version,
+        },
+    )
@@ -0,0 +1,230 @@
+"""Negotiated response compression (zstd / br / gzip) with a precompressed cache.
+
+Responses that carry an ETag (catalog endpoints, the station tree) are
+compressed once per content version and encoding; later requests for the
+same version reuse the cached bytes. Streaming responses are compressed
+incrementally and never cached.
+"""
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# Preference order when the client accepts several encodings equally
+SUPPORTED_ENCODINGS = [
+    enc for enc, available in (("zstd", zstandard), ("br", brotli), ("gzip", True)) if available
+]
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/geo+json",
+    "text/",
+    "application/javascript",
+    "application/xml",
+    "application/vnd.mapbox-vector-tile",
+)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+    best, best_q = None, 0.0
+    for enc in SUPPORTED_ENCODINGS:
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+class _Compressor:
+    """Uniform incremental interface over zlib / brotli / zstandard."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=5)
+        else:
+            self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data) + self._obj.flush()
+        if self.encoding == "zstd":
+            return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return zlib.compress(data, 6, wbits=31)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """Each representation gets its own strong ETag, e.g. "abc" -> "abc-gzip"."""
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+class PrecompressedCache:
+    """Byte-bounded LRU of compressed bodies keyed by (ETag, encoding)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        body = self._items.get(key)
+        if body is not None:
+            self._items.move_to_end(key)
+        return body
+
+    def put(self, key: Tuple[str, str], body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._items[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, cache_bytes: int = 32 * 1024 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = PrecompressedCache(cache_bytes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Identity responses still go through the responder so that caches see Vary
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: Optional[str], send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start: Optional[Message] = None
+        self.mode: Optional[str] = None  # "passthrough" | "stream"
+        self.compressor: Optional[_Compressor] = None
+
+    def _eligible(self, headers: Headers) -> bool:
+        if self.start["status"] != 200 or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _set_encoding_headers(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = self.encoding
+        if "etag" in headers:
+            headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        if self.mode == "passthrough":
+            await self._send(message)
+            return
+        if self.mode == "stream":
+            body = self.compressor.compress(message.get("body", b""))
+            if not message.get("more_body", False):
+                body += self.compressor.finish()
+            await self._send({**message, "body": body})
+            return
+
+        # First body message decides how the response is handled
+        headers = MutableHeaders(raw=self.start["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start["status"] == 304 and "etag" in headers:
+            # Echo the ETag of the representation the client has cached
+            if self.encoding:
+                headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+            headers.add_vary_header("Accept-Encoding")
+        eligible = self._eligible(headers)
+        if eligible:
+            # The representation depends on Accept-Encoding even when it is sent uncompressed
+            headers.add_vary_header("Accept-Encoding")
+        if (
+            not eligible
+            or self.encoding is None
+            or (not more_body and len(body) < self.middleware.minimum_size)
+        ):
+            self.mode = "passthrough"
+            await self._send(self.start)
+            await self._send(message)
+            return
+
+        if more_body:
+            self.mode = "stream"
+            self.compressor = _Compressor(self.encoding)
+            del headers["Content-Length"]
+            self._set_encoding_headers(headers)
+            await self._send(self.start)
+            await self._send({**message, "body": self.compressor.compress(body)})
+            return
+
+        etag = headers.get("etag")
+        compressed = None
+        if etag:
+            key = (etag, self.encoding)
+            compressed = self.middleware.cache.get(key)
+            if compressed is None:
+                compressed = compress_bytes(body, self.encoding)
+                self.middleware.cache.put(key, compressed)
+        else:
+            compressed = compress_bytes(body, self.encoding)
+        self._set_encoding_headers(headers)
+        headers["Content-Length"] = str(len(compressed))
+        await self._send(self.start)
+        await self._send({**message, "body": compressed})
@@ -10,6 +10,32 @@ class Settings(BaseSettings):
     api_prefix: str = "/api"
     enable_seed_data: bool = False
     debug: bool = True
+    # Excel 列式缓存目录（Arrow IPC sidecar）
+    sidecar_cache_dir: str = ".cache/sidecars"
+    # 数据库中 naive 时间（读数时间等）所属的时区，用于换算 epoch 毫秒
+    data_timezone: str = "Asia/Shanghai"
+    # 表版本（ETag 与目录缓存失效）从数据库 table_versions 重新读取的最短间隔（秒）
+    version_sync_interval_sec: float = 1.0
+    # /api/stats 快照后台刷新间隔（秒）
+    stats_snapshot_interval_sec: float = 30.0
+    # 响应压缩：小于该字节数不压缩；预压缩缓存上限（MB）
+    compression_min_size: int = 1024
+    compression_cache_mb: int = 32
+    # 矢量瓦片缓存：磁盘目录（留空则只用内存）、内存瓦片数、最新读数属性的刷新周期（秒）
+    tile_cache_dir: str = ".cache/tiles"
+    tile_cache_items: int = 2048
+    tile_values_ttl_sec: float = 60.0
+    # 栅格产品文件根目录（产品 path 相对该目录解析）、已解码栅格（含概览层）的内存缓存帧数
+    raster_root: str = "../public"
+    raster_source_items: int = 24
+    # 降水格网时空立方体（分块 memmap）目录
+    rain_cube_dir: str = ".cache/rain_cube"
+    # 降水等值线：生成线程数、内存缓存条数、新帧预生成检查间隔（秒）
+    isohyet_workers: int = 2
+    isohyet_cache_items: int = 512
+    isohyet_pregen_interval_sec: float = 60.0
+    # 洪水淹没范围：按缩放级别与时刻的 GeoJSON 响应内存缓存条数
+    flood_cache_items: int = 512
 
     class Config:
         env_file = ".env"
@@ -4,45 +4,55 @@ import random
 from datetime import datetime
 from fastapi import FastAPI, HTTPException, Query, Depends, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import select, desc, or_
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from .utils.scanner import scan_data_directory, DATA_ROOT
+from .utils.scanner import DATA_ROOT
 from .utils.reader import read_excel_data
-from .utils.stats import calculate_overview_stats, get_warning_data
+from .utils.stats import get_warning_data
+from .utils.file_index import get_file_index
 from .utils.mock_data import get_mock_flood_events, get_mock_rain_grid_frames, get_mock_iot_devices, get_mock_3d_resources
 from .websocket import manager
+from .compression import CompressionMiddleware
+from .config import get_settings
 from app.database import get_session
-from app.models import Sensor, SensorMetric, SensorReading, ModelProduct, RasterProduct, VectorProduct
 from app.api.router import api_router
+from app.api.v1.products import INTERNAL_MODEL_PRODUCT_TYPES
 from app.schemas.data import WaterLevelOut, RainfallOut, StatsOut, WarningOut, MetricLatestOut
-from app.tasks import realtime_push_task
+from app.utils.versions import etag_guard
+from app.utils.catalog import get_catalog, latest_readings
+from app.tasks import isohyet_pregen_task, realtime_push_task, stats_snapshot_service, stats_snapshot_task
 
 app = FastAPI(title="Water Digital Twin Backend", version="1.0.0")
 
-# Background task reference
+# Background task references
 _realtime_task = None
+_stats_task = None
+_isohyet_task = None
 
 
 @app.on_event("startup")
 async def startup_event():
     """Start background tasks on app startup."""
-    global _realtime_task
+    global _realtime_task, _stats_task, _isohyet_task
     _realtime_task = asyncio.create_task(realtime_push_task())
     print("[startup] Real-time push task started")
+    _stats_task = asyncio.create_task(stats_snapshot_task())
+    print("[startup] Stats snapshot task started")
+    _isohyet_task = asyncio.create_task(isohyet_pregen_task())
+    print("[startup] Isohyet pregeneration task started")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cancel background tasks on app shutdown."""
-    global _realtime_task
-    if _realtime_task:
-        _realtime_task.cancel()
-        try:
-            await _realtime_task
-        except asyncio.CancelledError:
-            pass
-    print("[shutdown] Real-time push task stopped")
+    for task in (_realtime_task, _stats_task, _isohyet_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    print("[shutdown] Background tasks stopped")
 
 app.include_router(api_router, prefix="/api/v1")
 
@@ -126,26 +136,11 @@ async def _latest_readings_for_metric(
     is_simulated: bool | None = None,
     warn_only: bool = False,
 ):
-    metrics_stmt = select(SensorMetric).options(selectinload(SensorMetric.sensor))
-    if metric_keys:
-        metrics_stmt = metrics_stmt.where(SensorMetric.metric_key.in_(metric_keys))
-    if warn_only:
-        metrics_stmt = metrics_stmt.where(or_(SensorMetric.warn_low.is_not(None), SensorMetric.warn_high.is_not(None)))
-    if is_simulated is not None:
-        metrics_stmt = metrics_stmt.join(Sensor).where(Sensor.is_simulated == is_simulated)
-    metrics_res = (await session.execute(metrics_stmt)).scalars().all()
-    results = []
-    for metric in metrics_res:
-        sensor = metric.sensor
-        reading_stmt = (
-            select(SensorReading)
-            .where(SensorReading.metric_id == metric.id)
-            .order_by(desc(SensorReading.reading_time))
-            .limit(1)
-        )
-        reading = (await session.execute(reading_stmt)).scalars().first()
-        results.append((sensor, metric, reading))
-    return results
+    """指标元数据取自目录缓存，最新读数一次查询取回，在内存中关联"""
+    cat = await get_catalog(session, "sensors", "sensor_metrics")
+    metrics = sorted(cat.find_metrics(metric_keys, is_simulated, warn_only), key=lambda m: m.id)
+    readings = await latest_readings(session, [m.id for m in metrics])
+    return [(cat.sensors[m.sensor_id], m, readings.get(m.id)) for m in metrics if m.sensor_id in cat.sensors]
 
 
 @app.get("/api/water_levels", response_model=list[WaterLevelOut])
@@ -182,12 +177,9 @@ async def api_rainfall(is_simulated: bool | None = None, session: AsyncSession =
     ]
 
 
-@app.get("/api/model_products")
+@app.get("/api/model_products", dependencies=[Depends(etag_guard("model_products"))])
 async def api_model_products(is_simulated: bool | None = None, session: AsyncSession = Depends(get_session)):
-    stmt = select(ModelProduct)
-    if is_simulated is not None:
-        stmt = stmt.where(ModelProduct.is_simulated == is_simulated)
-    res = (await session.execute(stmt)).scalars().all()
+    cat = await get_catalog(session, "model_products")
     return [
         {
             "id": mp.id,
@@ -201,16 +193,15 @@ async def api_model_products(is_simulated: bool | None = None, session: AsyncSes
             "meta": mp.meta,
             "is_simulated": mp.is_simulated,
         }
-        for mp in res
+        for mp in cat.model_products.values()
+        if mp.product_type not in INTERNAL_MODEL_PRODUCT_TYPES
+        and (is_simulated is None or mp.is_simulated == is_simulated)
     ]
 
 
-@app.get("/api/raster_products")
+@app.get("/api/raster_products", dependencies=[Depends(etag_guard("raster_products"))])
 async def api_raster_products(is_simulated: bool | None = None, session: AsyncSession = Depends(get_session)):
-    stmt = select(RasterProduct)
-    if is_simulated is not None:
-        stmt = stmt.where(RasterProduct.is_simulated == is_simulated)
-    res = (await session.execute(stmt)).scalars().all()
+    cat = await get_catalog(session, "raster_products")
     return [
         {
             "id": rp.id,
@@ -225,16 +216,14 @@ async def api_raster_products(is_simulated: bool | None = None, session: AsyncSe
             "meta": rp.meta,
             "is_simulated": rp.is_simulated,
         }
-        for rp in res
+        for rp in cat.raster_products.values()
+        if is_simulated is None or rp.is_simulated == is_simulated
     ]
 
 
-@app.get("/api/vector_products")
+@app.get("/api/vector_products", dependencies=[Depends(etag_guard("vector_products"))])
 async def api_vector_products(is_simulated: bool | None = None, session: AsyncSession = Depends(get_session)):
-    stmt = select(VectorProduct)
-    if is_simulated is not None:
-        stmt = stmt.where(VectorProduct.is_simulated == is_simulated)
-    res = (await session.execute(stmt)).scalars().all()
+    cat = await get_catalog(session, "vector_products")
     return [
         {
             "id": vp.id,
@@ -248,7 +237,8 @@ async def api_vector_products(is_simulated: bool | None = None, session: AsyncSe
             "meta": vp.meta,
             "is_simulated": vp.is_simulated,
         }
-        for vp in res
+        for vp in cat.vector_products.values()
+        if is_simulated is None or vp.is_simulated == is_simulated
     ]
 
 
@@ -303,6 +293,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按 Accept-Encoding 协商压缩（zstd / br / gzip）；带 ETag 的响应按版本缓存压缩结果
+settings = get_settings()
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_min_size,
+    cache_bytes=settings.compression_cache_mb * 1024 * 1024,
+)
+
 @app.get("/")
 async def root():
     return {"message": "Water Digital Twin API is running", "status": "ok"}
@@ -311,10 +309,10 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "fastapi"}
 
-@app.get("/api/stations")
+@app.get("/api/stations", dependencies=[Depends(etag_guard(extra=lambda: get_file_index().version))])
 async def get_stations():
-    """获取监测站点目录结构"""
-    return scan_data_directory()
+    """获取监测站点目录结构（复用文件索引中缓存的扫描结果）"""
+    return get_file_index().nodes
 
 @app.get("/api/data")
 async def get_station_data(path: str = Query(..., description="文件的绝对路径或相对路径")):
@@ -346,31 +344,9 @@ async def _latest_by_metric(session: AsyncSession, metric_key: str):
     return await _latest_readings_for_metric(session, [metric_key], is_simulated=None)
 
 @app.get("/api/stats", response_model=StatsOut)
-async def get_overview_stats(is_simulated: bool | None = None, session: AsyncSession = Depends(get_session)):
-    """获取项目总览统计数据（优先 DB，无数据时回退旧逻辑）"""
-    water_rows = await _latest_readings_for_metric(session, ["water_level"], is_simulated)
-    rain_rows = await _latest_readings_for_metric(session, ["rainfall"], is_simulated)
-    if not water_rows and not rain_rows:
-        return calculate_overview_stats()
-    total_devices = len({sensor.id for sensor, _, _ in water_rows + rain_rows})
-    online_devices = max(0, total_devices - 0)  # no status now
-    avg_rain = (
-        round(
-            sum(r.value_num for _, _, r in rain_rows if r and r.value_num is not None)
-            / max(1, len([r for _, _, r in rain_rows if r and r.value_num is not None])),
-            2,
-        )
-        if rain_rows
-        else 0
-    )
-    stats = {
-        "online_devices": online_devices,
-        "total_devices": total_devices,
-        "today_alerts": 0,
-        "reservoir_capacity_percent": 0,
-        "average_rainfall_mm": avg_rain,
-    }
-    return stats
+async def get_overview_stats(is_simulated: bool | None = None):
+    """获取项目总览统计数据（后台预计算快照，返回快照生成时间与时长）"""
+    return await stats_snapshot_service.get(is_simulated)
 
 
 @app.get("/api/warnings", response_model=list[WarningOut])
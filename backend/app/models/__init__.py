@@ -5,6 +5,7 @@ from .reading import SensorReading
 from .alert import AlertRule, Alert
 from .product import RasterProduct, VectorProduct, ModelProduct
 from .hydrological import HydrologicalStation
+from .table_version import TableVersion
 
 __all__ = [
     "Base",
@@ -23,4 +24,5 @@ __all__ = [
     "VectorProduct",
     "ModelProduct",
     "HydrologicalStation",
+    "TableVersion",
 ]
@@ -14,6 +14,9 @@ class MonitoringFacility(Base):
     facility_type: Mapped[Optional[str]] = mapped_column(String(50))
     location: Mapped[Optional[str]] = mapped_column(Geometry("POINT", srid=4326))
     location_desc: Mapped[Optional[str]] = mapped_column(Text)
+    # 隧洞/渠道中心线（EPSG:4549，顶点顺序即桩号增加方向），起点桩号（m）
+    centerline: Mapped[Optional[str]] = mapped_column(Geometry("LINESTRINGZ", srid=4549))
+    chainage_start: Mapped[Optional[float]] = mapped_column(Float)
     is_simulated: Mapped[bool] = mapped_column(Boolean, default=False)
 
     sections: Mapped[list["MonitoringSection"]] = relationship(back_populates="facility")
@@ -0,0 +1,59 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, String, DateTime, event, func, text
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+# 由触发器维护版本号的表：任何写入（ORM、批量 SQL、导入脚本、COPY）都在同一事务内递增
+VERSIONED_TABLES = (
+    "sensors",
+    "sensor_metrics",
+    "sensor_types",
+    "monitoring_sections",
+    "monitoring_facilities",
+    "chainage_coordinates",
+    "hydrological_stations",
+    "model_products",
+    "raster_products",
+    "vector_products",
+)
+
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    table_name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
+
+
+def version_trigger_ddl() -> list:
+    """触发器函数与各表的语句级触发器（可重复执行）"""
+    statements = [
+        """
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO table_versions (table_name, version, updated_at)
+            VALUES (TG_TABLE_NAME, 1, now())
+            ON CONFLICT (table_name)
+            DO UPDATE SET version = table_versions.version + 1, updated_at = now();
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    ]
+    for table in VERSIONED_TABLES:
+        statements.append(f"DROP TRIGGER IF EXISTS trg_{table}_version ON {table}")
+        statements.append(
+            f"CREATE TRIGGER trg_{table}_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()"
+        )
+    return statements
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_version_triggers(target, connection, **kw):
+    # create_all 建库（init_db / seed_data）时同样安装触发器
+    if connection.dialect.name != "postgresql":
+        return
+    for statement in version_trigger_ddl():
+        connection.execute(text(statement))
@@ -27,6 +27,8 @@ class StatsOut(BaseModel):
     today_alerts: int
     reservoir_capacity_percent: float
     average_rainfall_mm: float
+    generated_at: Optional[str] = None
+    snapshot_age_sec: Optional[float] = None
 
 
 class WarningOut(BaseModel):
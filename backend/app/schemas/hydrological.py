@@ -23,6 +23,18 @@ class HydrologicalStationOut(BaseModel):
         from_attributes = True
 
 
+class SpatialStationOut(BaseModel):
+    """水文站空间查询结果"""
+    id: int
+    station_code: str
+    station_name: str
+    is_simulated: bool
+    lng: Optional[float] = None
+    lat: Optional[float] = None
+    # 仅邻近查询时返回（米）
+    distance_m: Optional[float] = None
+
+
 class FlowRateOut(BaseModel):
     """流量数据输出"""
     station_id: int
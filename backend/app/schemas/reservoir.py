@@ -0,0 +1,12 @@
+"""水库库容 Schema"""
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class CapacityCurveIn(BaseModel):
+    """水位-库容曲线（水位 m，库容 万m³）"""
+    levels: List[float] = Field(..., min_length=2)
+    storage: List[float] = Field(..., min_length=2)
+    full_level: Optional[float] = None
+    dead_level: Optional[float] = None
+    valid_from: Optional[str] = None
@@ -13,6 +13,21 @@ class SensorOut(BaseModel):
     lat: Optional[float] = None
 
 
+class SpatialSensorOut(SensorOut):
+    # Great-circle distance in meters, only set for near queries
+    distance_m: Optional[float] = None
+
+
+class SensorClusterOut(BaseModel):
+    cell: str
+    count: int
+    lng: float
+    lat: float
+    alert_level: str
+    # Representative sensors, highest alert level first
+    sensor_ids: list[int]
+
+
 class SensorMetricOut(BaseModel):
     id: int
     metric_key: str
@@ -1,4 +1,12 @@
 """Background tasks module."""
 from .realtime_push import realtime_push_task
+from .stats_snapshot import stats_snapshot_service, stats_snapshot_task
+from .isohyet_pregen import isohyet_service, isohyet_pregen_task
 
-__all__ = ["realtime_push_task"]
+__all__ = [
+    "realtime_push_task",
+    "stats_snapshot_service",
+    "stats_snapshot_task",
+    "isohyet_service",
+    "isohyet_pregen_task",
+]
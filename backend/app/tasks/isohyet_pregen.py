@@ -0,0 +1,118 @@
+"""Isohyet contours for rain-grid frames, computed in a worker pool.
+
+Requests and the background pregeneration share one cache keyed by
+(product, band, thresholds, kind) plus the frame's own file version and the
+effective zoom. Default thresholds go to the memory + disk cache; custom
+thresholds are client-chosen, so they stay in a bounded memory-only cache
+instead of adding a disk layer per threshold string. Contouring runs in a thread pool: numpy and GEOS release
+the GIL for the heavy parts, and threads can reuse the decoded rasters
+held in app.utils.raster_tiles.raster_sources.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Sequence, Tuple
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.utils.catalog import get_catalog
+from app.utils.isohyets import DEFAULT_THRESHOLDS, contours_geojson, native_zoom
+from app.utils.rain_cube import RAIN_GRID_PRODUCT_TYPE
+from app.utils.raster_io import RasterFormatError, file_token, product_file
+from app.utils.raster_tiles import load_source, raster_sources
+from app.utils.tile_cache import TileCache
+
+# Zoom levels generated ahead of time for each new frame (default thresholds)
+PREGEN_ZOOMS = (4, 5, 6, 7, 8)
+
+
+class IsohyetService:
+    def __init__(self, cache: TileCache, custom_cache: TileCache, workers: int, interval: float):
+        self.cache = cache
+        self.custom_cache = custom_cache
+        self.interval = interval
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="isohyet")
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        # product id -> file version already pregenerated
+        self._generated: Dict[int, str] = {}
+
+    def frame_key(self, product, band: int, thresholds: Sequence[float], kind: str) -> Tuple[str, str]:
+        """(cache layer, version token); raises FileNotFoundError if the frame file is missing."""
+        path, mtime, variable = product_file(get_settings().raster_root, product)
+        layer = f"isohyet-{product.id}-{band}-{kind}"
+        if tuple(thresholds) != DEFAULT_THRESHOLDS:
+            layer += "-" + "_".join(f"{t:g}" for t in thresholds)
+        # Only this frame's file matters; other products coming and going keep it valid
+        return layer, file_token(product.id, path, mtime, variable)
+
+    def _cache_for(self, thresholds: Sequence[float]) -> TileCache:
+        return self.cache if tuple(thresholds) == DEFAULT_THRESHOLDS else self.custom_cache
+
+    async def get(self, product, band: int, thresholds: Sequence[float], zoom: int, kind: str = "all") -> bytes:
+        """GeoJSON contours, from cache or computed once in the pool."""
+        path, mtime, variable = product_file(get_settings().raster_root, product)
+        layer, token = self.frame_key(product, band, thresholds, kind)
+        source = await raster_sources.get((path, mtime, variable, band), lambda: load_source(path, variable, band))
+        # Zooms past the grid's native resolution share one result
+        key = (layer, token, min(zoom, native_zoom(source)), 0, 0)
+        cache = self._cache_for(thresholds)
+        data = await cache.get(key)
+        if data is not None:
+            return data
+        future = self._pending.get(key)
+        if future is None:
+            # A task, so the result is cached even if the requesting client goes away
+            future = self._pending[key] = asyncio.ensure_future(self._compute(cache, key, source, tuple(thresholds), kind))
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _compute(self, cache: TileCache, key: tuple, source, thresholds: Tuple[float, ...], kind: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self.executor, contours_geojson, source, thresholds, key[2], kind)
+        await cache.put(key, data)
+        return data
+
+    async def pregenerate(self):
+        """Generate default contours for rain-grid frames that are new or changed, newest first."""
+        async with AsyncSessionLocal() as session:
+            cat = await get_catalog(session, "raster_products")
+        frames = sorted(
+            (p for p in cat.raster_products.values() if p.product_type == RAIN_GRID_PRODUCT_TYPE),
+            key=lambda p: p.time_start or "",
+            reverse=True,
+        )
+        for product in frames:
+            try:
+                _, token = self.frame_key(product, 0, DEFAULT_THRESHOLDS, "all")
+            except FileNotFoundError:
+                continue
+            if self._generated.get(product.id) == token:
+                continue
+            try:
+                await asyncio.gather(*(self.get(product, 0, DEFAULT_THRESHOLDS, z) for z in PREGEN_ZOOMS))
+            except (RasterFormatError, FileNotFoundError) as e:
+                print(f"[isohyets] Skipping product {product.id}: {e}")
+            self._generated[product.id] = token
+
+    async def run(self):
+        """Check for new frames every `interval` seconds."""
+        while True:
+            try:
+                await self.pregenerate()
+            except Exception as e:
+                # Log error but keep running
+                print(f"[isohyets] Error: {e}")
+            await asyncio.sleep(self.interval)
+
+
+_settings = get_settings()
+isohyet_service = IsohyetService(
+    TileCache(_settings.tile_cache_dir or None, _settings.isohyet_cache_items, suffix="geojson"),
+    TileCache(None, _settings.isohyet_cache_items, suffix="geojson"),
+    _settings.isohyet_workers,
+    _settings.isohyet_pregen_interval_sec,
+)
+
+
+async def isohyet_pregen_task():
+    """Background task entry point."""
+    await isohyet_service.run()
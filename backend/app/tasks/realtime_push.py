@@ -1,43 +1,35 @@
 """Background task for pushing real-time sensor data via WebSocket."""
 import asyncio
 from datetime import datetime
-from sqlalchemy import select, desc
-from sqlalchemy.orm import selectinload
 
 from app.database import AsyncSessionLocal
-from app.models import Sensor, SensorMetric, SensorReading
+from app.utils.catalog import get_catalog, latest_readings
+from app.utils.clustering import sensor_clusters, warning_levels
 from app.websocket import manager
 
 
+REALTIME_METRICS = [
+    "water_level", "rainfall", "pore_pressure", "stress",
+    "flow_rate", "velocity", "surface_elevation"
+]
+
+
 async def get_latest_readings():
     """Fetch latest sensor readings from database."""
     async with AsyncSessionLocal() as session:
-        # Get all metrics with their sensors (including flow_rate, velocity for hydrological stations)
-        stmt = (
-            select(SensorMetric)
-            .options(selectinload(SensorMetric.sensor))
-            .where(SensorMetric.metric_key.in_([
-                "water_level", "rainfall", "pore_pressure", "stress",
-                "flow_rate", "velocity", "surface_elevation"
-            ]))
-        )
-        metrics = (await session.execute(stmt)).scalars().all()
+        # Metric/sensor metadata comes from the in-process catalog
+        cat = await get_catalog(session, "sensors", "sensor_metrics")
+        metrics = cat.find_metrics(REALTIME_METRICS)
+        latest = await latest_readings(session, [m.id for m in metrics])
 
         readings = []
         for metric in metrics:
-            # Get latest reading for this metric
-            reading_stmt = (
-                select(SensorReading)
-                .where(SensorReading.metric_id == metric.id)
-                .order_by(desc(SensorReading.reading_time))
-                .limit(1)
-            )
-            reading = (await session.execute(reading_stmt)).scalars().first()
-
-            if reading and metric.sensor:
+            reading = latest.get(metric.id)
+            sensor = cat.sensors.get(metric.sensor_id)
+            if reading and sensor:
                 readings.append({
-                    "sensor_id": metric.sensor.id,
-                    "station_name": metric.sensor.point_code,
+                    "sensor_id": sensor.id,
+                    "station_name": sensor.point_code,
                     "metric": metric.metric_key,
                     "value": reading.value_num,
                     "unit": metric.unit,
@@ -50,30 +42,19 @@ async def get_latest_readings():
 async def check_warnings():
     """Check for threshold violations and return warnings."""
     async with AsyncSessionLocal() as session:
-        stmt = (
-            select(SensorMetric)
-            .options(selectinload(SensorMetric.sensor))
-            .where(
-                (SensorMetric.warn_low.is_not(None)) | (SensorMetric.warn_high.is_not(None))
-            )
-        )
-        metrics = (await session.execute(stmt)).scalars().all()
+        cat = await get_catalog(session, "sensors", "sensor_metrics")
+        metrics = cat.find_metrics(warn_only=True)
+        latest = await latest_readings(session, [m.id for m in metrics])
 
         warnings = []
         for metric in metrics:
-            reading_stmt = (
-                select(SensorReading)
-                .where(SensorReading.metric_id == metric.id)
-                .order_by(desc(SensorReading.reading_time))
-                .limit(1)
-            )
-            reading = (await session.execute(reading_stmt)).scalars().first()
-
-            if not reading or reading.value_num is None:
+            reading = latest.get(metric.id)
+            sensor = cat.sensors.get(metric.sensor_id)
+
+            if not reading or reading.value_num is None or not sensor:
                 continue
 
             value = reading.value_num
-            sensor = metric.sensor
 
             if metric.warn_high is not None and value > metric.warn_high:
                 warnings.append({
@@ -119,6 +100,7 @@ async def realtime_push_task():
 
                 # Check and push warnings
                 warnings = await check_warnings()
+                sensor_clusters.set_levels(warning_levels(warnings))
                 # Create unique IDs for deduplication
                 current_warning_ids = {
                     f"{w['sensor_id']}:{w['metric']}:{w['level']}" for w in warnings
@@ -0,0 +1,155 @@
+"""Background-precomputed overview statistics for /api/stats.
+
+Any session in this process that commits a change to sensor readings (ORM
+objects or bulk insert/update/delete statements) marks the snapshot dirty, so
+it is recomputed right away. Writers in other processes (import scripts,
+backfills run from the command line) are picked up on the next interval.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models import SensorReading
+from app.utils.catalog import get_catalog, latest_readings
+from app.utils.reservoir import reservoir_engine
+from app.utils.stats import calculate_overview_stats
+
+STATS_METRICS = ("water_level", "rainfall")
+
+
+def _summarize(rows: list, capacity_percent: Optional[float]) -> Optional[Dict[str, Any]]:
+    """Build the overview dict from (sensor_id, metric_key, value) rows."""
+    if not rows:
+        return None
+    total_devices = len({sensor_id for sensor_id, _, _ in rows})
+    rain_rows = [value for _, key, value in rows if key == "rainfall"]
+    rain_values = [v for v in rain_rows if v is not None]
+    avg_rain = round(sum(rain_values) / max(1, len(rain_values)), 2) if rain_rows else 0
+    return {
+        "online_devices": total_devices,  # no status now
+        "total_devices": total_devices,
+        "today_alerts": 0,
+        "reservoir_capacity_percent": capacity_percent or 0,
+        "average_rainfall_mm": avg_rain,
+    }
+
+
+async def compute_overview_stats() -> Dict[Optional[bool], Dict[str, Any]]:
+    """Compute stats for every is_simulated filter (None/True/False) in one pass."""
+    async with AsyncSessionLocal() as session:
+        # Metric metadata comes from the catalog; one LATERAL lookup per metric for the latest value
+        cat = await get_catalog(session, "sensors", "sensor_metrics")
+        metrics = [m for m in cat.find_metrics(STATS_METRICS) if m.sensor_id in cat.sensors]
+        readings = await latest_readings(session, [m.id for m in metrics])
+        rows = [
+            (m.sensor_id, cat.sensors[m.sensor_id].is_simulated, m.metric_key,
+             readings[m.id].value_num if m.id in readings else None)
+            for m in metrics
+        ]
+        # Reservoir storage only pulls readings newer than each reservoir's cursor.
+        await reservoir_engine.update(session)
+
+    snapshots: Dict[Optional[bool], Dict[str, Any]] = {}
+    fallback = None
+    for flag in (None, True, False):
+        subset = [(sid, key, value) for sid, sim, key, value in rows if flag is None or sim == flag]
+        stats = _summarize(subset, reservoir_engine.capacity_percent(flag))
+        if stats is None:
+            # 无 DB 数据时回退旧逻辑（扫描数据目录，放到线程中避免阻塞事件循环）
+            if fallback is None:
+                fallback = await asyncio.to_thread(calculate_overview_stats)
+            stats = fallback
+        snapshots[flag] = stats
+    return snapshots
+
+
+class StatsSnapshotService:
+    """Holds the latest stats snapshot and refreshes it in the background.
+
+    The snapshot dict is swapped in as a whole, so readers always see a
+    consistent set of values without locking.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._snapshots: Dict[Optional[bool], Dict[str, Any]] = {}
+        self._generated_at = 0.0
+        self._dirty = asyncio.Event()
+        self._refresh_lock = asyncio.Lock()
+
+    async def refresh(self):
+        """Recompute the snapshot now."""
+        async with self._refresh_lock:
+            snapshots = await compute_overview_stats()
+            self._snapshots, self._generated_at = snapshots, time.time()
+
+    def mark_dirty(self):
+        """Signal that underlying data changed; the task recomputes promptly."""
+        self._dirty.set()
+
+    async def get(self, is_simulated: Optional[bool] = None) -> Dict[str, Any]:
+        """Return the cached snapshot, computing it once if none exists yet."""
+        if not self._snapshots:
+            await self.refresh()
+        snapshots, generated_at = self._snapshots, self._generated_at
+        return {
+            **snapshots[is_simulated],
+            "generated_at": datetime.fromtimestamp(generated_at).isoformat(),
+            "snapshot_age_sec": round(time.time() - generated_at, 1),
+        }
+
+    async def run(self):
+        """Refresh on data-change events or every `interval` seconds."""
+        while True:
+            self._dirty.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Log error but keep running
+                print(f"[stats_snapshot] Error: {e}")
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+stats_snapshot_service = StatsSnapshotService(get_settings().stats_snapshot_interval_sec)
+
+
+# --- Session events: a committed write to sensor_readings marks the snapshot dirty ---
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_reading_writes(orm_execute_state):
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is SensorReading:
+        orm_execute_state.session.info["readings_changed"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _track_reading_writes(session, flush_context):
+    if any(isinstance(obj, SensorReading) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["readings_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_stats_dirty(session):
+    if session.info.pop("readings_changed", False):
+        stats_snapshot_service.mark_dirty()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_reading_writes(session):
+    session.info.pop("readings_changed", None)
+
+
+async def stats_snapshot_task():
+    """Background task entry point."""
+    await stats_snapshot_service.run()
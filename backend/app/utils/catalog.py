@@ -0,0 +1,329 @@
+"""
+进程内目录缓存
+
+产品表（模型/栅格/矢量）与维度表（传感器、指标、传感器类型、断面、设施）体量小、
+几乎每个热点请求都会读取。这里一次性加载为紧凑的 slots 记录，热点路径在 Python 中
+直接把读数与元数据关联，无需额外查询或 selectinload。
+
+失效基于 app.utils.versions 的表版本号（数据库 table_versions，由触发器在任何写入时
+递增，包括导入脚本等进程外写入）：每次访问先同步版本快照，只重新加载发生变化的表。
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, desc, func, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import (
+    Sensor,
+    SensorMetric,
+    SensorType,
+    SensorReading,
+    MonitoringSection,
+    MonitoringFacility,
+    ModelProduct,
+    RasterProduct,
+    VectorProduct,
+)
+from app.utils.versions import get_versions, sync_versions
+
+
+@dataclass(slots=True, frozen=True)
+class SensorRec:
+    id: int
+    point_code: str
+    section_id: int
+    sensor_type_id: int
+    hydrological_station_id: Optional[int]
+    status: str
+    is_simulated: bool
+    lng: Optional[float]
+    lat: Optional[float]
+
+
+@dataclass(slots=True, frozen=True)
+class MetricRec:
+    id: int
+    sensor_id: int
+    metric_key: str
+    name_cn: Optional[str]
+    unit: Optional[str]
+    warn_low: Optional[float]
+    warn_high: Optional[float]
+    is_simulated: bool
+
+
+@dataclass(slots=True, frozen=True)
+class SensorTypeRec:
+    id: int
+    code: str
+    name: str
+    unit: Optional[str]
+
+
+@dataclass(slots=True, frozen=True)
+class SectionRec:
+    id: int
+    facility_id: int
+    code: str
+    name: str
+    section_type: Optional[str]
+    chainage: Optional[str]
+    is_simulated: bool
+
+
+@dataclass(slots=True, frozen=True)
+class FacilityRec:
+    id: int
+    code: str
+    name: str
+    facility_type: Optional[str]
+    location_desc: Optional[str]
+    is_simulated: bool
+    lng: Optional[float]
+    lat: Optional[float]
+
+
+@dataclass(slots=True, frozen=True)
+class ProductRec:
+    """三类产品共用的记录；不适用的字段为 None"""
+    id: int
+    domain: Optional[str]
+    name: Optional[str]
+    product_type: Optional[str]
+    path: Optional[str]
+    meta: Optional[Any]
+    is_simulated: bool
+    version: Optional[str] = None
+    valid_from: Optional[str] = None
+    valid_to: Optional[str] = None
+    time_start: Optional[str] = None
+    time_end: Optional[str] = None
+    crs: Optional[str] = None
+    resolution: Optional[str] = None
+    srid: Optional[int] = None
+
+
+async def _load_sensors(session: AsyncSession) -> Dict[int, SensorRec]:
+    stmt = select(
+        Sensor.id,
+        Sensor.point_code,
+        Sensor.section_id,
+        Sensor.sensor_type_id,
+        Sensor.hydrological_station_id,
+        Sensor.status,
+        Sensor.is_simulated,
+        func.ST_X(Sensor.location),
+        func.ST_Y(Sensor.location),
+    )
+    return {row[0]: SensorRec(*row) for row in (await session.execute(stmt)).all()}
+
+
+async def _load_metrics(session: AsyncSession) -> Dict[int, MetricRec]:
+    stmt = select(
+        SensorMetric.id,
+        SensorMetric.sensor_id,
+        SensorMetric.metric_key,
+        SensorMetric.name_cn,
+        SensorMetric.unit,
+        SensorMetric.warn_low,
+        SensorMetric.warn_high,
+        SensorMetric.is_simulated,
+    )
+    return {row[0]: MetricRec(*row) for row in (await session.execute(stmt)).all()}
+
+
+async def _load_sensor_types(session: AsyncSession) -> Dict[int, SensorTypeRec]:
+    stmt = select(SensorType.id, SensorType.code, SensorType.name, SensorType.unit)
+    return {row[0]: SensorTypeRec(*row) for row in (await session.execute(stmt)).all()}
+
+
+async def _load_sections(session: AsyncSession) -> Dict[int, SectionRec]:
+    stmt = select(
+        MonitoringSection.id,
+        MonitoringSection.facility_id,
+        MonitoringSection.code,
+        MonitoringSection.name,
+        MonitoringSection.section_type,
+        MonitoringSection.chainage,
+        MonitoringSection.is_simulated,
+    )
+    return {row[0]: SectionRec(*row) for row in (await session.execute(stmt)).all()}
+
+
+async def _load_facilities(session: AsyncSession) -> Dict[int, FacilityRec]:
+    stmt = select(
+        MonitoringFacility.id,
+        MonitoringFacility.code,
+        MonitoringFacility.name,
+        MonitoringFacility.facility_type,
+        MonitoringFacility.location_desc,
+        MonitoringFacility.is_simulated,
+        func.ST_X(MonitoringFacility.location),
+        func.ST_Y(MonitoringFacility.location),
+    )
+    return {row[0]: FacilityRec(*row) for row in (await session.execute(stmt)).all()}
+
+
+async def _load_model_products(session: AsyncSession) -> Dict[int, ProductRec]:
+    rows = (await session.execute(select(ModelProduct))).scalars().all()
+    return {
+        p.id: ProductRec(
+            id=p.id,
+            domain=p.domain,
+            name=p.name,
+            product_type=p.product_type,
+            path=p.path,
+            meta=p.meta,
+            is_simulated=p.is_simulated,
+            version=p.version,
+            valid_from=p.valid_from,
+            valid_to=p.valid_to,
+        )
+        for p in rows
+    }
+
+
+async def _load_raster_products(session: AsyncSession) -> Dict[int, ProductRec]:
+    rows = (await session.execute(select(RasterProduct))).scalars().all()
+    return {
+        p.id: ProductRec(
+            id=p.id,
+            domain=p.domain,
+            name=p.name,
+            product_type=p.product_type,
+            path=p.path,
+            meta=p.meta,
+            is_simulated=p.is_simulated,
+            time_start=p.time_start,
+            time_end=p.time_end,
+            crs=p.crs,
+            resolution=p.resolution,
+        )
+        for p in rows
+    }
+
+
+async def _load_vector_products(session: AsyncSession) -> Dict[int, ProductRec]:
+    rows = (await session.execute(select(VectorProduct))).scalars().all()
+    return {
+        p.id: ProductRec(
+            id=p.id,
+            domain=p.domain,
+            name=p.name,
+            product_type=p.product_type,
+            path=p.path,
+            meta=p.meta,
+            is_simulated=p.is_simulated,
+            time_start=p.time_start,
+            time_end=p.time_end,
+            srid=p.srid,
+        )
+        for p in rows
+    }
+
+
+# 表名 → (Catalog 属性名, 加载函数)
+_LOADERS = {
+    "sensors": ("sensors", _load_sensors),
+    "sensor_metrics": ("metrics", _load_metrics),
+    "sensor_types": ("sensor_types", _load_sensor_types),
+    "monitoring_sections": ("sections", _load_sections),
+    "monitoring_facilities": ("facilities", _load_facilities),
+    "model_products": ("model_products", _load_model_products),
+    "raster_products": ("raster_products", _load_raster_products),
+    "vector_products": ("vector_products", _load_vector_products),
+}
+
+
+class Catalog:
+    """目录缓存；各表字典在重新加载时整体替换，读者无需加锁"""
+
+    def __init__(self):
+        self.sensors: Dict[int, SensorRec] = {}
+        self.metrics: Dict[int, MetricRec] = {}
+        self.sensor_types: Dict[int, SensorTypeRec] = {}
+        self.sections: Dict[int, SectionRec] = {}
+        self.facilities: Dict[int, FacilityRec] = {}
+        self.model_products: Dict[int, ProductRec] = {}
+        self.raster_products: Dict[int, ProductRec] = {}
+        self.vector_products: Dict[int, ProductRec] = {}
+        self.metrics_by_sensor: Dict[int, List[MetricRec]] = {}
+        self._loaded: Dict[str, tuple] = {}
+        self._lock = asyncio.Lock()
+
+    def stale_tables(self, tables: Iterable[str] = _LOADERS) -> List[str]:
+        return [t for t in tables if self._loaded.get(t) != get_versions([t])]
+
+    async def refresh(self, session: AsyncSession, tables: Iterable[str] = _LOADERS):
+        """重新加载已变化的表（并发请求只加载一次）"""
+        if not self.stale_tables(tables):
+            return
+        async with self._lock:
+            for table in self.stale_tables(tables):
+                # 先记下版本号再查询，加载期间发生的写入会在下次访问时再次触发加载
+                version = get_versions([table])
+                attr, loader = _LOADERS[table]
+                setattr(self, attr, await loader(session))
+                self._loaded[table] = version
+                if table == "sensor_metrics":
+                    by_sensor: Dict[int, List[MetricRec]] = {}
+                    for m in self.metrics.values():
+                        by_sensor.setdefault(m.sensor_id, []).append(m)
+                    self.metrics_by_sensor = by_sensor
+
+    def find_metrics(
+        self,
+        metric_keys: Optional[Iterable[str]] = None,
+        is_simulated: Optional[bool] = None,
+        warn_only: bool = False,
+    ) -> List[MetricRec]:
+        keys = set(metric_keys) if metric_keys else None
+        result = []
+        for m in self.metrics.values():
+            if keys is not None and m.metric_key not in keys:
+                continue
+            if warn_only and m.warn_low is None and m.warn_high is None:
+                continue
+            if is_simulated is not None:
+                sensor = self.sensors.get(m.sensor_id)
+                if sensor is None or sensor.is_simulated != is_simulated:
+                    continue
+            result.append(m)
+        return result
+
+
+catalog = Catalog()
+
+
+async def get_catalog(session: AsyncSession, *tables: str) -> Catalog:
+    """返回共享目录缓存；只确保 tables（缺省为全部）是最新的"""
+    await sync_versions()
+    await catalog.refresh(session, tables or _LOADERS)
+    return catalog
+
+
+async def latest_readings(session: AsyncSession, metric_ids: Iterable[int]) -> Dict[int, Any]:
+    """
+    一次查询取多个指标各自的最新读数；返回 metric_id → Row(value_num, reading_time)
+
+    每个指标通过 LATERAL 子查询按 reading_time 倒序取 1 条（走 metric_id + reading_time 索引），
+    不随读数表增长而变慢。
+    """
+    metric_ids = list(metric_ids)
+    if not metric_ids:
+        return {}
+    latest = (
+        select(SensorReading.value_num, SensorReading.reading_time)
+        .where(SensorReading.metric_id == SensorMetric.id)
+        .order_by(desc(SensorReading.reading_time))
+        .limit(1)
+        .lateral("latest")
+    )
+    stmt = (
+        select(SensorMetric.id.label("metric_id"), latest.c.value_num, latest.c.reading_time)
+        .join(latest, true())
+        .where(SensorMetric.id.in_(metric_ids))
+    )
+    return {row.metric_id: row for row in (await session.execute(stmt)).all()}
@@ -0,0 +1,218 @@
+"""
+传感器点位按缩放级别聚合（服务端聚类）
+
+每个缩放级别把 Web 墨卡托平面划分为约 CELL_PX 像素的网格，
+网格单元累计点数、坐标和（用于质心）以及各告警级别的计数。
+传感器新增/删除/移动或告警级别变化时只更新受影响的单元（每级一个），
+查询只遍历视口覆盖的单元，返回量与屏幕面积相关而与传感器总数无关。
+"""
+import heapq
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 告警级别由低到高；未知级别按 Yellow 处理
+ALERT_LEVELS = ("normal", "Blue", "Yellow", "Orange", "Red")
+_LEVEL_RANK = {name: rank for rank, name in enumerate(ALERT_LEVELS)}
+
+CELL_PX = 64
+TILE_PX = 256
+MAX_CLUSTER_ZOOM = 16
+MAX_LAT = 85.05112878
+# 每个聚类返回的代表传感器数
+REPRESENTATIVES = 5
+# 告警级别超过该时长（秒）未更新时由查询方主动刷新
+LEVELS_MAX_AGE = 30.0
+
+
+def level_rank(level: Optional[str]) -> int:
+    if not level:
+        return 0
+    return _LEVEL_RANK.get(level, _LEVEL_RANK["Yellow"])
+
+
+def mercator(lng: float, lat: float) -> Tuple[float, float]:
+    """经纬度 → 归一化 Web 墨卡托坐标 [0, 1)"""
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    x = (lng + 180.0) / 360.0
+    s = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def cells_per_axis(zoom: int) -> int:
+    return (1 << zoom) * TILE_PX // CELL_PX
+
+
+@dataclass
+class Cell:
+    count: int = 0
+    sum_lng: float = 0.0
+    sum_lat: float = 0.0
+    ids: set = field(default_factory=set)
+    level_counts: List[int] = field(default_factory=lambda: [0] * len(ALERT_LEVELS))
+
+    def worst_level(self) -> str:
+        for rank in range(len(ALERT_LEVELS) - 1, 0, -1):
+            if self.level_counts[rank]:
+                return ALERT_LEVELS[rank]
+        return ALERT_LEVELS[0]
+
+
+class ClusterIndex:
+    """多级网格聚类索引；所有修改都是增量的"""
+
+    def __init__(self, max_zoom: int = MAX_CLUSTER_ZOOM):
+        self.max_zoom = max_zoom
+        self.grids: List[Dict[Tuple[int, int], Cell]] = [{} for _ in range(max_zoom + 1)]
+        # id → (lng, lat, 每级单元键)
+        self.points: Dict[int, Tuple[float, float, Tuple[Tuple[int, int], ...]]] = {}
+        self.levels: Dict[int, int] = {}
+        self.levels_updated_at = 0.0
+        self._source = None
+
+    def _cell_keys(self, lng: float, lat: float) -> Tuple[Tuple[int, int], ...]:
+        mx, my = mercator(lng, lat)
+        return tuple(
+            (int(mx * cells_per_axis(z)), int(my * cells_per_axis(z))) for z in range(self.max_zoom + 1)
+        )
+
+    def add(self, sensor_id: int, lng: float, lat: float):
+        if sensor_id in self.points:
+            self.remove(sensor_id)
+        keys = self._cell_keys(lng, lat)
+        rank = self.levels.get(sensor_id, 0)
+        self.points[sensor_id] = (lng, lat, keys)
+        for grid, key in zip(self.grids, keys):
+            cell = grid.get(key)
+            if cell is None:
+                cell = grid[key] = Cell()
+            cell.count += 1
+            cell.sum_lng += lng
+            cell.sum_lat += lat
+            cell.ids.add(sensor_id)
+            cell.level_counts[rank] += 1
+
+    def remove(self, sensor_id: int):
+        point = self.points.pop(sensor_id, None)
+        if point is None:
+            return
+        lng, lat, keys = point
+        rank = self.levels.get(sensor_id, 0)
+        for grid, key in zip(self.grids, keys):
+            cell = grid[key]
+            cell.count -= 1
+            if cell.count == 0:
+                del grid[key]
+                continue
+            cell.sum_lng -= lng
+            cell.sum_lat -= lat
+            cell.ids.discard(sensor_id)
+            cell.level_counts[rank] -= 1
+
+    def set_level(self, sensor_id: int, level: Optional[str]):
+        rank = level_rank(level)
+        old = self.levels.get(sensor_id, 0)
+        if rank == old:
+            return
+        if rank:
+            self.levels[sensor_id] = rank
+        else:
+            self.levels.pop(sensor_id, None)
+        point = self.points.get(sensor_id)
+        if point is None:
+            return
+        for grid, key in zip(self.grids, point[2]):
+            counts = grid[key].level_counts
+            counts[old] -= 1
+            counts[rank] += 1
+
+    def set_levels(self, levels: Dict[int, str]):
+        """以 levels 为准更新全部告警级别（未出现的传感器恢复为 normal）"""
+        for sensor_id in [s for s in self.levels if s not in levels]:
+            self.set_level(sensor_id, None)
+        for sensor_id, level in levels.items():
+            self.set_level(sensor_id, level)
+        self.levels_updated_at = time.monotonic()
+
+    def levels_stale(self) -> bool:
+        return time.monotonic() - self.levels_updated_at > LEVELS_MAX_AGE
+
+    def sync(self, sensors: Dict[int, "object"]):
+        """
+        与目录缓存中的传感器字典同步，只处理差异。
+
+        目录重新加载时整体替换字典，因此字典对象未变即无需比较。
+        """
+        if sensors is self._source:
+            return
+        for sensor_id in [s for s in self.points if s not in sensors]:
+            self.remove(sensor_id)
+        for sensor_id, rec in sensors.items():
+            if rec.lng is None or rec.lat is None:
+                self.remove(sensor_id)
+                continue
+            point = self.points.get(sensor_id)
+            if point is None or point[0] != rec.lng or point[1] != rec.lat:
+                self.add(sensor_id, rec.lng, rec.lat)
+        self._source = sensors
+
+    def query(
+        self,
+        zoom: int,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+    ) -> List[dict]:
+        zoom = max(0, min(int(zoom), self.max_zoom))
+        grid = self.grids[zoom]
+        cells: Iterable[Tuple[Tuple[int, int], Cell]]
+        if bbox is None:
+            cells = grid.items()
+        else:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            n = cells_per_axis(zoom)
+            x0, y1 = mercator(min_lng, min_lat)
+            x1, y0 = mercator(max_lng, max_lat)
+            cx0, cx1 = int(x0 * n), int(x1 * n)
+            cy0, cy1 = int(y0 * n), int(y1 * n)
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) < len(grid):
+                cells = (
+                    ((cx, cy), grid[(cx, cy)])
+                    for cx in range(cx0, cx1 + 1)
+                    for cy in range(cy0, cy1 + 1)
+                    if (cx, cy) in grid
+                )
+            else:
+                cells = (
+                    (key, cell)
+                    for key, cell in grid.items()
+                    if cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1
+                )
+
+        clusters = []
+        for (cx, cy), cell in cells:
+            worst = cell.worst_level()
+            # 代表点：优先告警级别最高的传感器，其次按 id
+            ids = heapq.nsmallest(REPRESENTATIVES, cell.ids, key=lambda s: (-self.levels.get(s, 0), s))
+            clusters.append({
+                "cell": f"{zoom}/{cx}/{cy}",
+                "count": cell.count,
+                "lng": cell.sum_lng / cell.count,
+                "lat": cell.sum_lat / cell.count,
+                "alert_level": worst,
+                "sensor_ids": ids,
+            })
+        return clusters
+
+
+def warning_levels(warnings: Iterable[dict]) -> Dict[int, str]:
+    """realtime_push.check_warnings 结果 → 每个传感器的最高告警级别"""
+    levels: Dict[int, str] = {}
+    for w in warnings:
+        current = levels.get(w["sensor_id"])
+        if current is None or level_rank(w["level"]) > level_rank(current):
+            levels[w["sensor_id"]] = w["level"]
+    return levels
+
+
+sensor_clusters = ClusterIndex()
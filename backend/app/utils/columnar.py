@@ -0,0 +1,67 @@
+"""
+读数列式（宽表）输出
+
+将 (时间, 指标, 值) 行直接转换为一条按时间升序的 epoch 毫秒时间轴，
+以及每个指标一条与之对齐的数值数组，不为每行构建 Pydantic 对象。
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from app.config import get_settings
+
+# (reading_time, metric_id, sensor_id, metric_key, unit, value_num)
+ColumnarRow = Tuple[datetime, int, int, str, Optional[str], Optional[float]]
+
+
+@lru_cache
+def data_timezone() -> ZoneInfo:
+    return ZoneInfo(get_settings().data_timezone)
+
+
+def epoch_ms(dt: datetime) -> int:
+    """naive 时间（数据库中的读数时间）按配置的 data_timezone 解释，结果与服务器所在时区无关"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=data_timezone())
+    return int(dt.timestamp() * 1000)
+
+
+def json_floats(values) -> List[Optional[float]]:
+    """numpy 数组 → JSON 数值列表（NaN → null）"""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def build_columnar(rows: Iterable[ColumnarRow]) -> Dict[str, Any]:
+    """
+    返回结构：
+    {
+        "time": [epoch_ms, ...],
+        "series": [{"metric_id", "sensor_id", "metric_key", "unit", "values": [...]}, ...],
+        "total_count": 行数,
+    }
+    某时刻某指标无读数时对应位置为 null。
+    """
+    series: Dict[int, Dict[str, Any]] = {}
+    points: List[Tuple[int, int, Optional[float]]] = []
+    for reading_time, metric_id, sensor_id, metric_key, unit, value in rows:
+        if metric_id not in series:
+            series[metric_id] = {
+                "metric_id": metric_id,
+                "sensor_id": sensor_id,
+                "metric_key": metric_key,
+                "unit": unit,
+            }
+        points.append((epoch_ms(reading_time), metric_id, value))
+
+    times = sorted({t for t, _, _ in points})
+    slot = {t: i for i, t in enumerate(times)}
+    values = {metric_id: [None] * len(times) for metric_id in series}
+    for t, metric_id, value in points:
+        values[metric_id][slot[t]] = value
+
+    return {
+        "time": times,
+        "series": [{**meta, "values": values[metric_id]} for metric_id, meta in series.items()],
+        "total_count": len(points),
+    }
@@ -0,0 +1,162 @@
+"""
+数据目录文件名索引
+
+对数据目录树建立 n-gram 倒排索引（位图存储），用于按关键词查找监测文件，
+避免每次请求都递归遍历并逐个比对关键词。索引按目录树版本构建一次，
+由所有统计辅助函数共享。
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .scanner import DATA_ROOT, scan_data_directory, get_relative_path
+
+# 最大 gram 长度；中文关键词多为 2 个字，英文前缀如 "Df-" 为 3 个字符
+GRAM_SIZE = 3
+# 两次检查目录版本之间的最小间隔（秒）
+CHECK_INTERVAL = 5.0
+
+
+def tree_signature(root: str = DATA_ROOT) -> Tuple[int, int]:
+    """
+    计算目录树版本签名
+
+    仅统计目录的 mtime（目录中新增/删除/重命名文件时会变化），不读取文件内容。
+    """
+    count = 0
+    digest = 0
+    for dirpath, _dirnames, _filenames in os.walk(root):
+        try:
+            mtime = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            continue
+        digest ^= hash((dirpath, mtime))
+        count += 1
+    return count, digest
+
+
+def _grams(text: str, size: int) -> Iterable[str]:
+    for i in range(len(text) - size + 1):
+        yield text[i:i + size]
+
+
+class FileIndex:
+    """
+    文件路径子串倒排索引
+
+    每个文件以其在目录树中的标签路径（如 "4 发电引水洞/8 温度/温度计/Tf-1.xlsx"）建索引。
+    posting 以 Python int 位图保存，第 i 位代表第 i 个文件，交/并运算即位运算。
+    """
+
+    def __init__(self, nodes: List[Dict[str, Any]], version: Any = None):
+        self.version = version
+        self.nodes = nodes
+        self.files: List[Dict[str, Any]] = []
+        self.names: List[str] = []
+        self.postings: Dict[str, int] = {}
+        self._query_cache: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], List[Dict[str, Any]]] = {}
+        self._collect(nodes, [])
+        self.all_mask = (1 << len(self.files)) - 1
+        self._build_postings()
+
+    def _collect(self, nodes: List[Dict[str, Any]], parts: List[str]):
+        """按遍历顺序收集文件，保持与旧版递归查找一致的结果顺序"""
+        for node in nodes:
+            label = node['label']
+            if node['type'] == 'directory':
+                self._collect(node.get('children', []), parts + [label])
+            elif node['type'] == 'file':
+                self.names.append("/".join(parts + [label]))
+                self.files.append({
+                    "full_path": node['path'],
+                    "relative_path": get_relative_path(node['path']),
+                    "filename": label,
+                    "parent_dir": os.path.basename(os.path.dirname(node['path'])),
+                })
+
+    def _build_postings(self):
+        postings = self.postings
+        for file_id, name in enumerate(self.names):
+            bit = 1 << file_id
+            seen = set()
+            for size in range(1, GRAM_SIZE + 1):
+                seen.update(_grams(name, size))
+            for gram in seen:
+                postings[gram] = postings.get(gram, 0) | bit
+
+    def _mask_for(self, keyword: str) -> int:
+        """返回名称包含 keyword 的文件位图"""
+        if not keyword:
+            return self.all_mask
+        size = min(len(keyword), GRAM_SIZE)
+        mask = self.all_mask
+        for gram in _grams(keyword, size):
+            mask &= self.postings.get(gram, 0)
+            if not mask:
+                return 0
+        if len(keyword) <= GRAM_SIZE:
+            return mask
+        # 长关键词：gram 交集只是候选集，需逐个校验
+        verified = 0
+        candidates = mask
+        while candidates:
+            low = candidates & -candidates
+            file_id = low.bit_length() - 1
+            if keyword in self.names[file_id]:
+                verified |= low
+            candidates ^= low
+        return verified
+
+    def match_mask(self, keywords: List[str], exclude_keywords: Optional[List[str]] = None) -> int:
+        mask = 0
+        for k in keywords:
+            mask |= self._mask_for(k)
+        if mask and exclude_keywords:
+            for k in exclude_keywords:
+                mask &= ~self._mask_for(k)
+        return mask
+
+    def query(self, keywords: List[str], exclude_keywords: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """查找路径包含任一 keywords 且不包含任何 exclude_keywords 的文件"""
+        key = (tuple(keywords), tuple(exclude_keywords or ()))
+        cached = self._query_cache.get(key)
+        if cached is None:
+            mask = self.match_mask(keywords, exclude_keywords)
+            cached = []
+            file_id = 0
+            while mask:
+                if mask & 1:
+                    cached.append(self.files[file_id])
+                mask >>= 1
+                file_id += 1
+            self._query_cache[key] = cached
+        # 返回副本，调用方修改结果不会污染缓存
+        return [dict(f) for f in cached]
+
+
+_index: Optional[FileIndex] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_file_index(root: str = DATA_ROOT) -> FileIndex:
+    """获取共享索引；目录树版本变化时重建"""
+    global _index, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _index is not None and now - _checked_at < CHECK_INTERVAL:
+            return _index
+        version = tree_signature(root)
+        _checked_at = now
+        if _index is None or _index.version != version:
+            _index = FileIndex(scan_data_directory(root), version=version)
+        return _index
+
+
+def invalidate_file_index():
+    """强制下次访问时重新检查并重建索引（如导入新文件后调用）"""
+    global _index, _checked_at
+    with _lock:
+        _index = None
+        _checked_at = 0.0
@@ -0,0 +1,233 @@
+"""
+洪水淹没范围产品：按缩放级别简化与分时刻统计
+
+每个洪水事件的 inundationGeoJson 为一个 FeatureCollection，要素以 properties.step
+（或 time）区分时刻，properties.depth 为水深（m，可缺省）。文件只在版本变化时读取一次：
+
+- 载入时修复无效几何，按时刻统计淹没面积（时刻内要素并集，km²）、面积加权平均水深、
+  最大水深与水量（要素面积 × 水深，要素视为互不重叠的水深分区）；
+- 各缩放级别的简化几何对全部要素做一次 shapely 向量化计算并缓存；同一时刻的要素构成
+  有效覆盖（coverage）时用 coverage_simplify 保持相邻分区公共边一致，否则逐要素
+  保拓扑简化。FULL_RES_ZOOM 及以上返回原始几何。
+
+事件版本只由事件自身的输入（淹没文件路径、修改时间与事件描述）决定，用于
+FloodProductService 的事件缓存与响应缓存失效；其他模型产品（率定曲线等）的写入不影响它。
+"""
+import asyncio
+import json
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import shapely
+
+from app.config import get_settings
+from app.utils.isohyets import feature_collection
+from app.utils.mock_data import MOCK_FLOOD_EVENTS
+from app.utils.rain_cube import parse_time
+from app.utils.raster_io import file_token, resolve_product_path
+
+FLOOD_EVENT_PRODUCT_TYPE = "flood_event"
+FULL_RES_ZOOM = 14
+# 简化容差（瓦片像元的倍数）
+SIMPLIFY_PIXELS = 0.5
+_STEP_KEYS = ("step", "time_step", "timeStep", "t")
+_DEPTH_KEYS = ("depth", "water_depth", "depth_m", "max_depth")
+# 经纬度面积 → km²（按要素中心纬度的局部等距近似）
+_KM_PER_DEG_LAT = 110.54
+_KM_PER_DEG_LNG = 111.32
+# coverage_simplify / coverage_is_valid 需要 GEOS 3.12+
+_COVERAGE = shapely.geos_version >= (3, 12, 0)
+
+
+def area_km2(geoms: np.ndarray) -> np.ndarray:
+    lat = shapely.get_y(shapely.centroid(geoms))
+    scale = _KM_PER_DEG_LAT * _KM_PER_DEG_LNG * np.cos(np.radians(np.nan_to_num(lat)))
+    return shapely.area(geoms) * scale
+
+
+def _first(props: dict, keys) -> Optional[object]:
+    return next((props[k] for k in keys if props.get(k) is not None), None)
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class FloodInundation:
+    """单个事件的淹没要素（按时刻排序）、分时刻统计与各缩放级别的简化几何"""
+
+    def __init__(self, event_id: str, version: str, geoms: np.ndarray, steps: np.ndarray,
+                 properties: List[dict], depths: np.ndarray, step_times: List[Optional[str]]):
+        order = np.argsort(steps, kind="stable")
+        self.event_id = event_id
+        self.version = version
+        self.geoms = geoms[order]
+        self.steps = steps[order]
+        self.properties = [properties[i] for i in order]
+        self.depths = depths[order]
+        self.step_times = step_times
+        self.step_count = len(step_times)
+        bounds = np.searchsorted(self.steps, np.arange(self.step_count + 1))
+        self._ranges = [(int(bounds[s]), int(bounds[s + 1])) for s in range(self.step_count)]
+        self._coverage = [
+            _COVERAGE and hi - lo > 1 and bool(shapely.coverage_is_valid(self.geoms[lo:hi]))
+            for lo, hi in self._ranges
+        ]
+        self.stats = self._step_stats()
+        self._simplified: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, event_id: str, version: str, path: str, start: Optional[datetime] = None,
+             end: Optional[datetime] = None, declared_steps: Optional[int] = None) -> "FloodInundation":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        features = [f for f in data.get("features", []) if f.get("geometry")]
+        try:
+            geoms = shapely.from_geojson([json.dumps(f["geometry"]) for f in features])
+        except shapely.errors.GEOSException as e:
+            raise ValueError(f"无法解析淹没范围几何：{e}")
+        invalid = ~shapely.is_valid(geoms)
+        if invalid.any():
+            geoms[invalid] = shapely.make_valid(geoms[invalid])
+        properties = [f.get("properties") or {} for f in features]
+
+        raw_steps = [_first(p, _STEP_KEYS) for p in properties]
+        times = [p.get("time") for p in properties]
+        if any(s is not None for s in raw_steps):
+            steps = np.array([int(_number(s)) if s is not None and not math.isnan(_number(s)) else 0 for s in raw_steps])
+            step_times = [None] * (int(steps.max()) + 1 if len(steps) else 0)
+            for s, t in zip(steps, times):
+                if t and step_times[s] is None:
+                    step_times[s] = t
+        elif any(times):
+            unique = sorted({t for t in times if t})
+            index = {t: i for i, t in enumerate(unique)}
+            steps = np.array([index.get(t, 0) for t in times])
+            step_times = list(unique)
+        else:
+            steps = np.zeros(len(features), dtype=np.int64)
+            step_times = [None] if features else []
+
+        # 没有时刻字段的步按事件起止时间均分（第 i 步为 start + i × 步长）
+        count = max(len(step_times), declared_steps or 0)
+        step_times += [None] * (count - len(step_times))
+        if start is not None and end is not None and end > start and count:
+            interval = (end - start) / count
+            step_times = [t or (start + i * interval).isoformat() for i, t in enumerate(step_times)]
+
+        depths = np.array([_number(_first(p, _DEPTH_KEYS)) for p in properties], dtype=float)
+        return cls(event_id, version, geoms, steps.astype(np.int64), properties, depths, step_times)
+
+    def _step_stats(self) -> List[dict]:
+        areas = area_km2(self.geoms) if len(self.geoms) else np.empty(0)
+        result = []
+        for s, (lo, hi) in enumerate(self._ranges):
+            a, d = areas[lo:hi], self.depths[lo:hi]
+            has_depth = np.isfinite(d)
+            if hi - lo > 1 and not self._coverage[s]:
+                # 要素可能重叠：面积取并集
+                total = float(area_km2(np.array([shapely.union_all(self.geoms[lo:hi])]))[0])
+            else:
+                total = float(a.sum())
+            weighted = a[has_depth]
+            result.append({
+                "step": s,
+                "time": self.step_times[s],
+                "feature_count": hi - lo,
+                "area_km2": round(total, 4),
+                "mean_depth": round(float((weighted * d[has_depth]).sum() / weighted.sum()), 3) if weighted.sum() > 0 else None,
+                "max_depth": round(float(d[has_depth].max()), 3) if has_depth.any() else None,
+                "volume_m3": round(float((weighted * 1e6 * d[has_depth]).sum()), 1) if has_depth.any() else None,
+            })
+        return result
+
+    def geometries(self, zoom: int) -> np.ndarray:
+        """该缩放级别的全部要素几何（与 self.geoms 同序）"""
+        if zoom >= FULL_RES_ZOOM:
+            return self.geoms
+        with self._lock:
+            cached = self._simplified.get(zoom)
+        if cached is not None:
+            return cached
+        tolerance = SIMPLIFY_PIXELS * 360.0 / (256 * 2 ** zoom)
+        simplified = shapely.simplify(self.geoms, tolerance, preserve_topology=True)
+        for s, (lo, hi) in enumerate(self._ranges):
+            if self._coverage[s]:
+                simplified[lo:hi] = shapely.coverage_simplify(self.geoms[lo:hi], tolerance)
+        with self._lock:
+            self._simplified[zoom] = simplified
+        return simplified
+
+    def step_geojson(self, step: int, zoom: int) -> bytes:
+        lo, hi = self._ranges[step]
+        geoms = self.geometries(min(zoom, FULL_RES_ZOOM))[lo:hi]
+        if zoom < FULL_RES_ZOOM:
+            decimals = max(2, math.ceil(math.log10(256 * 2 ** zoom / 360.0)) + 1)
+            geoms = shapely.transform(geoms, lambda c: np.round(c, decimals))
+        keep = ~shapely.is_empty(geoms)
+        return feature_collection(
+            ({**self.properties[i], "step": step}, geoms[i - lo]) for i in range(lo, hi) if keep[i - lo]
+        )
+
+
+def flood_events(model_products: Iterable) -> Dict[str, dict]:
+    """事件 id → 事件描述；目录中没有 flood_event 产品时使用模拟事件"""
+    events = {
+        p.version: p.meta for p in model_products
+        if p.product_type == FLOOD_EVENT_PRODUCT_TYPE and p.version and isinstance(p.meta, dict)
+    }
+    return events or {e["id"]: e for e in MOCK_FLOOD_EVENTS}
+
+
+def inundation_file(root: str, event: dict) -> Tuple[str, int]:
+    """(淹没 GeoJSON 路径, 修改时间 ns)；文件不存在时抛出 FileNotFoundError"""
+    products = event.get("products") or {}
+    rel = products.get("inundationGeoJson") if isinstance(products, dict) else None
+    if not rel:
+        raise FileNotFoundError(event.get("id"))
+    path = resolve_product_path(root, rel)
+    try:
+        return path, os.stat(path).st_mtime_ns
+    except OSError:
+        raise FileNotFoundError(rel)
+
+
+class FloodProductService:
+    """按事件缓存已载入的淹没产品，版本变化后的首次访问重新载入（并发请求只载入一次）"""
+
+    def __init__(self):
+        self.events: Dict[str, FloodInundation] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def event_token(self, event_id: str, event: dict) -> Tuple[str, str]:
+        """(文件路径, 版本)；版本随淹没文件与事件描述（起止时间、时刻数等）变化"""
+        path, mtime = inundation_file(get_settings().raster_root, event)
+        return path, file_token(event_id, path, mtime, event)
+
+    async def get(self, event_id: str, event: dict) -> FloodInundation:
+        path, token = self.event_token(event_id, event)
+        cached = self.events.get(event_id)
+        if cached is not None and cached.version == token:
+            return cached
+        async with self._locks.setdefault(event_id, asyncio.Lock()):
+            cached = self.events.get(event_id)
+            if cached is None or cached.version != token:
+                start, end = parse_time(event.get("start")), parse_time(event.get("end"))
+                steps = (event.get("products") or {}).get("timeSteps")
+                cached = await asyncio.to_thread(
+                    FloodInundation.load, event_id, token, path, start, end,
+                    steps if isinstance(steps, int) else None,
+                )
+                self.events[event_id] = cached
+        return cached
+
+
+flood_products = FloodProductService()
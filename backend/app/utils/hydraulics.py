@@ -0,0 +1,157 @@
+"""
+断面水力要素计算
+
+HydrologicalStation.cross_section 为实测断面（LINESTRINGZ，EPSG:4549）：
+顶点的水平累计距离为起点距，Z 为河床高程。对任一水位（与 Z 同一高程基准），
+按线段把断面裁剪到水面以下即可得到过水面积、水面宽和湿周。
+
+水面宽与湿周在相邻两个顶点高程之间随水位线性变化（平底段在其高程处跳变），
+因此只需在全部顶点高程处预先计算一张查找表（断点两侧各存一个极限值）：
+任意水位的水面宽/湿周由线性插值得到，过水面积由
+A(h) = A(h_k) + (B(h_k⁺) + B(h)) / 2 · (h − h_k) 精确积分得到。
+查找表按几何哈希缓存，整段历史水位一次向量化计算。
+"""
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+import shapely
+
+
+def section_profile(coords: np.ndarray):
+    """顶点坐标 (n, 3) → (起点距, 河床高程)"""
+    coords = np.asarray(coords, dtype=float)
+    steps = np.hypot(np.diff(coords[:, 0]), np.diff(coords[:, 1]))
+    offsets = np.concatenate([[0.0], np.cumsum(steps)])
+    return offsets, coords[:, 2]
+
+
+def wetted_properties(offsets: np.ndarray, bed: np.ndarray, stages: np.ndarray, from_above: bool = True):
+    """
+    直接按线段裁剪计算 (面积, 水面宽, 湿周)，stages 可为任意形状的水位数组。
+
+    from_above 决定恰好与水面齐平的平底段是否计入（右极限 / 左极限）。
+    内存为 O(水位数 × 线段数)，用于构建查找表；大批量水位请使用 HydraulicTable。
+    """
+    stages = np.asarray(stages, dtype=float)
+    h = stages.reshape(-1, 1)
+    dx = np.diff(offsets)
+    length = np.hypot(dx, np.diff(bed))
+    d1 = h - bed[:-1]
+    d2 = h - bed[1:]
+
+    if from_above:
+        wet1, wet2 = d1 >= 0, d2 >= 0
+    else:
+        wet1, wet2 = d1 > 0, d2 > 0
+    both = wet1 & wet2
+    partial = wet1 ^ wet2
+    # 部分淹没线段：水面以下所占比例
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d_pos = np.where(wet1, d1, d2)
+        frac = np.where(partial, d_pos / (np.abs(d1) + np.abs(d2)), 0.0)
+
+    area = np.where(both, (d1 + d2) / 2 * dx, 0.0) + np.where(partial, d_pos * frac * dx / 2, 0.0)
+    width = np.where(both, dx, 0.0) + frac * dx
+    perimeter = np.where(both, length, 0.0) + frac * length
+    shape = stages.shape
+    return (
+        area.sum(axis=1).reshape(shape),
+        width.sum(axis=1).reshape(shape),
+        perimeter.sum(axis=1).reshape(shape),
+    )
+
+
+@dataclass(frozen=True)
+class HydraulicTable:
+    """水位 → 过水面积 / 水面宽 / 湿周 查找表（断点为全部顶点高程）"""
+    stages: np.ndarray
+    area: np.ndarray
+    # 断点处的右极限（水位略高于断点）与左极限（略低于断点）
+    top_width: np.ndarray
+    perimeter: np.ndarray
+    top_width_below: np.ndarray
+    perimeter_below: np.ndarray
+
+    @classmethod
+    def from_coords(cls, coords: np.ndarray) -> "HydraulicTable":
+        offsets, bed = section_profile(coords)
+        stages = np.unique(bed)
+        area, width, perimeter = wetted_properties(offsets, bed, stages)
+        _, width_below, perimeter_below = wetted_properties(offsets, bed, stages, from_above=False)
+        return cls(stages, area, width, perimeter, width_below, perimeter_below)
+
+    @property
+    def bed_min(self) -> float:
+        return float(self.stages[0])
+
+    @property
+    def bank_max(self) -> float:
+        return float(self.stages[-1])
+
+    def evaluate(self, levels) -> Dict[str, np.ndarray]:
+        """
+        批量计算水力要素；返回 area / top_width / wetted_perimeter / hydraulic_radius。
+
+        低于最低河床为 0；高于断面最高点时按两侧竖直岸壁外延（水面宽不变，湿周每侧增加超高）。
+        NaN 水位对应 NaN。
+        """
+        h = np.asarray(levels, dtype=float)
+        stages = self.stages
+        clipped = np.clip(h, stages[0], stages[-1])
+        k = np.clip(np.searchsorted(stages, clipped, side="right") - 1, 0, len(stages) - 1)
+        k1 = np.minimum(k + 1, len(stages) - 1)
+
+        # 区间 [h_k, h_k+1) 内由 h_k 右极限线性过渡到 h_k+1 左极限
+        span = stages[k1] - stages[k]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(span > 0, (clipped - stages[k]) / span, 0.0)
+        width = self.top_width[k] + (self.top_width_below[k1] - self.top_width[k]) * t
+        perimeter = self.perimeter[k] + (self.perimeter_below[k1] - self.perimeter[k]) * t
+        area = self.area[k] + (self.top_width[k] + width) / 2 * (clipped - stages[k])
+
+        above = np.maximum(h - stages[-1], 0.0)
+        area = area + width * above
+        perimeter = perimeter + 2 * above
+
+        dry = h < stages[0]
+        width = np.where(dry, 0.0, width)
+        perimeter = np.where(dry, 0.0, perimeter)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            radius = np.where(perimeter > 0, area / perimeter, 0.0)
+        nan = np.isnan(h)
+        if nan.any():
+            for arr in (area, width, perimeter, radius):
+                arr[nan] = np.nan
+        return {
+            "area": area,
+            "top_width": width,
+            "wetted_perimeter": perimeter,
+            "hydraulic_radius": radius,
+        }
+
+
+def geometry_hash(wkb: bytes) -> str:
+    return hashlib.sha1(wkb).hexdigest()
+
+
+_tables: Dict[str, HydraulicTable] = {}
+_lock = threading.Lock()
+
+
+def get_hydraulic_table(wkb: Optional[bytes]) -> Optional[HydraulicTable]:
+    """由断面 WKB 获取查找表（按几何哈希缓存，断面修改后哈希变化自动重建）"""
+    if not wkb:
+        return None
+    key = geometry_hash(bytes(wkb))
+    table = _tables.get(key)
+    if table is None:
+        coords = shapely.get_coordinates(shapely.from_wkb(bytes(wkb)), include_z=True)
+        if len(coords) < 2 or np.isnan(coords[:, 2]).all():
+            return None
+        table = HydraulicTable.from_coords(coords)
+        with _lock:
+            _tables[key] = table
+    return table
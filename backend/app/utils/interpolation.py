@@ -0,0 +1,233 @@
+"""
+断面传感器场的空间插值（IDW / 径向基函数）
+
+插值曲面在规则网格上计算，可在平面（plan：局部米制坐标）或断面剖面
+（profile：沿测点主方向的水平距离 × 安装高程）内进行。两种方法都是线性的：
+网格值 = W @ 测点值，W（网格点数 × 测点数）只与测点布局有关，
+因此按布局预先计算一次并缓存，之后每个时刻（或整段时刻矩阵）只需一次矩阵乘法。
+
+- IDW：每个网格点取最近 k 个测点，权重 1/d^p 并归一化；某时刻部分测点缺测时
+  用 (W @ v) / (W @ mask) 在同一权重上重新归一化。
+- RBF：薄板样条 φ(r) = r² ln r 加一次多项式项，解增广线性系统得到 W；
+  缺测测点组合不同则按缺测掩码另行求解并缓存。
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Tuple
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy 为可选依赖，缺失时用 numpy 求最近邻
+    cKDTree = None
+
+# 网格最长边的默认/最大单元数
+DEFAULT_CELLS = 64
+MAX_CELLS = 256
+# 网格在测点包围盒外扩的比例
+GRID_MARGIN = 0.1
+IDW_NEIGHBORS = 8
+IDW_POWER = 2.0
+RBF_SMOOTHING = 0.0
+# 缓存的布局权重数，以及每个 RBF 布局缓存的缺测组合数
+WEIGHT_CACHE_SIZE = 64
+SUBSET_CACHE_SIZE = 32
+
+# 经纬度 → 局部米（等距近似，断面尺度内误差可忽略）
+_M_PER_DEG_LAT = 110540.0
+_M_PER_DEG_LNG = 111320.0
+
+
+def local_plan_coords(lng, lat) -> Tuple[np.ndarray, dict]:
+    """经纬度 → 以质心为原点的局部米制坐标 (n, 2)，并返回反算参数"""
+    lng = np.asarray(lng, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    lng0, lat0 = float(lng.mean()), float(lat.mean())
+    kx = _M_PER_DEG_LNG * np.cos(np.radians(lat0))
+    xy = np.column_stack([(lng - lng0) * kx, (lat - lat0) * _M_PER_DEG_LAT])
+    return xy, {"origin_lng": lng0, "origin_lat": lat0, "m_per_deg_lng": kx, "m_per_deg_lat": _M_PER_DEG_LAT}
+
+
+def profile_coords(lng, lat, elevation) -> Tuple[np.ndarray, dict]:
+    """断面剖面坐标：沿测点水平主方向的距离（m）× 高程（m）"""
+    xy, frame = local_plan_coords(lng, lat)
+    if len(xy) > 1 and np.ptp(xy, axis=0).max() > 0:
+        _, _, vt = np.linalg.svd(xy - xy.mean(axis=0), full_matrices=False)
+        axis = vt[0]
+    else:
+        axis = np.array([1.0, 0.0])
+    offset = xy @ axis
+    frame = {**frame, "axis": axis.tolist()}
+    return np.column_stack([offset, np.asarray(elevation, dtype=float)]), frame
+
+
+@dataclass(frozen=True)
+class Grid:
+    x0: float
+    y0: float
+    dx: float
+    dy: float
+    nx: int
+    ny: int
+
+    @classmethod
+    def around(cls, points: np.ndarray, cells: int = DEFAULT_CELLS) -> "Grid":
+        """覆盖测点包围盒（外扩 GRID_MARGIN）的网格，最长边 cells 个单元，单元近似正方形"""
+        lo, hi = points.min(axis=0), points.max(axis=0)
+        span = np.maximum(hi - lo, 1e-6)
+        pad = span * GRID_MARGIN
+        lo, span = lo - pad, span + 2 * pad
+        size = float(span.max()) / cells
+        nx = max(2, int(np.ceil(span[0] / size)))
+        ny = max(2, int(np.ceil(span[1] / size)))
+        return cls(float(lo[0]), float(lo[1]), size, size, nx, ny)
+
+    def centers(self) -> np.ndarray:
+        """网格单元中心 (ny*nx, 2)，行优先（y 外层）"""
+        xs = self.x0 + (np.arange(self.nx) + 0.5) * self.dx
+        ys = self.y0 + (np.arange(self.ny) + 0.5) * self.dy
+        gx, gy = np.meshgrid(xs, ys)
+        return np.column_stack([gx.ravel(), gy.ravel()])
+
+    def to_dict(self) -> dict:
+        return {"x0": self.x0, "y0": self.y0, "dx": self.dx, "dy": self.dy, "nx": self.nx, "ny": self.ny}
+
+
+def _nearest(nodes: np.ndarray, targets: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """每个目标点最近 k 个节点的 (距离, 下标)，形状 (m, k)"""
+    k = min(k, len(nodes))
+    if cKDTree is not None:
+        dist, idx = cKDTree(nodes).query(targets, k=k)
+        return dist.reshape(len(targets), k), idx.reshape(len(targets), k)
+    d = np.linalg.norm(targets[:, None, :] - nodes[None, :, :], axis=2)
+    idx = np.argpartition(d, k - 1, axis=1)[:, :k] if k < len(nodes) else np.broadcast_to(np.arange(len(nodes)), d.shape)
+    return np.take_along_axis(d, idx, axis=1), idx
+
+
+def idw_weights(nodes: np.ndarray, targets: np.ndarray, k: int = IDW_NEIGHBORS, power: float = IDW_POWER) -> np.ndarray:
+    """IDW 权重矩阵 (目标数, 节点数)，每行和为 1；与某节点重合的目标点直接取该节点"""
+    dist, idx = _nearest(nodes, targets, k)
+    with np.errstate(divide="ignore"):
+        w = 1.0 / dist ** power
+    exact = dist <= 1e-9
+    hit = exact.any(axis=1)
+    w[hit] = exact[hit].astype(float)
+    weights = np.zeros((len(targets), len(nodes)))
+    np.put_along_axis(weights, idx, w, axis=1)
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def _tps(r: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(r > 0, r * r * np.log(r), 0.0)
+
+
+def rbf_weights(nodes: np.ndarray, targets: np.ndarray, smoothing: float = RBF_SMOOTHING) -> np.ndarray:
+    """薄板样条 + 一次多项式的插值权重矩阵 (目标数, 节点数)"""
+    n = len(nodes)
+    # 坐标归一化，改善系统条件数
+    center = nodes.mean(axis=0)
+    scale = float(np.ptp(nodes, axis=0).max()) or 1.0
+    p = (nodes - center) / scale
+    q = (targets - center) / scale
+
+    poly_p = np.column_stack([np.ones(n), p])
+    m = poly_p.shape[1]
+    a = np.zeros((n + m, n + m))
+    a[:n, :n] = _tps(np.linalg.norm(p[:, None] - p[None, :], axis=2)) + smoothing * np.eye(n)
+    a[:n, n:] = poly_p
+    a[n:, :n] = poly_p.T
+    # 测点共线等退化布局下系统奇异，伪逆给出最小范数解
+    inverse = np.linalg.pinv(a)
+
+    phi_q = _tps(np.linalg.norm(q[:, None] - p[None, :], axis=2))
+    basis = np.column_stack([phi_q, np.ones(len(q)), q])
+    return basis @ inverse[:, :n]
+
+
+class SurfaceLayout:
+    """某一测点布局下的网格与权重；evaluate 接受 (测点数,) 或 (测点数, 时刻数) 的数值"""
+
+    def __init__(self, nodes: np.ndarray, grid: Grid, method: str, **params):
+        self.nodes = nodes
+        self.grid = grid
+        self.method = method
+        self.params = params
+        self.targets = grid.centers()
+        self.weights = self._solve(np.ones(len(nodes), dtype=bool))
+        # RBF：缺测掩码 → 子集权重
+        self._subset_weights: Dict[bytes, np.ndarray] = {}
+
+    def _solve(self, mask: np.ndarray) -> np.ndarray:
+        nodes = self.nodes[mask]
+        if self.method == "idw":
+            return idw_weights(nodes, self.targets, self.params.get("k", IDW_NEIGHBORS), self.params.get("power", IDW_POWER))
+        if len(nodes) < 3:
+            # 点数不足以确定一次多项式，退化为 IDW
+            return idw_weights(nodes, self.targets)
+        return rbf_weights(nodes, self.targets, self.params.get("smoothing", RBF_SMOOTHING))
+
+    def _evaluate_rbf(self, values: np.ndarray) -> np.ndarray:
+        out = np.full((len(self.targets), values.shape[1]), np.nan)
+        masks = np.isfinite(values)
+        # 相同缺测组合的时刻共用一次矩阵乘法
+        patterns, inverse = np.unique(masks.T, axis=0, return_inverse=True)
+        for p, mask in enumerate(patterns):
+            cols = np.flatnonzero(inverse.ravel() == p)
+            if not mask.any():
+                continue
+            if mask.all():
+                weights = self.weights
+            else:
+                key = np.packbits(mask).tobytes()
+                weights = self._subset_weights.get(key)
+                if weights is None:
+                    if len(self._subset_weights) >= SUBSET_CACHE_SIZE:
+                        self._subset_weights.clear()
+                    weights = self._subset_weights[key] = self._solve(mask)
+            out[:, cols] = weights @ values[mask][:, cols]
+        return out
+
+    def evaluate(self, values) -> np.ndarray:
+        """测点值 → 网格值 (ny, nx) 或 (时刻数, ny, nx)；缺测为 NaN"""
+        v = np.asarray(values, dtype=float)
+        single = v.ndim == 1
+        if single:
+            v = v[:, None]
+        if self.method == "idw":
+            mask = np.isfinite(v).astype(float)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out = (self.weights @ np.nan_to_num(v)) / (self.weights @ mask)
+        else:
+            out = self._evaluate_rbf(v)
+        frames = out.T.reshape(-1, self.grid.ny, self.grid.nx)
+        return frames[0] if single else frames
+
+
+class LayoutCache:
+    """布局（含 SurfaceLayout 权重）的 LRU 缓存；键包含传感器目录版本与插值参数"""
+
+    def __init__(self, maxsize: int = WEIGHT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            layout = self._items.get(key)
+            if layout is not None:
+                self._items.move_to_end(key)
+            return layout
+
+    def put(self, key: Hashable, layout):
+        with self._lock:
+            self._items[key] = layout
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return layout
+
+
+surface_layouts = LayoutCache()
@@ -0,0 +1,196 @@
+"""
+降水等值线（isohyet）与等值面分级
+
+在 RasterSource 的概览层上做向量化 marching squares：每个阈值对全部格元一次性求出
+四角状态（case）与边上的线性插值交点，按 case 查表生成线段；相邻格元共享边的交点
+由同一公式计算、坐标完全一致，再由 shapely.line_merge 连接成线。数组四周补一圈低于
+最小阈值的值，使所有等值线闭合。
+
+等值面：全部阈值的闭合等值线经 polygonize 得到互不重叠的面，在面内点处双线性取值
+确定所属分级。
+
+按缩放级别：选择与瓦片像元大小相当的概览层（粗网格本身就是一级简化），转换为经纬度后
+以半个瓦片像元为容差简化（等值面整体用 coverage_simplify，相邻分级公共边保持一致），
+坐标位数也按缩放级别截断。
+"""
+import json
+import math
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+import shapely
+
+from app.utils.raster_tiles import TILE_SIZE, RasterSource
+
+# 默认阈值（mm），对应常用降水量级
+DEFAULT_THRESHOLDS = (0.1, 10.0, 25.0, 50.0, 100.0, 250.0)
+MAX_THRESHOLDS = 20
+# 简化容差（瓦片像元的倍数）
+SIMPLIFY_PIXELS = 0.5
+# coverage_simplify 需要 GEOS 3.12+
+_COVERAGE_SIMPLIFY = shapely.geos_version >= (3, 12, 0)
+
+# 边：0 上（左上-右上）、1 右（右上-右下）、2 下（左下-右下）、3 左（左上-左下）
+# case 位：左上 8、右上 4、右下 2、左下 1（值 ≥ 阈值为 1）
+_CASE_EDGES = {
+    1: ((3, 2),), 2: ((2, 1),), 3: ((3, 1),), 4: ((0, 1),), 6: ((0, 2),), 7: ((3, 0),),
+    8: ((3, 0),), 9: ((0, 2),), 11: ((0, 1),), 12: ((3, 1),), 13: ((2, 1),), 14: ((3, 2),),
+}
+# 鞍点格元：(中心值 ≥ 阈值时的线段, 否则的线段)
+_SADDLE_EDGES = {
+    5: (((3, 0), (2, 1)), ((0, 1), (3, 2))),
+    10: (((0, 1), (3, 2)), ((3, 0), (2, 1))),
+}
+
+
+def parse_thresholds(text: str) -> Tuple[float, ...]:
+    """逗号分隔的阈值 → 去重升序元组"""
+    try:
+        values = sorted({float(v) for v in text.split(",") if v.strip()})
+    except ValueError:
+        raise ValueError("阈值需为逗号分隔的数值")
+    if not values or len(values) > MAX_THRESHOLDS or not all(math.isfinite(v) for v in values):
+        raise ValueError(f"阈值个数需在 1～{MAX_THRESHOLDS} 之间")
+    return tuple(values)
+
+
+def _edge_points(v: np.ndarray, thr: float, edge: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """格元 (i, j) 某条边上的等值点，坐标为 (列, 行)"""
+    if edge == 0:
+        a, b = v[i, j], v[i, j + 1]
+        return np.column_stack([j + (thr - a) / (b - a), i])
+    if edge == 1:
+        a, b = v[i, j + 1], v[i + 1, j + 1]
+        return np.column_stack([j + 1, i + (thr - a) / (b - a)])
+    if edge == 2:
+        a, b = v[i + 1, j], v[i + 1, j + 1]
+        return np.column_stack([j + (thr - a) / (b - a), i + 1])
+    a, b = v[i, j], v[i + 1, j]
+    return np.column_stack([j, i + (thr - a) / (b - a)])
+
+
+def isoline_segments(v: np.ndarray, thr: float) -> np.ndarray:
+    """单个阈值的全部线段 (n, 2, 2)，坐标为 (列, 行)"""
+    # 恰好等于阈值的格点略微上移，避免交点落在格点上造成线段退化或相切
+    v = np.where(v == thr, np.nextafter(thr, np.inf), v)
+    high = v >= thr
+    cases = (high[:-1, :-1] * np.uint8(8)) | (high[:-1, 1:] * np.uint8(4)) | (high[1:, 1:] * np.uint8(2)) | high[1:, :-1]
+    # 只对等值线穿过的格元（case 非 0/15）展开
+    i, j = np.nonzero((cases != 0) & (cases != 15))
+    cases = cases[i, j]
+    segments = []
+
+    def emit(pairs, sel):
+        ii, jj = i[sel], j[sel]
+        for e1, e2 in pairs:
+            segments.append(np.stack([_edge_points(v, thr, e1, ii, jj), _edge_points(v, thr, e2, ii, jj)], axis=1))
+
+    for case, pairs in _CASE_EDGES.items():
+        sel = np.flatnonzero(cases == case)
+        if sel.size:
+            emit(pairs, sel)
+    for case, (center_high, center_low) in _SADDLE_EDGES.items():
+        sel = np.flatnonzero(cases == case)
+        if not sel.size:
+            continue
+        ii, jj = i[sel], j[sel]
+        center = (v[ii, jj] + v[ii, jj + 1] + v[ii + 1, jj] + v[ii + 1, jj + 1]) / 4 >= thr
+        emit(center_high, sel[center])
+        emit(center_low, sel[~center])
+    return np.concatenate(segments) if segments else np.empty((0, 2, 2))
+
+
+def _bilinear(v: np.ndarray, xy: np.ndarray) -> np.ndarray:
+    x = np.clip(xy[:, 0], 0, v.shape[1] - 1.000001)
+    y = np.clip(xy[:, 1], 0, v.shape[0] - 1.000001)
+    j, i = x.astype(np.int64), y.astype(np.int64)
+    fx, fy = x - j, y - i
+    top = v[i, j] * (1 - fx) + v[i, j + 1] * fx
+    bottom = v[i + 1, j] * (1 - fx) + v[i + 1, j + 1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def contour_grid(values: np.ndarray, thresholds: Sequence[float]) -> Tuple[List[tuple], List[tuple]]:
+    """
+    格网（行 0 为北）→ (等值线 [(阈值, 几何)], 等值面 [(下限, 上限, 面数组)])，坐标为补边后的 (列, 行)
+    """
+    fill = float(thresholds[0]) - 1.0
+    v = np.full((values.shape[0] + 2, values.shape[1] + 2), fill, dtype=np.float64)
+    inner = v[1:-1, 1:-1]
+    inner[:] = values
+    inner[~np.isfinite(inner)] = fill
+
+    lines = []
+    for thr in thresholds:
+        segments = isoline_segments(v, thr)
+        if len(segments):
+            merged = shapely.line_merge(shapely.multilinestrings(shapely.linestrings(segments)))
+            lines.append((float(thr), merged))
+
+    bands = []
+    if lines:
+        parts = np.concatenate([shapely.get_parts(g) for _, g in lines])
+        faces = shapely.get_parts(shapely.polygonize(parts))
+        if len(faces):
+            points = shapely.get_coordinates(shapely.point_on_surface(faces))
+            level = np.searchsorted(np.asarray(thresholds), _bilinear(v, points), side="right")
+            for k in range(1, len(thresholds) + 1):
+                selected = faces[level == k]
+                if len(selected):
+                    upper = float(thresholds[k]) if k < len(thresholds) else None
+                    bands.append((float(thresholds[k - 1]), upper, selected))
+    return lines, bands
+
+
+def native_zoom(source: RasterSource) -> int:
+    """瓦片像元不大于源格元的最小缩放级别；更高级别的等值线与之相同"""
+    return max(0, math.ceil(math.log2(360.0 / (TILE_SIZE * source.dlon))))
+
+
+def contours_geojson(source: RasterSource, thresholds: Sequence[float], zoom: int, kind: str = "all") -> bytes:
+    """某缩放级别的等值线/等值面 GeoJSON FeatureCollection（kind: lines / bands / all）"""
+    k = source.level_for(zoom)
+    lines, bands = contour_grid(source.levels[k], thresholds)
+
+    cell_lon, cell_lat = source.dlon * 2 ** k, source.dlat * 2 ** k
+    west, north = source.west, source.north
+
+    def to_lnglat(coords):
+        # 补边使 (列, 行) 偏移 1
+        return np.column_stack([west + (coords[:, 0] - 0.5) * cell_lon, north - (coords[:, 1] - 0.5) * cell_lat])
+
+    tolerance = SIMPLIFY_PIXELS * 360.0 / (TILE_SIZE * 2 ** zoom)
+    decimals = max(2, math.ceil(math.log10(TILE_SIZE * 2 ** zoom / 360.0)) + 1)
+
+    def finish(geoms):
+        return shapely.transform(geoms, lambda c: np.round(c, decimals))
+
+    features = []
+    if kind in ("bands", "all") and bands:
+        # 全部分级面一起简化，相邻分级的公共边保持一致
+        faces = shapely.transform(np.concatenate([f for _, _, f in bands]), to_lnglat)
+        if _COVERAGE_SIMPLIFY:
+            faces = shapely.coverage_simplify(faces, tolerance)
+        else:
+            faces = shapely.simplify(faces, tolerance, preserve_topology=True)
+        offset = 0
+        for lower, upper, band_faces in bands:
+            part = faces[offset:offset + len(band_faces)]
+            offset += len(band_faces)
+            geom = finish(shapely.multipolygons(part[~shapely.is_empty(part)]))
+            if not geom.is_empty:
+                features.append(({"kind": "band", "lower": lower, "upper": upper}, geom))
+    if kind in ("lines", "all"):
+        for thr, geom in lines:
+            geom = finish(shapely.simplify(shapely.transform(geom, to_lnglat), tolerance, preserve_topology=True))
+            if not geom.is_empty:
+                features.append(({"kind": "isohyet", "value": thr}, geom))
+    return feature_collection(features)
+
+
+def feature_collection(features: Iterable[tuple]) -> bytes:
+    parts = [
+        f'{{"type":"Feature","properties":{json.dumps(props)},"geometry":{shapely.to_geojson(geom)}}}'
+        for props, geom in features
+    ]
+    return ('{"type":"FeatureCollection","features":[' + ",".join(parts) + "]}").encode()
@@ -0,0 +1,278 @@
+"""
+桩号线性参照：桩号字符串批量解析，沿设施中心线插值坐标
+
+MonitoringFacility.centerline 为中心线（LINESTRINGZ，EPSG:4549，顶点顺序即桩号增加方向），
+chainage_start 为首顶点桩号。中心线索引预先计算各顶点的累计长度与各线段的单位切向量，
+按几何哈希缓存；一批桩号用 searchsorted 定位线段后一次插值，
+横向偏移沿左法向量（面向桩号增加方向，左为正）平移。
+
+桩号字符串的解析用 pandas 向量化正则一次完成，例如
+"引0+123.45 左2.5m ▽1893.0" → 桩号 123.45 m、左偏 2.5 m、高程 1893.0。
+"""
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+from sqlalchemy import select, update, bindparam, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ChainageCoordinate, MonitoringFacility, Sensor
+from app.utils.versions import bump
+
+LOCATION_SOURCE = "linear_ref"
+# 超出中心线两端的容差（m）
+END_TOLERANCE = 0.5
+
+_CHAINAGE_RE = r"(?P<km>\d+)\s*(?P<sign>[+\-])\s*(?P<m>\d+(?:\.\d+)?)"
+# 左/右 或 L/R/left/right（不区分大小写，前面不能紧接字母，避免把 "EL 2130" 读成右偏）
+_OFFSET_RE = r"(?P<dir>左|右|(?<![A-Za-z])(?i:left|right|l|r))[侧边]?\s*(?P<off>\d+(?:\.\d+)?)"
+_ELEVATION_RE = r"(?:▽|高程|EL\.?)\s*(?P<elev>\d+(?:\.\d+)?)"
+_LEFT = {"左", "l", "left"}
+_RIGHT = {"右", "r", "right"}
+
+
+def parse_chainage(raw: pd.Series) -> pd.DataFrame:
+    """
+    批量解析桩号字符串；返回与 raw 同索引的 DataFrame：
+    chainage_value / chainage_normalized / lateral_offset_dir / lateral_offset_m / elevation，
+    无法解析的字段为 NaN/None。
+    """
+    raw = raw.fillna("").astype(str)
+    ch = raw.str.extract(_CHAINAGE_RE)
+    km = pd.to_numeric(ch["km"], errors="coerce")
+    m = pd.to_numeric(ch["m"], errors="coerce")
+    sign = np.where(ch["sign"] == "-", -1.0, 1.0)
+    value = km * 1000 + sign * m
+
+    normalized = pd.Series(None, index=raw.index, dtype=object)
+    ok = value.notna()
+    normalized[ok] = ch["km"][ok].astype(int).astype(str) + ch["sign"][ok] + m[ok].map("{:07.3f}".format)
+
+    off = raw.str.extract(_OFFSET_RE)
+    elev = raw.str.extract(_ELEVATION_RE)
+    return pd.DataFrame({
+        "chainage_value": value,
+        "chainage_normalized": normalized,
+        "lateral_offset_dir": off["dir"].where(off["dir"].notna(), None),
+        "lateral_offset_m": pd.to_numeric(off["off"], errors="coerce"),
+        "elevation": pd.to_numeric(elev["elev"], errors="coerce"),
+    })
+
+
+def signed_offsets(directions: Iterable[Optional[str]], offsets: np.ndarray) -> np.ndarray:
+    """左偏为正、右偏为负；方向缺失时按中心线处理"""
+    keys = [d.lower() if isinstance(d, str) else d for d in directions]
+    sign = np.array([1.0 if d in _LEFT else -1.0 if d in _RIGHT else 0.0 for d in keys])
+    return sign * np.nan_to_num(np.asarray(offsets, dtype=float))
+
+
+@dataclass(frozen=True)
+class CenterlineIndex:
+    points: np.ndarray
+    cumulative: np.ndarray
+    tangents: np.ndarray
+    start: float
+
+    @classmethod
+    def from_coords(cls, coords: np.ndarray, start: float = 0.0) -> "CenterlineIndex":
+        coords = np.asarray(coords, dtype=float)
+        if coords.shape[1] == 2:
+            coords = np.column_stack([coords, np.full(len(coords), np.nan)])
+        # 去掉零长度线段
+        steps = np.hypot(np.diff(coords[:, 0]), np.diff(coords[:, 1]))
+        keep = np.concatenate([[True], steps > 0])
+        coords = coords[keep]
+        delta = np.diff(coords[:, :2], axis=0)
+        lengths = np.hypot(delta[:, 0], delta[:, 1])
+        if not len(lengths):
+            raise ValueError("中心线长度为 0")
+        return cls(
+            points=coords,
+            cumulative=np.concatenate([[0.0], np.cumsum(lengths)]),
+            tangents=delta / lengths[:, None],
+            start=float(start or 0.0),
+        )
+
+    @property
+    def length(self) -> float:
+        return float(self.cumulative[-1])
+
+    def locate(self, chainage, offset=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        桩号数组（m）与带符号横向偏移 → (x, y, z, inside)。
+
+        inside 标记桩号在中心线范围内（含 END_TOLERANCE）；范围外沿端部线段外延。
+        """
+        s = np.asarray(chainage, dtype=float) - self.start
+        k = np.clip(np.searchsorted(self.cumulative, s, side="right") - 1, 0, len(self.tangents) - 1)
+        along = s - self.cumulative[k]
+        tx, ty = self.tangents[k, 0], self.tangents[k, 1]
+        x = self.points[k, 0] + tx * along
+        y = self.points[k, 1] + ty * along
+        seg = self.cumulative[k + 1] - self.cumulative[k]
+        t = np.clip(along / seg, 0.0, 1.0)
+        z = self.points[k, 2] + (self.points[k + 1, 2] - self.points[k, 2]) * t
+        if offset is not None:
+            d = np.asarray(offset, dtype=float)
+            x = x - ty * d
+            y = y + tx * d
+        inside = (s >= -END_TOLERANCE) & (s <= self.length + END_TOLERANCE)
+        return x, y, z, inside
+
+
+_indexes: Dict[Tuple[str, float], CenterlineIndex] = {}
+_lock = threading.Lock()
+
+
+def get_centerline_index(wkb: Optional[bytes], start: Optional[float] = None) -> Optional[CenterlineIndex]:
+    """由中心线 WKB 获取索引（按几何哈希与起点桩号缓存）"""
+    if not wkb:
+        return None
+    key = (hashlib.sha1(bytes(wkb)).hexdigest(), float(start or 0.0))
+    index = _indexes.get(key)
+    if index is None:
+        coords = shapely.get_coordinates(shapely.from_wkb(bytes(wkb)), include_z=True)
+        if len(coords) < 2:
+            return None
+        index = CenterlineIndex.from_coords(coords, key[1])
+        with _lock:
+            _indexes[key] = index
+    return index
+
+
+KEY_COLUMNS = ["chainage_normalized", "lateral_offset_dir", "lateral_offset_m", "elevation"]
+
+
+def _first_valid(existing: pd.Series, parsed: pd.Series) -> pd.Series:
+    return existing.where(existing.notna(), parsed)
+
+
+def _keep_unique_keys(df: pd.DataFrame, original: pd.DataFrame, others: pd.DataFrame) -> pd.DataFrame:
+    """
+    补全后的 (设施, 规范化桩号, 偏移方向, 偏移量, 高程) 若与其他记录重复（违反唯一约束），
+    该记录的这些字段恢复原值，直到不再重复（含空值的键不会冲突）。
+    """
+    df = df.copy()
+    while True:
+        keys = pd.concat([df[["facility_id", *KEY_COLUMNS]], others[["facility_id", *KEY_COLUMNS]]])
+        complete = keys.notna().all(axis=1)
+        dup = keys.duplicated(keep=False) & complete
+        changed = (df[KEY_COLUMNS].ne(original[KEY_COLUMNS]) & ~(df[KEY_COLUMNS].isna() & original[KEY_COLUMNS].isna())).any(axis=1)
+        revert = dup.iloc[: len(df)].to_numpy() & changed.to_numpy()
+        if not revert.any():
+            return df
+        df.loc[revert, KEY_COLUMNS] = original.loc[revert, KEY_COLUMNS]
+
+
+async def resolve_chainage_locations(
+    session: AsyncSession,
+    facility_ids: Optional[Iterable[int]] = None,
+    overwrite: bool = False,
+) -> Dict[str, int]:
+    """
+    为有中心线的设施批量定位桩号点：补全解析字段，写入 location（转换为 EPSG:4326），
+    随后把定位结果复制到尚无坐标的关联传感器。
+    overwrite=False 时只处理 location 为空的记录。
+    """
+    stmt = select(
+        MonitoringFacility.id,
+        func.ST_AsBinary(MonitoringFacility.centerline),
+        MonitoringFacility.chainage_start,
+    ).where(MonitoringFacility.centerline.is_not(None))
+    if facility_ids is not None:
+        stmt = stmt.where(MonitoringFacility.id.in_(list(facility_ids)))
+    indexes = {
+        fid: index
+        for fid, wkb, start in (await session.execute(stmt)).all()
+        if (index := get_centerline_index(wkb, start)) is not None
+    }
+    summary = {"facilities": len(indexes), "candidates": 0, "located": 0, "out_of_range": 0, "unparsed": 0, "sensors": 0}
+    if not indexes:
+        return summary
+
+    cc = ChainageCoordinate
+    stmt = select(
+        cc.id, cc.facility_id, cc.chainage_raw, cc.chainage_value, cc.chainage_normalized,
+        cc.lateral_offset_dir, cc.lateral_offset_m, cc.elevation, cc.location.is_(None),
+    ).where(cc.facility_id.in_(list(indexes)))
+    all_rows = pd.DataFrame(
+        (await session.execute(stmt)).all(),
+        columns=["id", "facility_id", "chainage_raw", "chainage_value", "chainage_normalized",
+                 "lateral_offset_dir", "lateral_offset_m", "elevation", "missing"],
+    )
+    for col in ("chainage_value", "lateral_offset_m", "elevation"):
+        all_rows[col] = pd.to_numeric(all_rows[col], errors="coerce")
+    selected = all_rows["missing"] if not overwrite else pd.Series(True, index=all_rows.index)
+    df = all_rows[selected].reset_index(drop=True)
+    summary["candidates"] = len(df)
+    if df.empty:
+        return summary
+
+    original = df[KEY_COLUMNS].copy()
+    parsed = parse_chainage(df["chainage_raw"])
+    for col in parsed.columns:
+        df[col] = _first_valid(df[col], parsed[col])
+    df = _keep_unique_keys(df, original, all_rows[~selected])
+    df["chainage_value"] = pd.to_numeric(df["chainage_value"], errors="coerce")
+    summary["unparsed"] = int(df["chainage_value"].isna().sum())
+    df = df[df["chainage_value"].notna()].copy()
+
+    df["x"] = df["y"] = df["z"] = np.nan
+    df["inside"] = False
+    for fid, group in df.groupby("facility_id"):
+        offsets = signed_offsets(group["lateral_offset_dir"], group["lateral_offset_m"].to_numpy())
+        x, y, z, inside = indexes[fid].locate(group["chainage_value"].to_numpy(), offsets)
+        df.loc[group.index, ["x", "y", "z"]] = np.column_stack([x, y, z])
+        df.loc[group.index, "inside"] = inside
+    summary["out_of_range"] = int((~df["inside"]).sum())
+    df = df[df["inside"]]
+
+    rows = [
+        {
+            "b_id": int(r.id),
+            "b_value": float(r.chainage_value),
+            "b_normalized": None if pd.isna(r.chainage_normalized) else r.chainage_normalized,
+            "b_dir": None if pd.isna(r.lateral_offset_dir) else r.lateral_offset_dir,
+            "b_offset": None if pd.isna(r.lateral_offset_m) else float(r.lateral_offset_m),
+            "b_elevation": None if pd.isna(r.elevation) else float(r.elevation),
+            "b_x": float(r.x),
+            "b_y": float(r.y),
+        }
+        for r in df.itertuples(index=False)
+    ]
+    if rows:
+        # 已有的规范化桩号保持不变，避免与唯一约束冲突
+        stmt = (
+            update(cc.__table__)
+            .where(cc.__table__.c.id == bindparam("b_id"))
+            .values(
+                chainage_value=bindparam("b_value"),
+                chainage_normalized=func.coalesce(cc.__table__.c.chainage_normalized, bindparam("b_normalized")),
+                lateral_offset_dir=bindparam("b_dir"),
+                lateral_offset_m=bindparam("b_offset"),
+                elevation=bindparam("b_elevation"),
+                location=func.ST_Transform(
+                    func.ST_SetSRID(func.ST_MakePoint(bindparam("b_x"), bindparam("b_y")), 4549), 4326
+                ),
+                location_source=LOCATION_SOURCE,
+            )
+        )
+        await session.execute(stmt, rows)
+    summary["located"] = len(rows)
+
+    # 关联传感器尚无坐标时使用桩号定位结果
+    result = await session.execute(
+        update(Sensor.__table__)
+        .where(Sensor.__table__.c.chainage_id == cc.__table__.c.id)
+        .where(Sensor.__table__.c.location.is_(None))
+        .where(cc.__table__.c.location.is_not(None))
+        .values(location=cc.__table__.c.location)
+    )
+    summary["sensors"] = result.rowcount or 0
+    await session.commit()
+    bump("chainage_coordinates", "sensors")
+    return summary
@@ -0,0 +1,351 @@
+"""
+降水格网时空立方体与点位/流域统计
+
+把 rain_grid 栅格产品的各帧（多时刻文件的每个波段各为一帧）写入一个按块存储的
+float32 立方体文件，并以 np.memmap 打开。块布局为 (块行, 块列, 时刻, CUBE_CHUNK, CUBE_CHUNK)：
+
+- 点位时序：只读取一个块内同一像元的 T 个值（同块连续存放），不再逐帧打开文件；
+- 流域统计：只读取流域掩膜覆盖的块，每块一次取出所有时刻。
+
+立方体按帧来源（产品 id、文件路径与修改时间、变量、起止时刻）的摘要标识，文件与元数据写入
+rain_cube_dir，进程重启后直接复用；版本变化时重建并删除旧文件。流域掩膜（像元中心落在
+流域多边形内）与统计结果缓存在立方体对象上，随立方体一起失效。
+
+流域多边形来自 product_type 为 basin_boundary 的矢量产品（name 为流域名，几何取
+meta.geometry 或 path 指向的 GeoJSON）；没有边界的流域用该流域测站外包多边形外扩代替。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timezone
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+from app.config import get_settings
+from app.utils.columnar import epoch_ms
+from app.utils.raster_io import GridGeometry, RasterFormatError, open_raster, product_file, resolve_product_path
+
+RAIN_GRID_PRODUCT_TYPE = "rain_grid"
+BASIN_PRODUCT_TYPE = "basin_boundary"
+CUBE_CHUNK = 64
+# 无流域边界时，测站外包多边形的外扩距离（度）
+STATION_HULL_BUFFER_DEG = 0.1
+# 每个立方体缓存的统计结果数 / 流域掩膜数
+RESULT_CACHE_SIZE = 256
+MASK_CACHE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class FrameSource:
+    product_id: int
+    path: str
+    mtime: int
+    variable: Optional[str]
+    start: datetime
+    end: Optional[datetime]
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """无时区的时刻按 UTC 处理（产品时刻为 ISO 8601 UTC）"""
+    if value is None:
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def parse_time(text: Optional[str]) -> Optional[datetime]:
+    if not text:
+        return None
+    try:
+        return as_utc(datetime.fromisoformat(text))
+    except ValueError:
+        return None
+
+
+def rain_sources(products: Iterable, root: str) -> List[FrameSource]:
+    """有文件、有起始时刻的 rain_grid 产品，按时刻排序"""
+    sources = []
+    for p in products:
+        start = parse_time(p.time_start)
+        if p.product_type != RAIN_GRID_PRODUCT_TYPE or not p.path or start is None:
+            continue
+        try:
+            path, mtime, variable = product_file(root, p)
+        except FileNotFoundError:
+            continue
+        sources.append(FrameSource(p.id, path, mtime, variable, start, parse_time(p.time_end)))
+    sources.sort(key=lambda s: (s.start, s.product_id))
+    return sources
+
+
+def sources_token(sources: Sequence[FrameSource]) -> str:
+    """帧来源的稳定摘要（不含进程或表版本），同一组文件在重启后得到相同标识"""
+    key = [
+        (s.product_id, s.path, s.mtime, s.variable, s.start.isoformat(), s.end.isoformat() if s.end else None)
+        for s in sources
+    ]
+    return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()[:16]
+
+
+def _band_times(source: FrameSource, bands: int) -> List[datetime]:
+    """多波段文件在起止时刻间均分；没有结束时刻时只取第一个波段"""
+    if bands == 1 or source.end is None or source.end <= source.start:
+        return [source.start]
+    step = (source.end - source.start) / (bands - 1)
+    return [source.start + i * step for i in range(bands)]
+
+
+@dataclass
+class ZoneMask:
+    """流域掩膜：按块分组的块内像元下标及面积权重（cos 纬度）"""
+    blocks: List[Tuple[int, int, np.ndarray]]
+    weights: np.ndarray
+    pixel_count: int
+
+
+class RainCube:
+    def __init__(self, token: str, data: np.ndarray, geo: GridGeometry, times: np.ndarray, product_ids: List[int]):
+        self.token = token
+        self.data = data
+        self.geo = geo
+        # 各帧时刻（epoch 毫秒）与来源产品
+        self.times = times
+        self.product_ids = product_ids
+        self._masks: "OrderedDict[Hashable, ZoneMask]" = OrderedDict()
+        self._results: "OrderedDict[Hashable, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def frame_count(self) -> int:
+        return len(self.times)
+
+    # --- 构建 / 加载 ---
+
+    @classmethod
+    def _paths(cls, cache_dir: str, token: str) -> Tuple[str, str]:
+        return os.path.join(cache_dir, f"{token}.cube"), os.path.join(cache_dir, f"{token}.json")
+
+    @classmethod
+    def _open(cls, cache_dir: str, token: str) -> Optional["RainCube"]:
+        data_path, meta_path = cls._paths(cache_dir, token)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        geo = GridGeometry(**meta["geometry"])
+        c = meta["chunk"]
+        shape_ = (-(-geo.rows // c), -(-geo.cols // c), len(meta["times"]), c, c)
+        if not os.path.isfile(data_path) or os.path.getsize(data_path) != int(np.prod(shape_)) * 4:
+            return None
+        data = np.memmap(data_path, dtype=np.float32, mode="r", shape=shape_)
+        return cls(token, data, geo, np.asarray(meta["times"], dtype=np.int64), meta["product_ids"])
+
+    @classmethod
+    def load_or_build(cls, sources: Sequence[FrameSource], cache_dir: str, token: str) -> "RainCube":
+        os.makedirs(cache_dir, exist_ok=True)
+        cube = cls._open(cache_dir, token)
+        if cube is None:
+            cube = cls._build(sources, cache_dir, token)
+        for name in os.listdir(cache_dir):
+            if not name.startswith(token):
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except OSError:
+                    pass
+        return cube
+
+    @classmethod
+    def _build(cls, sources: Sequence[FrameSource], cache_dir: str, token: str) -> "RainCube":
+        # 第一遍只读文件头：确定帧列表，格网与首帧不一致的文件跳过
+        frames, geo = [], None
+        for source in sources:
+            try:
+                grid = open_raster(source.path, source.variable)
+                grid_geo = grid.geometry
+            except (RasterFormatError, OSError) as e:
+                print(f"[rain_cube] 跳过 {source.path}: {e}")
+                continue
+            if geo is None:
+                geo = grid_geo
+            elif not grid_geo.same_as(geo):
+                print(f"[rain_cube] 跳过 {source.path}: 格网与首帧不一致")
+                continue
+            for band, t in enumerate(_band_times(source, grid.band_count)):
+                frames.append((grid, grid_geo, band, t, source.product_id))
+        if geo is None:
+            raise RasterFormatError("没有可用的降水格网文件")
+        frames.sort(key=lambda f: f[3])
+
+        c = CUBE_CHUNK
+        nby, nbx = -(-geo.rows // c), -(-geo.cols // c)
+        data_path, meta_path = cls._paths(cache_dir, token)
+        tmp = f"{data_path}.tmp"
+        data = np.memmap(tmp, dtype=np.float32, mode="w+", shape=(nby, nbx, len(frames), c, c))
+        padded = np.full((nby * c, nbx * c), np.nan, dtype=np.float32)
+        for t, (grid, grid_geo, band, _, _) in enumerate(frames):
+            padded[:geo.rows, :geo.cols] = grid_geo.orient(grid.read_window(band))
+            data[:, :, t] = padded.reshape(nby, c, nbx, c).transpose(0, 2, 1, 3)
+        data.flush()
+        del data
+        os.replace(tmp, data_path)
+
+        times = [epoch_ms(f[3]) for f in frames]
+        product_ids = [f[4] for f in frames]
+        # 立方体已是北上西左方向
+        geometry = asdict(replace(geo, flip_rows=False, flip_cols=False))
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"chunk": c, "geometry": geometry, "times": times, "product_ids": product_ids}, f)
+        cube = cls._open(cache_dir, token)
+        if cube is None:
+            raise RasterFormatError("降水立方体写入失败")
+        return cube
+
+    # --- 缓存 ---
+
+    def _cached(self, store: OrderedDict, key: Hashable, limit: int, compute):
+        with self._lock:
+            value = store.get(key)
+            if value is not None:
+                store.move_to_end(key)
+                return value
+        value = compute()
+        with self._lock:
+            store[key] = value
+            while len(store) > limit:
+                store.popitem(last=False)
+        return value
+
+    # --- 查询 ---
+
+    def pixel_series(self, row: int, col: int) -> np.ndarray:
+        c = CUBE_CHUNK
+        return self._cached(
+            self._results, ("pixel", row, col), RESULT_CACHE_SIZE,
+            lambda: np.array(self.data[row // c, col // c, :, row % c, col % c], dtype=np.float32),
+        )
+
+    def zone_mask(self, key: Hashable, geometry) -> ZoneMask:
+        return self._cached(self._masks, key, MASK_CACHE_SIZE, lambda: self._build_mask(geometry))
+
+    def _build_mask(self, geometry) -> ZoneMask:
+        geo, c = self.geo, CUBE_CHUNK
+        minx, miny, maxx, maxy = geometry.bounds
+        r0 = max(int(np.floor((geo.north - maxy) / geo.dlat)), 0)
+        r1 = min(int(np.ceil((geo.north - miny) / geo.dlat)), geo.rows)
+        c0 = max(int(np.floor((minx - geo.west) / geo.dlon)), 0)
+        c1 = min(int(np.ceil((maxx - geo.west) / geo.dlon)), geo.cols)
+        rows = cols = np.empty(0, dtype=np.int64)
+        if r1 > r0 and c1 > c0:
+            lon, lat = geo.centers(slice(r0, r1), slice(c0, c1))
+            shapely.prepare(geometry)
+            inside = shapely.contains_xy(geometry, lon[None, :], lat[:, None])
+            rows, cols = np.nonzero(inside)
+            rows, cols = rows + r0, cols + c0
+        if rows.size == 0:
+            # 小于一个格元的流域：取代表点所在格元
+            point = geometry.representative_point()
+            cell = geo.locate(point.x, point.y)
+            if cell is None:
+                return ZoneMask([], np.empty(0), 0)
+            rows, cols = np.array([cell[0]]), np.array([cell[1]])
+
+        block_id = (rows // c) * (-(-geo.cols // c)) + cols // c
+        order = np.argsort(block_id, kind="stable")
+        rows, cols, block_id = rows[order], cols[order], block_id[order]
+        starts = np.flatnonzero(np.r_[True, np.diff(block_id) != 0])
+        blocks = []
+        for i, s in enumerate(starts):
+            e = starts[i + 1] if i + 1 < len(starts) else len(rows)
+            blocks.append((int(rows[s] // c), int(cols[s] // c), (rows[s:e] % c) * c + cols[s:e] % c))
+        lat = geo.north - (rows + 0.5) * geo.dlat
+        return ZoneMask(blocks, np.cos(np.radians(lat)), len(rows))
+
+    def zonal_stats(self, key: Hashable, mask: ZoneMask) -> dict:
+        """各帧的面积加权均值、最大值、像元和与有效像元数"""
+        return self._cached(self._results, ("zone", key), RESULT_CACHE_SIZE, lambda: self._zonal(mask))
+
+    def _zonal(self, mask: ZoneMask) -> dict:
+        t = self.frame_count
+        if not mask.pixel_count:
+            empty = np.full(t, np.nan)
+            return {"mean": empty, "max": empty, "sum": empty, "valid": np.zeros(t, dtype=np.int64)}
+        c = CUBE_CHUNK
+        values = np.concatenate(
+            [np.asarray(self.data[by, bx]).reshape(t, c * c)[:, idx] for by, bx, idx in mask.blocks], axis=1
+        ).astype(np.float64)
+        finite = np.isfinite(values)
+        filled = np.where(finite, values, 0.0)
+        w = mask.weights[None, :] * finite
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (filled * w).sum(axis=1) / w.sum(axis=1)
+        valid = finite.sum(axis=1)
+        maximum = np.where(valid > 0, np.where(finite, values, -np.inf).max(axis=1), np.nan)
+        total = np.where(valid > 0, filled.sum(axis=1), np.nan)
+        return {"mean": mean, "max": maximum, "sum": total, "valid": valid}
+
+    def time_slice(self, start: Optional[datetime], end: Optional[datetime]) -> slice:
+        lo = 0 if start is None else int(np.searchsorted(self.times, epoch_ms(as_utc(start)), side="left"))
+        hi = len(self.times) if end is None else int(np.searchsorted(self.times, epoch_ms(as_utc(end)), side="right"))
+        return slice(lo, hi)
+
+
+def basin_geometries(vector_products: Iterable, root: str, station_points: Dict[str, List[Tuple[float, float]]]) -> Dict[str, tuple]:
+    """流域名 → (来源, shapely 几何)；来源为 boundary 或 station_hull"""
+    result = {}
+    for p in vector_products:
+        if p.product_type != BASIN_PRODUCT_TYPE or not p.name:
+            continue
+        geojson = p.meta.get("geometry") if isinstance(p.meta, dict) else None
+        if geojson is None and p.path:
+            try:
+                with open(resolve_product_path(root, p.path), encoding="utf-8") as f:
+                    geojson = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[rain_cube] 读取流域边界失败 {p.path}: {e}")
+                continue
+        if isinstance(geojson, dict) and geojson.get("type") == "FeatureCollection":
+            geoms = [shape(f["geometry"]) for f in geojson.get("features", []) if f.get("geometry")]
+            geometry = shapely.union_all(geoms) if geoms else None
+        elif isinstance(geojson, dict) and geojson.get("type") == "Feature":
+            geometry = shape(geojson["geometry"]) if geojson.get("geometry") else None
+        else:
+            geometry = shape(geojson) if geojson else None
+        if geometry is not None and not geometry.is_empty:
+            result[p.name] = ("boundary", geometry)
+    for name, points in station_points.items():
+        if name in result or not points:
+            continue
+        hull = shapely.MultiPoint(points).convex_hull
+        result[name] = ("station_hull", hull.buffer(STATION_HULL_BUFFER_DEG))
+    return result
+
+
+class RainCubeService:
+    """当前降水立方体；产品版本变化后的首次访问重建（并发请求只构建一次）"""
+
+    def __init__(self):
+        self.cube: Optional[RainCube] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, products: Iterable) -> RainCube:
+        settings = get_settings()
+        sources = rain_sources(products, settings.raster_root)
+        if not sources:
+            raise RasterFormatError("没有可用的降水格网文件")
+        token = sources_token(sources)
+        if self.cube is not None and self.cube.token == token:
+            return self.cube
+        async with self._lock:
+            if self.cube is None or self.cube.token != token:
+                self.cube = await asyncio.to_thread(RainCube.load_or_build, sources, settings.rain_cube_dir, token)
+        return self.cube
+
+
+rain_cube_service = RainCubeService()
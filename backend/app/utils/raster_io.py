@@ -0,0 +1,393 @@
+"""
+栅格文件读取（NetCDF / GeoTIFF）
+
+NetCDF classic（CDF-1/2/5）由内置的头解析器读取：变量数据直接以 np.memmap 映射，
+按需切片时才从磁盘读取对应块，不整体解码。NetCDF-4（HDF5）与 GeoTIFF 依赖可选库
+（netCDF4、rasterio 或 tifffile），缺失时报错说明。
+
+结果统一为 RasterGrid：data 为 (行, 列) 或 (时刻, 行, 列) 数组，
+lon / lat 为等间距格网中心坐标（EPSG:4326）。缩放系数、偏移与缺测值在 read_window 时应用。
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import netCDF4
+except ImportError:  # 可选依赖：NetCDF-4/HDF5 文件
+    netCDF4 = None
+
+try:
+    import rasterio
+except ImportError:  # 可选依赖：GeoTIFF
+    rasterio = None
+
+try:
+    import tifffile
+except ImportError:  # 可选依赖：GeoTIFF（无 rasterio 时）
+    tifffile = None
+
+# 未指定变量名时优先选择的数据变量
+PREFERRED_VARIABLES = ("rain", "rainfall", "precipitation", "precip", "pr", "tp", "prcp", "rr")
+_LON_NAMES = ("lon", "longitude", "x")
+_LAT_NAMES = ("lat", "latitude", "y")
+_TIME_NAMES = ("time", "t")
+
+
+class RasterFormatError(ValueError):
+    """无法读取的栅格文件"""
+
+
+@dataclass(frozen=True)
+class GridGeometry:
+    """等间距格网的地理范围；行 0 为最北侧、列 0 为最西侧（orient 后的数组方向）"""
+    west: float
+    north: float
+    dlon: float
+    dlat: float
+    rows: int
+    cols: int
+    flip_rows: bool = False
+    flip_cols: bool = False
+
+    @classmethod
+    def from_axes(cls, lon: np.ndarray, lat: np.ndarray) -> "GridGeometry":
+        dlon = regular_step(lon, "经度")
+        dlat = regular_step(lat, "纬度")
+        return cls(
+            west=float(min(lon[0], lon[-1])) - abs(dlon) / 2,
+            north=float(max(lat[0], lat[-1])) + abs(dlat) / 2,
+            dlon=abs(dlon),
+            dlat=abs(dlat),
+            rows=len(lat),
+            cols=len(lon),
+            flip_rows=dlat > 0,
+            flip_cols=dlon < 0,
+        )
+
+    @property
+    def east(self) -> float:
+        return self.west + self.cols * self.dlon
+
+    @property
+    def south(self) -> float:
+        return self.north - self.rows * self.dlat
+
+    def orient(self, arr: np.ndarray) -> np.ndarray:
+        """文件中的 (…, 行, 列) 数组 → 北上西左方向"""
+        if self.flip_rows:
+            arr = arr[..., ::-1, :]
+        if self.flip_cols:
+            arr = arr[..., ::-1]
+        return arr
+
+    def locate(self, lng: float, lat: float) -> Optional[Tuple[int, int]]:
+        """经纬度所在格元 (行, 列)；格网外返回 None"""
+        row = int(np.floor((self.north - lat) / self.dlat))
+        col = int(np.floor((lng - self.west) / self.dlon))
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def centers(self, rows: slice, cols: slice) -> Tuple[np.ndarray, np.ndarray]:
+        """窗口内格元中心的经度（列）与纬度（行）"""
+        r = np.arange(self.rows)[rows]
+        c = np.arange(self.cols)[cols]
+        return self.west + (c + 0.5) * self.dlon, self.north - (r + 0.5) * self.dlat
+
+    def same_as(self, other: "GridGeometry") -> bool:
+        return (self.rows, self.cols) == (other.rows, other.cols) and np.allclose(
+            [self.west, self.north, self.dlon, self.dlat],
+            [other.west, other.north, other.dlon, other.dlat],
+            rtol=0, atol=min(self.dlon, self.dlat) * 1e-3,
+        )
+
+
+def regular_step(coords: np.ndarray, name: str) -> float:
+    step = np.diff(coords)
+    if not np.allclose(step, step[0], rtol=1e-3, atol=1e-9):
+        raise RasterFormatError(f"{name} 坐标不等间距")
+    return float(step[0])
+
+
+@dataclass
+class RasterGrid:
+    data: np.ndarray
+    lon: np.ndarray
+    lat: np.ndarray
+    nodata: Optional[float] = None
+    scale: float = 1.0
+    offset: float = 0.0
+    times: Optional[np.ndarray] = None
+    attrs: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def band_count(self) -> int:
+        return self.data.shape[0] if self.data.ndim == 3 else 1
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.data.shape[-2:]
+
+    @property
+    def geometry(self) -> GridGeometry:
+        return GridGeometry.from_axes(self.lon, self.lat)
+
+    def read_window(self, band: int = 0, rows: slice = slice(None), cols: slice = slice(None)) -> np.ndarray:
+        """读取一个窗口为 float32（应用缩放/偏移，缺测与非有限值为 NaN）"""
+        src = self.data[band] if self.data.ndim == 3 else self.data
+        raw = np.asarray(src[rows, cols])
+        out = raw.astype(np.float32)
+        if self.nodata is not None:
+            out[raw == self.nodata] = np.nan
+        if self.scale != 1.0 or self.offset != 0.0:
+            out = out * np.float32(self.scale) + np.float32(self.offset)
+        out[~np.isfinite(out)] = np.nan
+        return out
+
+
+# --- NetCDF classic ---
+
+_NC_DIMENSION, _NC_VARIABLE, _NC_ATTRIBUTE = 0x0A, 0x0B, 0x0C
+_NC_TYPES = {
+    1: ">i1", 2: "S1", 3: ">i2", 4: ">i4", 5: ">f4", 6: ">f8",
+    7: ">u1", 8: ">u2", 9: ">u4", 10: ">i8", 11: ">u8",
+}
+
+
+class _Header:
+    def __init__(self, buf, version: int):
+        self.buf = buf
+        self.pos = 4
+        self.version = version
+
+    def _unpack(self, fmt: str):
+        value = struct.unpack_from(fmt, self.buf, self.pos)[0]
+        self.pos += struct.calcsize(fmt)
+        return value
+
+    def int32(self) -> int:
+        return self._unpack(">i")
+
+    def count(self) -> int:
+        return self._unpack(">q") if self.version == 5 else self._unpack(">i")
+
+    def offset(self) -> int:
+        return self._unpack(">q") if self.version in (2, 5) else self._unpack(">i")
+
+    def name(self) -> str:
+        n = self.count()
+        text = bytes(self.buf[self.pos:self.pos + n]).decode("utf-8", errors="replace")
+        self.pos += n + (-n % 4)
+        return text
+
+    def values(self, nc_type: int, n: int):
+        dtype = np.dtype(_NC_TYPES[nc_type])
+        size = dtype.itemsize * n
+        raw = bytes(self.buf[self.pos:self.pos + size])
+        self.pos += size + (-size % 4)
+        if nc_type == 2:
+            return raw.decode("utf-8", errors="replace").rstrip("\x00")
+        arr = np.frombuffer(raw, dtype=dtype)
+        return arr[0].item() if n == 1 else arr
+
+    def attributes(self) -> Dict[str, object]:
+        tag, n = self.int32(), self.count()
+        if tag not in (_NC_ATTRIBUTE, 0):
+            raise RasterFormatError("NetCDF 属性表格式错误")
+        attrs = {}
+        for _ in range(n):
+            name = self.name()
+            nc_type = self.int32()
+            attrs[name] = self.values(nc_type, self.count())
+        return attrs
+
+
+def _netcdf_classic(path: str) -> Tuple[Dict[str, np.ndarray], Dict[str, dict], Dict[str, object]]:
+    """解析 NetCDF classic 头；返回 (变量名 → memmap 视图, 变量名 → 属性, 全局属性)"""
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic = bytes(buf[:4])
+        if magic[:3] != b"CDF" or magic[3] not in (1, 2, 5):
+            raise RasterFormatError("不是 NetCDF classic 文件")
+        h = _Header(buf, magic[3])
+        numrecs = h.count()
+
+        dims: List[Tuple[str, int]] = []
+        tag, n = h.int32(), h.count()
+        if tag not in (_NC_DIMENSION, 0):
+            raise RasterFormatError("NetCDF 维度表格式错误")
+        for _ in range(n):
+            dims.append((h.name(), h.count()))
+        global_attrs = h.attributes()
+
+        tag, n = h.int32(), h.count()
+        if tag not in (_NC_VARIABLE, 0):
+            raise RasterFormatError("NetCDF 变量表格式错误")
+        variables = []
+        for _ in range(n):
+            name = h.name()
+            dim_ids = [h.count() for _ in range(h.count())]
+            attrs = h.attributes()
+            nc_type = h.int32()
+            vsize = h.count()
+            begin = h.offset()
+            variables.append((name, dim_ids, attrs, nc_type, vsize, begin))
+    finally:
+        buf.close()
+
+    record_vars = [v for v in variables if v[1] and dims[v[1][0]][1] == 0]
+    recsize = sum(v[4] for v in record_vars)
+    if len(record_vars) == 1:
+        # 只有一个记录变量时不做 4 字节对齐填充
+        v = record_vars[0]
+        recsize = int(np.prod([dims[d][1] for d in v[1][1:]], dtype=np.int64)) * np.dtype(_NC_TYPES[v[3]]).itemsize
+
+    raw = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays, attrs = {}, {}
+    for name, dim_ids, var_attrs, nc_type, vsize, begin in variables:
+        dtype = np.dtype(_NC_TYPES[nc_type])
+        shape = [numrecs if dims[d][1] == 0 else dims[d][1] for d in dim_ids]
+        inner = shape[1:] if dim_ids and dims[dim_ids[0]][1] == 0 else shape
+        strides = []
+        step = dtype.itemsize
+        for size in reversed(inner):
+            strides.insert(0, step)
+            step *= size
+        if dim_ids and dims[dim_ids[0]][1] == 0:
+            strides.insert(0, recsize)
+        arrays[name] = np.ndarray(tuple(shape), dtype=dtype, buffer=raw, offset=begin, strides=tuple(strides))
+        attrs[name] = {**var_attrs, "_dims": [dims[d][0] for d in dim_ids]}
+    return arrays, attrs, global_attrs
+
+
+def _find(names, candidates) -> Optional[str]:
+    lower = {n.lower(): n for n in names}
+    return next((lower[c] for c in candidates if c in lower), None)
+
+
+def _grid_from_variables(arrays: dict, attrs: dict, variable: Optional[str]) -> RasterGrid:
+    lon_name = _find(arrays, _LON_NAMES)
+    lat_name = _find(arrays, _LAT_NAMES)
+    if lon_name is None or lat_name is None:
+        raise RasterFormatError("缺少经纬度坐标变量")
+    if variable is None:
+        candidates = [n for n, a in arrays.items() if a.ndim in (2, 3) and n not in (lon_name, lat_name)]
+        variable = _find(candidates, PREFERRED_VARIABLES) or (candidates[0] if candidates else None)
+    if variable is None or variable not in arrays:
+        raise RasterFormatError(f"未找到数据变量 {variable or ''}")
+
+    data = arrays[variable]
+    var_attrs = attrs.get(variable, {})
+    nodata = var_attrs.get("_FillValue", var_attrs.get("missing_value"))
+    time_name = _find(arrays, _TIME_NAMES)
+    return RasterGrid(
+        data=data,
+        lon=np.asarray(arrays[lon_name], dtype=float),
+        lat=np.asarray(arrays[lat_name], dtype=float),
+        nodata=float(nodata) if nodata is not None and np.ndim(nodata) == 0 else None,
+        scale=float(var_attrs.get("scale_factor", 1.0)),
+        offset=float(var_attrs.get("add_offset", 0.0)),
+        times=np.asarray(arrays[time_name]) if time_name and data.ndim == 3 else None,
+        attrs={"variable": variable, "units": var_attrs.get("units")},
+    )
+
+
+def _open_netcdf(path: str, variable: Optional[str]) -> RasterGrid:
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic[:3] == b"CDF":
+        arrays, attrs, _ = _netcdf_classic(path)
+        return _grid_from_variables(arrays, attrs, variable)
+    if magic == b"\x89HDF":
+        if netCDF4 is None:
+            raise RasterFormatError("NetCDF-4 文件需要安装 netCDF4")
+        ds = netCDF4.Dataset(path)
+        ds.set_auto_maskandscale(False)
+        arrays = {name: var for name, var in ds.variables.items()}
+        attrs = {name: {k: var.getncattr(k) for k in var.ncattrs()} for name, var in ds.variables.items()}
+        return _grid_from_variables(arrays, attrs, variable)
+    raise RasterFormatError("无法识别的 NetCDF 文件")
+
+
+# --- GeoTIFF ---
+
+def _open_geotiff(path: str) -> RasterGrid:
+    if rasterio is not None:
+        with rasterio.open(path) as ds:
+            data = ds.read()
+            t = ds.transform
+            lon = t.c + (np.arange(ds.width) + 0.5) * t.a
+            lat = t.f + (np.arange(ds.height) + 0.5) * t.e
+            return RasterGrid(data=data if data.shape[0] > 1 else data[0], lon=lon, lat=lat, nodata=ds.nodata)
+    if tifffile is not None:
+        with tifffile.TiffFile(path) as tif:
+            page = tif.pages[0]
+            scale = page.tags.get(33550)
+            tie = page.tags.get(33922)
+            if scale is None or tie is None:
+                raise RasterFormatError("GeoTIFF 缺少地理参考标签")
+            sx, sy = scale.value[0], scale.value[1]
+            i, j, _, x, y, _ = tie.value[:6]
+            nodata_tag = page.tags.get(42113)
+        try:
+            data = tifffile.memmap(path, mode="r")
+        except ValueError:
+            # 压缩或分块存储的文件无法直接映射
+            data = tifffile.imread(path)
+        rows, cols = data.shape[-2:]
+        lon = x + (np.arange(cols) + 0.5 - i) * sx
+        lat = y - (np.arange(rows) + 0.5 - j) * sy
+        nodata = float(nodata_tag.value) if nodata_tag is not None else None
+        return RasterGrid(data=data, lon=lon, lat=lat, nodata=nodata)
+    raise RasterFormatError("GeoTIFF 需要安装 rasterio 或 tifffile")
+
+
+def open_raster(path: str, variable: Optional[str] = None) -> RasterGrid:
+    """按扩展名打开栅格文件（.nc / .tif / .tiff）"""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".nc", ".nc4", ".cdf"):
+        grid = _open_netcdf(path, variable)
+    elif ext in (".tif", ".tiff"):
+        grid = _open_geotiff(path)
+    else:
+        raise RasterFormatError(f"不支持的栅格格式 {ext}")
+    if grid.lon.ndim != 1 or grid.lat.ndim != 1 or len(grid.lon) < 2 or len(grid.lat) < 2:
+        raise RasterFormatError("仅支持一维等间距经纬度格网")
+    return grid
+
+
+def resolve_product_path(root: str, path: str) -> str:
+    """产品路径（如 /mock/rain/x.nc）相对栅格根目录解析，拒绝越出根目录的路径"""
+    root = os.path.realpath(root)
+    full = os.path.realpath(os.path.join(root, path.lstrip("/\\")))
+    if os.path.commonpath([root, full]) != root:
+        raise FileNotFoundError(path)
+    return full
+
+
+def product_file(root: str, product) -> Tuple[str, int, Optional[str]]:
+    """栅格产品的 (文件路径, 修改时间 ns, 数据变量名)；文件不存在时抛 FileNotFoundError"""
+    if not product.path:
+        raise FileNotFoundError(product.path)
+    path = resolve_product_path(root, product.path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except NotADirectoryError:
+        raise FileNotFoundError(path)
+    variable = product.meta.get("variable") if isinstance(product.meta, dict) else None
+    return path, mtime, variable
+
+
+def file_token(*parts) -> str:
+    """文件版本（路径、修改时间、变量名等）的稳定摘要，不含表版本，重启后保持不变"""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
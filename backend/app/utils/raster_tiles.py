@@ -0,0 +1,184 @@
+"""
+栅格产品的 PNG 瓦片渲染
+
+RasterSource 在加载时按行块从 memmap 解码一次（缩放/缺测处理后为 float32），
+并逐级 2×2 求均值生成概览层，直到最短边不大于 OVERVIEW_MIN_SIZE。
+渲染瓦片时按瓦片像元大小选择概览层，Web 墨卡托像元中心反算经纬度后
+按行、列分别求最近格网下标（两者可分离），一次花式索引取值，再经色表查表得到 RGBA。
+
+RasterSource 按 (文件, 修改时间, 变量, 波段) 缓存在 LRU 中，播放一天的降水帧时
+每帧只解码一次；渲染出的 PNG 另由 TileCache 缓存。
+"""
+import asyncio
+import math
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from app.utils.raster_io import RasterFormatError, RasterGrid, open_raster
+
+TILE_SIZE = 256
+OVERVIEW_MIN_SIZE = 256
+# 加载时每次从 memmap 解码的行数
+DECODE_ROW_CHUNK = 512
+
+# 降水色表：下限（mm）→ RGBA；低于首个下限或缺测为透明
+RAIN_COLORMAP: Sequence[Tuple[float, Tuple[int, int, int, int]]] = (
+    (0.1, (190, 250, 180, 170)),
+    (1.0, (166, 242, 143, 190)),
+    (2.5, (110, 215, 100, 200)),
+    (5.0, (61, 186, 61, 210)),
+    (10.0, (97, 184, 255, 215)),
+    (25.0, (0, 0, 255, 220)),
+    (50.0, (250, 0, 250, 225)),
+    (100.0, (128, 0, 64, 230)),
+    (250.0, (80, 0, 40, 235)),
+)
+
+
+def downsample(level: np.ndarray) -> np.ndarray:
+    """2×2 块均值（忽略 NaN），奇数行/列用 NaN 补齐"""
+    rows, cols = level.shape
+    padded = np.full((rows + rows % 2, cols + cols % 2), np.nan, dtype=np.float32)
+    padded[:rows, :cols] = level
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+    total = np.nansum(blocks, axis=(1, 3))
+    count = np.isfinite(blocks).sum(axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (total / count).astype(np.float32)
+
+
+class RasterSource:
+    """单个波段的全分辨率数据与概览层（行 0 为最北侧，列 0 为最西侧）"""
+
+    def __init__(self, grid: RasterGrid, band: int = 0):
+        geo = grid.geometry
+        level0 = np.empty((geo.rows, geo.cols), dtype=np.float32)
+        for start in range(0, geo.rows, DECODE_ROW_CHUNK):
+            stop = min(start + DECODE_ROW_CHUNK, geo.rows)
+            level0[start:stop] = grid.read_window(band, rows=slice(start, stop))
+        self.levels = [np.ascontiguousarray(geo.orient(level0))]
+        while min(self.levels[-1].shape) > OVERVIEW_MIN_SIZE:
+            self.levels.append(downsample(self.levels[-1]))
+
+        self.dlon, self.dlat = geo.dlon, geo.dlat
+        self.west, self.north, self.east, self.south = geo.west, geo.north, geo.east, geo.south
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
+
+    def level_for(self, z: int) -> int:
+        """源像元不大于瓦片像元的最粗概览层"""
+        tile_px = 360.0 / (TILE_SIZE * 2 ** z)
+        k = int(math.floor(math.log2(tile_px / self.dlon))) if tile_px > self.dlon else 0
+        return min(max(k, 0), len(self.levels) - 1)
+
+    def sample_tile(self, z: int, x: int, y: int) -> Optional[np.ndarray]:
+        """瓦片像元中心的栅格值 (TILE_SIZE, TILE_SIZE)；瓦片与栅格不相交时返回 None"""
+        n = TILE_SIZE * 2 ** z
+        px = (x * TILE_SIZE + np.arange(TILE_SIZE) + 0.5) / n
+        py = (y * TILE_SIZE + np.arange(TILE_SIZE) + 0.5) / n
+        lon = px * 360.0 - 180.0
+        lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * py))))
+        if lon[-1] < self.west or lon[0] > self.east or lat[0] < self.south or lat[-1] > self.north:
+            return None
+
+        k = self.level_for(z)
+        level = self.levels[k]
+        cols = np.floor((lon - self.west) / (self.dlon * 2 ** k)).astype(np.int64)
+        rows = np.floor((self.north - lat) / (self.dlat * 2 ** k)).astype(np.int64)
+        col_ok = (cols >= 0) & (cols < level.shape[1])
+        row_ok = (rows >= 0) & (rows < level.shape[0])
+        if not col_ok.any() or not row_ok.any():
+            return None
+        values = level[np.clip(rows, 0, level.shape[0] - 1)[:, None], np.clip(cols, 0, level.shape[1] - 1)[None, :]]
+        values[~(row_ok[:, None] & col_ok[None, :])] = np.nan
+        return values
+
+
+def colormap_lut(colormap=RAIN_COLORMAP) -> Tuple[np.ndarray, np.ndarray]:
+    """(分级下限, RGBA 查找表)；查找表第 0 行为透明"""
+    bounds = np.array([b for b, _ in colormap], dtype=np.float32)
+    lut = np.zeros((len(colormap) + 1, 4), dtype=np.uint8)
+    lut[1:] = [c for _, c in colormap]
+    return bounds, lut
+
+
+_RAIN_LUT = colormap_lut()
+
+
+def colorize(values: np.ndarray, lut: Tuple[np.ndarray, np.ndarray] = _RAIN_LUT) -> np.ndarray:
+    bounds, table = lut
+    idx = np.searchsorted(bounds, values, side="right")
+    idx[~np.isfinite(values)] = 0
+    return table[idx]
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def encode_png(rgba: np.ndarray, level: int = 6) -> bytes:
+    """RGBA uint8 (h, w, 4) → PNG（每行过滤类型 0）"""
+    h, w = rgba.shape[:2]
+    raw = np.zeros((h, w * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(h, w * 4)
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)),
+        _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), level)),
+        _png_chunk(b"IEND", b""),
+    ])
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8), 9)
+
+
+def render_tile(source: RasterSource, z: int, x: int, y: int) -> bytes:
+    values = source.sample_tile(z, x, y)
+    if values is None:
+        return EMPTY_TILE
+    rgba = colorize(values)
+    if not rgba[..., 3].any():
+        return EMPTY_TILE
+    return encode_png(rgba)
+
+
+class SourceCache:
+    """已解码栅格（含概览层）的 LRU 缓存；同一键的并发加载只执行一次"""
+
+    def __init__(self, maxsize: int = 24):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Hashable, RasterSource]" = OrderedDict()
+        self._pending: Dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, loader: Callable[[], RasterSource]) -> RasterSource:
+        source = self._items.get(key)
+        if source is not None:
+            self._items.move_to_end(key)
+            return source
+        task = self._pending.get(key)
+        if task is None:
+            task = self._pending[key] = asyncio.ensure_future(asyncio.to_thread(loader))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        source = await asyncio.shield(task)
+        self._items[key] = source
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return source
+
+
+def load_source(path: str, variable: Optional[str], band: int) -> RasterSource:
+    grid = open_raster(path, variable)
+    if band >= grid.band_count:
+        raise RasterFormatError(f"波段 {band} 超出范围（共 {grid.band_count} 个）")
+    return RasterSource(grid, band)
+
+
+raster_sources = SourceCache(get_settings().raster_source_items)
@@ -0,0 +1,258 @@
+"""
+水位流量关系（率定曲线）拟合与应用
+
+幂函数：Q = a · (h − h0)^b。对一组候选 h0 同时在对数空间做加权最小二乘
+（每个候选一行，闭式解），取残差最小者，再在其邻域细化一次。
+分段曲线：各段在分段点处连续，上段 h0 不低于下段、指数 b 不小于下段（斜率不减小），
+分段点在水位分位点上枚举，RMSE 改善不足 MIN_SPLIT_IMPROVEMENT 时不再分段。
+
+拟合结果以 model_products 记录保存（product_type="rating_curve"，version 递增），
+参数在 meta 中；应用时对整段水位数组一次向量化计算。
+"""
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+RATING_CURVE_PRODUCT_TYPE = "rating_curve"
+# 每段至少的样本数
+MIN_SEGMENT_POINTS = 20
+# h0 粗搜索与细化的候选数
+H0_CANDIDATES = 48
+# 新增分段点要求的综合 RMSE 最小相对下降
+MIN_SPLIT_IMPROVEMENT = 0.05
+
+
+@dataclass(frozen=True)
+class RatingSegment:
+    h_min: float
+    h_max: float
+    h0: float
+    a: float
+    b: float
+    rmse: float
+    n: int
+
+
+def _fit_log_linear(h: np.ndarray, q: np.ndarray, w: np.ndarray, h0: np.ndarray):
+    """对每个候选 h0 做加权对数线性回归；返回 (a, b, 对数残差平方和)，形状均为 (len(h0),)"""
+    x = np.log(h[None, :] - h0[:, None])
+    y = np.log(q)[None, :]
+    wsum = w.sum()
+    mx = (x * w).sum(axis=1, keepdims=True) / wsum
+    my = (y * w).sum(axis=1, keepdims=True) / wsum
+    dx = x - mx
+    sxx = (w * dx * dx).sum(axis=1)
+    sxy = (w * dx * (y - my)).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        b = sxy / sxx
+    ln_a = my[:, 0] - b * mx[:, 0]
+    resid = y - (ln_a[:, None] + b[:, None] * x)
+    sse = (w * resid * resid).sum(axis=1)
+    return np.exp(ln_a), b, np.where(np.isfinite(sse), sse, np.inf)
+
+
+def _fit_continuous(h: np.ndarray, q: np.ndarray, w: np.ndarray, cuts: Sequence[int], h0: np.ndarray):
+    """
+    连续分段幂函数（h 升序，cuts 为各段起始下标）；对第一段的每个候选 h0 返回
+    (h0, a, b, 对数残差平方和)，h0、a、b 形状为 (段数, len(h0))。
+
+    第一段自由拟合；之后各段过上一段在分段点 hb 处的流量 Qb：
+    Q = Qb · ((h − h0) / (hb − h0))^b，本段 h0 在 [上一段 h0, hb) 内搜索，
+    b 为过原点的加权回归且不小于上一段（低于时取下限，即一元凸二次目标的约束最优解）。
+    h0 不降低、b 不减小时分段点处斜率 b·Qb / (hb − h0) 也不减小，上段外延不会比下段更平缓；
+    这也排除了 h0 贴近段内最低水位、b 很小的退化解。
+    """
+    bounds = [0, *cuts, len(h)]
+    a, b, sse = _fit_log_linear(h[:bounds[1]], q[:bounds[1]], w[:bounds[1]], h0)
+    h0_all, a_all, b_all = [h0], [a], [b]
+    t = np.linspace(0.0, 1.0, H0_CANDIDATES // 4, endpoint=False)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for start, stop in zip(bounds[1:-1], bounds[2:]):
+            hb = (h[start - 1] + h[start]) / 2
+            depth_prev = hb - h0_all[-1]
+            ln_qb = np.log(a_all[-1]) + b_all[-1] * np.log(depth_prev)
+            # (候选, 本段 h0 网格)
+            depth_b = depth_prev[:, None] * (1.0 - t[None, :])
+            x = np.log(h[start:stop] - (hb - depth_b)[..., None]) - np.log(depth_b)[..., None]
+            y = (np.log(q[start:stop])[None, :] - ln_qb[:, None])[:, None, :]
+            ws = w[start:stop]
+            b_min = np.broadcast_to(b_all[-1][:, None], depth_b.shape)
+            b_seg = np.fmax((ws * x * y).sum(axis=2) / (ws * x * x).sum(axis=2), b_min)
+            resid = y - b_seg[..., None] * x
+            seg_sse = (ws * resid * resid).sum(axis=2)
+            seg_sse = np.where(np.isfinite(seg_sse), seg_sse, np.inf)
+            g = np.argmin(seg_sse, axis=1)
+            rows = np.arange(len(h0))
+            sse = sse + seg_sse[rows, g]
+            h0_all.append(hb - depth_b[rows, g])
+            b_all.append(b_seg[rows, g])
+            a_all.append(np.exp(ln_qb - b_all[-1] * np.log(depth_b[rows, g])))
+    return np.array(h0_all), np.array(a_all), np.array(b_all), np.where(np.isfinite(sse), sse, np.inf)
+
+
+def _fit_segments(h: np.ndarray, q: np.ndarray, w: np.ndarray, cuts: Sequence[int] = (),
+                  h0_bounds: Optional[Sequence[float]] = None) -> List[RatingSegment]:
+    """搜索第一段的 h0（粗搜索后在最优候选邻域细化），返回各段参数"""
+    h_low = float(h.min())
+    if h0_bounds is None:
+        span = max(float(h.max()) - h_low, 0.5)
+        h0_bounds = (h_low - span, h_low - 1e-3)
+    lo, hi = min(h0_bounds[0], h_low - 1e-3), min(h0_bounds[1], h_low - 1e-3)
+
+    candidates = np.linspace(lo, hi, H0_CANDIDATES)
+    best = candidates[int(np.argmin(_fit_continuous(h, q, w, cuts, candidates)[3]))]
+    step = candidates[1] - candidates[0] if len(candidates) > 1 else 0.0
+    fine = np.linspace(max(lo, best - step), min(hi, best + step), H0_CANDIDATES)
+    h0, a, b, sse = _fit_continuous(h, q, w, cuts, fine)
+    k = int(np.argmin(sse))
+
+    bounds = [0, *cuts, len(h)]
+    edges = [h_low, *((h[c - 1] + h[c]) / 2 for c in cuts), float(h.max())]
+    segments = []
+    for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        hs, qs, ws = h[start:stop], q[start:stop], w[start:stop]
+        predicted = a[i, k] * (hs - h0[i, k]) ** b[i, k]
+        segments.append(RatingSegment(
+            h_min=float(edges[i]),
+            h_max=float(edges[i + 1]),
+            h0=float(h0[i, k]),
+            a=float(a[i, k]),
+            b=float(b[i, k]),
+            rmse=float(np.sqrt(np.average((predicted - qs) ** 2, weights=ws))),
+            n=int(stop - start),
+        ))
+    return segments
+
+
+def fit_power_law(h, q, weights=None, h0_bounds: Optional[Sequence[float]] = None) -> RatingSegment:
+    """拟合 Q = a (h − h0)^b；h0 默认在 [min(h) − 水位变幅, min(h)) 内搜索"""
+    h = np.asarray(h, dtype=float)
+    q = np.asarray(q, dtype=float)
+    w = np.ones_like(h) if weights is None else np.asarray(weights, dtype=float)
+    return _fit_segments(h, q, w, h0_bounds=h0_bounds)[0]
+
+
+@dataclass
+class RatingCurve:
+    kind: str
+    segments: List[RatingSegment]
+    rmse: float
+    n: int
+
+    def apply(self, levels) -> np.ndarray:
+        """水位数组 → 流量数组；h ≤ h0 为 0，NaN 水位为 NaN，超出率定范围按相邻段外延"""
+        h = np.asarray(levels, dtype=float)
+        uppers = np.array([s.h_max for s in self.segments[:-1]])
+        idx = np.searchsorted(uppers, h, side="left")
+        h0 = np.array([s.h0 for s in self.segments])[idx]
+        a = np.array([s.a for s in self.segments])[idx]
+        b = np.array([s.b for s in self.segments])[idx]
+        with np.errstate(invalid="ignore"):
+            q = a * np.clip(h - h0, 0.0, None) ** b
+        q[np.isnan(h)] = np.nan
+        return q
+
+    def to_meta(self) -> dict:
+        return {
+            "kind": self.kind,
+            "segments": [asdict(s) for s in self.segments],
+            "rmse": self.rmse,
+            "n": self.n,
+        }
+
+    @classmethod
+    def from_meta(cls, meta: dict) -> "RatingCurve":
+        return cls(
+            kind=meta["kind"],
+            segments=[RatingSegment(**s) for s in meta["segments"]],
+            rmse=meta.get("rmse", 0.0),
+            n=meta.get("n", 0),
+        )
+
+
+def _combined_rmse(segments: List[RatingSegment]) -> float:
+    n = sum(s.n for s in segments)
+    return float(np.sqrt(sum(s.rmse ** 2 * s.n for s in segments) / n)) if n else 0.0
+
+
+def fit_segmented(h, q, weights=None, n_segments: int = 2) -> RatingCurve:
+    """
+    连续分段幂函数；分段点在水位分位点上枚举（逐级二分，每次取残差最小的划分），
+    新分段点只有在综合 RMSE 相对下降超过 MIN_SPLIT_IMPROVEMENT 时才接受。
+    """
+    h = np.asarray(h, dtype=float)
+    q = np.asarray(q, dtype=float)
+    w = np.ones_like(h) if weights is None else np.asarray(weights, dtype=float)
+    order = np.argsort(h)
+    h, q, w = h[order], q[order], w[order]
+
+    cuts: List[int] = []
+    segments = _fit_segments(h, q, w)
+    score = _combined_rmse(segments)
+    while len(segments) < n_segments:
+        best = None
+        bounds = [0, *cuts, len(h)]
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if stop - start < 2 * MIN_SEGMENT_POINTS:
+                continue
+            for quantile in np.linspace(0.2, 0.8, 13):
+                cut = start + int((stop - start) * quantile)
+                cut = min(max(cut, start + MIN_SEGMENT_POINTS), stop - MIN_SEGMENT_POINTS)
+                if h[cut - 1] == h[cut]:
+                    continue
+                trial_cuts = sorted([*cuts, cut])
+                trial = _fit_segments(h, q, w, trial_cuts)
+                trial_score = _combined_rmse(trial)
+                if best is None or trial_score < best[0]:
+                    best = (trial_score, trial, trial_cuts)
+        if best is None or best[0] > score * (1 - MIN_SPLIT_IMPROVEMENT):
+            break
+        score, segments, cuts = best
+    kind = "segmented" if len(segments) > 1 else "power"
+    return RatingCurve(kind=kind, segments=segments, rmse=score, n=int(len(h)))
+
+
+def fit_rating_curve(h, q, weights=None, kind: str = "power", n_segments: int = 2) -> RatingCurve:
+    """剔除非正流量/非有限值后拟合"""
+    h = np.asarray(h, dtype=float)
+    q = np.asarray(q, dtype=float)
+    w = np.ones_like(h) if weights is None else np.asarray(weights, dtype=float)
+    valid = np.isfinite(h) & np.isfinite(q) & (q > 0) & (w > 0)
+    h, q, w = h[valid], q[valid], w[valid]
+    if len(h) < MIN_SEGMENT_POINTS:
+        raise ValueError(f"至少需要 {MIN_SEGMENT_POINTS} 组有效水位-流量数据，当前 {len(h)} 组")
+    if np.unique(h).size < 3:
+        raise ValueError("水位变幅不足（不同水位少于 3 个），无法拟合率定曲线")
+    if kind == "segmented":
+        curve = fit_segmented(h, q, w, n_segments)
+    else:
+        segment = fit_power_law(h, q, w)
+        curve = RatingCurve(kind="power", segments=[segment], rmse=segment.rmse, n=segment.n)
+    if not all(np.isfinite(s.a) and np.isfinite(s.b) and s.b > 0 for s in curve.segments):
+        raise ValueError("拟合结果中流量不随水位增加，请检查水位-流量数据")
+    return curve
+
+
+# 已解析的曲线，按产品 id 缓存（同一版本的参数不会再变化）
+_curves: Dict[int, RatingCurve] = {}
+
+
+def curve_from_product(product) -> RatingCurve:
+    curve = _curves.get(product.id)
+    if curve is None:
+        curve = _curves[product.id] = RatingCurve.from_meta(product.meta)
+    return curve
+
+
+def latest_rating_product(products, station_id: int):
+    """从目录缓存的 model_products 中取站点最新版本的率定曲线（无则 None）"""
+    best = None
+    for p in products:
+        if p.product_type != RATING_CURVE_PRODUCT_TYPE or not p.meta:
+            continue
+        if p.meta.get("station_id") != station_id:
+            continue
+        if best is None or p.meta.get("version_no", 0) > best.meta.get("version_no", 0):
+            best = p
+    return best
@@ -0,0 +1,328 @@
+"""
+水库库容计算与水量平衡
+
+水位-库容曲线按设施保存为 model_products 记录（product_type="level_capacity"，
+meta 中为 facility_id、水位/库容断点、正常蓄水位与死水位，版本递增）。
+库容由断点线性插值（高于最高断点按末段斜率外延），整段水位数组一次向量化计算。
+
+ReservoirSeries 为每座水库维护增量状态：读数游标、库容时间序列与滚动水量平衡窗口
+（入库 − 出库 的时段水量 与 库容变化 之差）。每次更新只查询游标之后的新读数，
+不重新扫描历史；曲线版本变化时该水库状态重建。
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import SensorReading
+from app.utils.catalog import get_catalog
+from app.utils.columnar import epoch_ms
+
+LEVEL_CAPACITY_PRODUCT_TYPE = "level_capacity"
+RESERVOIR_FACILITY_TYPE = "reservoir"
+RESERVOIR_METRICS = ("water_level", "inflow", "outflow")
+# 库容单位：万 m³
+STORAGE_UNIT = 1e4
+# 滚动水量平衡窗口（时段数）与内存中保留的库容序列长度
+BALANCE_WINDOW = 288
+MAX_SERIES_POINTS = 100_000
+# 缺少实测曲线的演示水库：按 库容 ∝ (h − 死水位)^2.5 生成曲线，死水位取保证水位以下该深度
+MOCK_RESERVOIR_DEPTH = 40.0
+
+
+@dataclass(frozen=True)
+class CapacityCurve:
+    levels: np.ndarray
+    storage: np.ndarray
+    full_level: float
+    dead_level: float
+
+    @classmethod
+    def from_points(
+        cls,
+        levels: Sequence[float],
+        storage: Sequence[float],
+        full_level: Optional[float] = None,
+        dead_level: Optional[float] = None,
+    ) -> "CapacityCurve":
+        """校验断点（至少两个、水位严格递增、库容不减）；正常蓄水位/死水位缺省取首末断点"""
+        h = np.asarray(levels, dtype=float)
+        v = np.asarray(storage, dtype=float)
+        if h.ndim != 1 or h.shape != v.shape or len(h) < 2:
+            raise ValueError("水位与库容断点数量需一致且至少两个")
+        if not (np.isfinite(h).all() and np.isfinite(v).all()):
+            raise ValueError("断点包含无效数值")
+        if (np.diff(h) <= 0).any() or (np.diff(v) < 0).any():
+            raise ValueError("水位需严格递增，库容不能减小")
+        return cls(
+            levels=h,
+            storage=v,
+            full_level=float(h[-1] if full_level is None else full_level),
+            dead_level=float(h[0] if dead_level is None else dead_level),
+        )
+
+    @classmethod
+    def power(
+        cls,
+        dead_level: float,
+        full_level: float,
+        full_storage: float = 1.0,
+        exponent: float = 2.5,
+        points: int = 41,
+    ) -> "CapacityCurve":
+        """库容 = full_storage · ((h − 死水位) / (正常蓄水位 − 死水位))^exponent 的离散曲线"""
+        h = np.linspace(dead_level, full_level, points)
+        v = full_storage * ((h - dead_level) / (full_level - dead_level)) ** exponent
+        return cls(levels=h, storage=v, full_level=float(full_level), dead_level=float(dead_level))
+
+    def storage_at(self, levels) -> np.ndarray:
+        """水位数组 → 库容数组（万 m³）；低于首断点取首断点库容，NaN 水位为 NaN"""
+        h = np.asarray(levels, dtype=float)
+        v = np.interp(h, self.levels, self.storage)
+        slope = (self.storage[-1] - self.storage[-2]) / (self.levels[-1] - self.levels[-2])
+        above = h > self.levels[-1]
+        v = np.where(above, self.storage[-1] + slope * (h - self.levels[-1]), v)
+        return np.where(np.isnan(h), np.nan, v)
+
+    @property
+    def full_storage(self) -> float:
+        return float(self.storage_at(self.full_level))
+
+    def percent(self, levels) -> np.ndarray:
+        """库容占比（当前库容 / 正常蓄水位库容 × 100）"""
+        full = self.full_storage
+        return self.storage_at(levels) / full * 100 if full > 0 else np.full(np.shape(levels), np.nan)
+
+    def to_meta(self) -> dict:
+        return {
+            "levels": self.levels.tolist(),
+            "storage": self.storage.tolist(),
+            "full_level": self.full_level,
+            "dead_level": self.dead_level,
+            "storage_unit": "万m³",
+        }
+
+    @classmethod
+    def from_meta(cls, meta: dict) -> "CapacityCurve":
+        return cls.from_points(meta["levels"], meta["storage"], meta.get("full_level"), meta.get("dead_level"))
+
+
+def mock_capacity_curve(guarantee_level: float) -> CapacityCurve:
+    return CapacityCurve.power(guarantee_level - MOCK_RESERVOIR_DEPTH, guarantee_level)
+
+
+def latest_capacity_product(products: Iterable, facility_id: int):
+    """从目录缓存的 model_products 中取设施最新版本的水位-库容曲线（无则 None）"""
+    best = None
+    for p in products:
+        if p.product_type != LEVEL_CAPACITY_PRODUCT_TYPE or not p.meta:
+            continue
+        if p.meta.get("facility_id") != facility_id:
+            continue
+        if best is None or p.meta.get("version_no", 0) > best.meta.get("version_no", 0):
+            best = p
+    return best
+
+
+# 已解析的曲线，按产品 id 缓存
+_curves: Dict[int, CapacityCurve] = {}
+
+
+def curve_from_product(product) -> CapacityCurve:
+    curve = _curves.get(product.id)
+    if curve is None:
+        curve = _curves[product.id] = CapacityCurve.from_meta(product.meta)
+    return curve
+
+
+def _forward_fill(times: np.ndarray, src_times: np.ndarray, src_values: np.ndarray, previous: float) -> np.ndarray:
+    """按时间对齐：取每个时刻及之前最近的一次读数，之前没有读数时用 previous"""
+    idx = np.searchsorted(src_times, times, side="right") - 1
+    values = np.where(idx >= 0, src_values[np.maximum(idx, 0)], previous) if len(src_times) else np.full(len(times), previous)
+    return values.astype(float)
+
+
+class ReservoirSeries:
+    """单座水库的增量库容序列与滚动水量平衡"""
+
+    def __init__(self, facility_id: int, curve: CapacityCurve, curve_id: Optional[int] = None):
+        self.facility_id = facility_id
+        self.curve = curve
+        self.curve_id = curve_id
+        self.cursor: Optional[datetime] = None
+        self.times = np.empty(0, dtype=np.int64)
+        self.levels = np.empty(0)
+        self.storage = np.empty(0)
+        self.inflow = np.nan
+        self.outflow = np.nan
+        # 滚动窗口内每个时段的库容变化与入出库水量（m³）
+        self._storage_change = np.empty(0)
+        self._net_inflow = np.empty(0)
+        self._step_sec = np.empty(0)
+
+    def extend(self, times_ms: np.ndarray, levels: np.ndarray, inflow: np.ndarray, outflow: np.ndarray):
+        """追加新时刻（升序，晚于已有序列）；inflow/outflow 已对齐到同一时刻"""
+        if not len(times_ms):
+            return
+        storage = self.curve.storage_at(levels)
+
+        if len(self.times):
+            t = np.concatenate([self.times[-1:], times_ms])
+            s = np.concatenate([self.storage[-1:], storage])
+            i = np.concatenate([[self.inflow], inflow])
+            o = np.concatenate([[self.outflow], outflow])
+        else:
+            t, s, i, o = times_ms, storage, inflow, outflow
+        dt = np.diff(t) / 1000.0
+        # 时段平均入出库流量（梯形）× 时长
+        net = ((i[1:] + i[:-1]) / 2 - (o[1:] + o[:-1]) / 2) * dt
+        change = np.diff(s) * STORAGE_UNIT
+        valid = np.isfinite(net) & np.isfinite(change)
+        self._storage_change = np.concatenate([self._storage_change, change[valid]])[-BALANCE_WINDOW:]
+        self._net_inflow = np.concatenate([self._net_inflow, net[valid]])[-BALANCE_WINDOW:]
+        self._step_sec = np.concatenate([self._step_sec, dt[valid]])[-BALANCE_WINDOW:]
+
+        self.times = np.concatenate([self.times, times_ms])[-MAX_SERIES_POINTS:]
+        self.levels = np.concatenate([self.levels, levels])[-MAX_SERIES_POINTS:]
+        self.storage = np.concatenate([self.storage, storage])[-MAX_SERIES_POINTS:]
+        self.inflow = float(inflow[-1])
+        self.outflow = float(outflow[-1])
+
+    def balance(self) -> dict:
+        change = float(self._storage_change.sum())
+        net = float(self._net_inflow.sum())
+        residual = change - net
+        return {
+            "steps": int(len(self._net_inflow)),
+            "window_hours": float(self._step_sec.sum()) / 3600,
+            "storage_change_m3": change,
+            "net_inflow_m3": net,
+            "residual_m3": residual,
+            "residual_percent": residual / abs(net) * 100 if net else None,
+        }
+
+    def summary(self) -> dict:
+        level = float(self.levels[-1]) if len(self.levels) else None
+        storage = float(self.storage[-1]) if len(self.storage) else None
+        return {
+            "facility_id": self.facility_id,
+            "curve_product_id": self.curve_id,
+            "time": int(self.times[-1]) if len(self.times) else None,
+            "water_level": level,
+            "storage": storage,
+            "full_storage": self.curve.full_storage,
+            "capacity_percent": float(self.curve.percent(level)) if level is not None else None,
+            "inflow": None if np.isnan(self.inflow) else self.inflow,
+            "outflow": None if np.isnan(self.outflow) else self.outflow,
+            "balance": self.balance(),
+        }
+
+
+def _rows_to_arrays(rows) -> tuple:
+    rows = [r for r in rows if r[1] is not None]
+    return (
+        np.array([epoch_ms(r[0]) for r in rows], dtype=np.int64),
+        np.array([r[1] for r in rows], dtype=float),
+    )
+
+
+class ReservoirEngine:
+    """全部水库（facility_type="reservoir" 且有水位-库容曲线）的增量状态"""
+
+    def __init__(self):
+        self.series: Dict[int, ReservoirSeries] = {}
+        self.simulated: Dict[int, bool] = {}
+        self._lock = asyncio.Lock()
+
+    def _reservoir_metrics(self, cat) -> Dict[int, Dict[str, int]]:
+        """设施 id → {指标键: metric_id}（同一键有多个时取 id 最小者）"""
+        result: Dict[int, Dict[str, int]] = {}
+        for m in sorted(cat.find_metrics(RESERVOIR_METRICS), key=lambda m: m.id):
+            sensor = cat.sensors.get(m.sensor_id)
+            section = cat.sections.get(sensor.section_id) if sensor else None
+            facility = cat.facilities.get(section.facility_id) if section else None
+            if facility is None or facility.facility_type != RESERVOIR_FACILITY_TYPE:
+                continue
+            result.setdefault(facility.id, {}).setdefault(m.metric_key, m.id)
+        return result
+
+    async def update(self, session: AsyncSession) -> Dict[int, ReservoirSeries]:
+        """拉取各水库游标之后的新读数并追加；曲线版本变化的水库重建"""
+        async with self._lock:
+            cat = await get_catalog(
+                session,
+                "sensors",
+                "sensor_metrics",
+                "monitoring_sections",
+                "monitoring_facilities",
+                "model_products",
+            )
+            metrics = self._reservoir_metrics(cat)
+            series: Dict[int, ReservoirSeries] = {}
+            for facility_id, keys in metrics.items():
+                product = latest_capacity_product(cat.model_products.values(), facility_id)
+                if product is None or "water_level" not in keys:
+                    continue
+                current = self.series.get(facility_id)
+                if current is None or current.curve_id != product.id:
+                    current = ReservoirSeries(facility_id, curve_from_product(product), product.id)
+                await self._extend(session, current, keys)
+                series[facility_id] = current
+                self.simulated[facility_id] = cat.facilities[facility_id].is_simulated
+            self.series = series
+            return series
+
+    async def _extend(self, session: AsyncSession, state: ReservoirSeries, keys: Dict[str, int]):
+        columns = (SensorReading.metric_id, SensorReading.reading_time, SensorReading.value_num)
+        if state.cursor is None:
+            # 首次加载：每个指标只取最近 MAX_SERIES_POINTS 条（倒序取后反转），不扫描全部历史
+            rows = []
+            for metric_id in keys.values():
+                recent = (await session.execute(
+                    select(*columns)
+                    .where(SensorReading.metric_id == metric_id)
+                    .order_by(desc(SensorReading.reading_time))
+                    .limit(MAX_SERIES_POINTS)
+                )).all()
+                rows.extend(reversed(recent))
+        else:
+            stmt = (
+                select(*columns)
+                .where(SensorReading.metric_id.in_(list(keys.values())))
+                .where(SensorReading.reading_time > state.cursor)
+                .order_by(SensorReading.reading_time)
+            )
+            rows = (await session.execute(stmt)).all()
+        if not rows:
+            return
+        by_metric: Dict[int, list] = {}
+        for metric_id, reading_time, value in rows:
+            by_metric.setdefault(metric_id, []).append((reading_time, value))
+
+        level_rows = by_metric.get(keys["water_level"], [])
+        times, levels = _rows_to_arrays(level_rows)
+        if not len(times):
+            return
+        flows = []
+        for key, previous in (("inflow", state.inflow), ("outflow", state.outflow)):
+            src_times, src_values = _rows_to_arrays(by_metric.get(keys.get(key), []))
+            flows.append(_forward_fill(times, src_times, src_values, previous))
+        state.extend(times, levels, *flows)
+        state.cursor = level_rows[-1][0]
+
+    def capacity_percent(self, is_simulated: Optional[bool] = None) -> Optional[float]:
+        """各水库当前库容占比的平均值；无可用水库时为 None"""
+        values = [
+            s.summary()["capacity_percent"]
+            for fid, s in self.series.items()
+            if is_simulated is None or self.simulated.get(fid) == is_simulated
+        ]
+        values = [v for v in values if v is not None and np.isfinite(v)]
+        return round(float(np.mean(values)), 1) if values else None
+
+
+reservoir_engine = ReservoirEngine()
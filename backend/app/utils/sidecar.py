@@ -0,0 +1,226 @@
+"""
+Excel 列式缓存（Arrow IPC sidecar）
+
+首次读取某个工作簿时，将 pandas 解析结果写入缓存目录下的 Arrow IPC 文件，
+文件名由源文件 checksum 与读取参数决定。之后的读取直接内存映射该文件，
+列数据零拷贝，不再解析 XLSX XML。源文件变化（checksum 不同）时自动失效；
+缓存缺失、损坏或未安装 pyarrow 时回退为 pd.read_excel。
+
+reader / excel_importer 读取工作簿时应调用 read_excel_frame 代替 pd.read_excel。
+"""
+import datetime as dt
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import get_settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pyarrow 为可选依赖，缺失时仅不使用缓存
+    pa = None
+    ipc = None
+
+SIDECAR_SUFFIX = ".arrow"
+# 缓存文件格式版本（参与文件名摘要，格式变化后旧缓存自然失效）
+SIDECAR_FORMAT = 3
+_FRAME_META_KEY = b"sidecar.frame"
+
+_checksums: Dict[str, Tuple[int, int, str]] = {}
+_checksum_lock = threading.Lock()
+
+
+def file_checksum(path: str) -> str:
+    """计算文件 sha256；按 (size, mtime) 记忆，文件未变化时不重复读取"""
+    st = os.stat(path)
+    with _checksum_lock:
+        cached = _checksums.get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _checksum_lock:
+        _checksums[path] = (st.st_size, st.st_mtime_ns, digest)
+    return digest
+
+
+def sidecar_dir() -> str:
+    return get_settings().sidecar_cache_dir
+
+
+def sidecar_path(path: str, **read_kwargs: Any) -> str:
+    """缓存文件路径：源文件 checksum + 读取参数摘要"""
+    options = json.dumps({**read_kwargs, "_format": SIDECAR_FORMAT}, sort_keys=True, default=str)
+    options_digest = hashlib.sha1(options.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(sidecar_dir(), f"{file_checksum(path)}-{options_digest}{SIDECAR_SUFFIX}")
+
+
+def _encode_value(v: Any) -> list:
+    """单元格/列名 → 带类型标记的 JSON 值；无法表示的类型抛 TypeError（调用方回退为不缓存）"""
+    if v is None:
+        return ["none"]
+    if v is pd.NaT:
+        return ["nat"]
+    if isinstance(v, (bool, np.bool_)):
+        return ["bool", bool(v)]
+    if isinstance(v, (int, np.integer)):
+        return ["int", int(v)]
+    if isinstance(v, (float, np.floating)):
+        # repr 可精确往返，且能表示 nan / inf
+        return ["float", repr(float(v))]
+    if isinstance(v, str):
+        return ["str", v]
+    if isinstance(v, pd.Timestamp):
+        return ["timestamp", v.isoformat()]
+    if isinstance(v, dt.datetime):
+        return ["datetime", v.isoformat()]
+    if isinstance(v, dt.date):
+        return ["date", v.isoformat()]
+    if isinstance(v, dt.time):
+        return ["time", v.isoformat()]
+    if isinstance(v, pd.Timedelta):
+        return ["timedelta", v.value]
+    if isinstance(v, dt.timedelta):
+        return ["timedelta", pd.Timedelta(v).value]
+    raise TypeError(f"无法缓存的单元格类型：{type(v).__name__}")
+
+
+def _decode_value(item: list) -> Any:
+    kind = item[0]
+    if kind == "none":
+        return None
+    if kind == "nat":
+        return pd.NaT
+    if kind in ("bool", "int", "str"):
+        return item[1]
+    if kind == "float":
+        return float(item[1])
+    if kind == "timestamp":
+        return pd.Timestamp(item[1])
+    if kind == "datetime":
+        return dt.datetime.fromisoformat(item[1])
+    if kind == "date":
+        return dt.date.fromisoformat(item[1])
+    if kind == "time":
+        return dt.time.fromisoformat(item[1])
+    if kind == "timedelta":
+        return pd.Timedelta(item[1]).to_pytimedelta()
+    raise ValueError(f"未知的单元格类型标记：{kind}")
+
+
+def _to_arrow(df: pd.DataFrame) -> "pa.Table":
+    """
+    DataFrame → Arrow。Arrow 无法表示的混合类型 object 列（如数值与文本混排）逐格编码为
+    带类型标记的 JSON 字符串列；原列名、编码列与 object 列以 JSON 记录在 schema 元数据中，
+    由 _to_pandas 还原，读取结果的单元格类型与 pd.read_excel 一致。缓存文件只包含数据，
+    读取时不会执行任何代码。
+    """
+    columns = list(df.columns)
+    df = df.copy()
+    df.columns = [str(c) for c in columns]
+    objects, encoded = [], []
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        objects.append(col)
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[col] = [json.dumps(_encode_value(v), ensure_ascii=False) for v in df[col]]
+            encoded.append(col)
+    table = pa.Table.from_pandas(df)
+    info = json.dumps({
+        "columns": [_encode_value(c) for c in columns],
+        "objects": objects,
+        "encoded": encoded,
+    }, ensure_ascii=False)
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), _FRAME_META_KEY: info.encode("utf-8")})
+
+
+def _to_pandas(table: "pa.Table") -> pd.DataFrame:
+    """Arrow → DataFrame，还原 _to_arrow 记录的列名与 object 列"""
+    df = table.to_pandas()
+    raw = (table.schema.metadata or {}).get(_FRAME_META_KEY)
+    if raw is None:
+        return df
+    info = json.loads(raw)
+    for col in info["objects"]:
+        if col in info["encoded"]:
+            df[col] = pd.Series([_decode_value(json.loads(v)) for v in df[col]], index=df.index, dtype=object)
+        else:
+            # Arrow 的空值读回为 None，pd.read_excel 为 NaN
+            df[col] = df[col].astype(object).where(df[col].notna(), np.nan)
+    df.columns = pd.Index([_decode_value(c) for c in info["columns"]])
+    return df
+
+
+def write_sidecar(df: pd.DataFrame, target: str) -> Optional[str]:
+    """写入 Arrow IPC 文件（先写临时文件再原子替换）"""
+    if pa is None:
+        return None
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    table = _to_arrow(df)
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with pa.OSFile(tmp, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return target
+
+
+def read_sidecar_table(target: str) -> Optional["pa.Table"]:
+    """内存映射读取缓存文件，返回零拷贝的 Arrow Table；不可用时返回 None"""
+    if pa is None or not os.path.exists(target):
+        return None
+    try:
+        source = pa.memory_map(target, "r")
+        return ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+
+def read_excel_table(path: str, **read_kwargs: Any) -> Optional["pa.Table"]:
+    """读取工作簿的 Arrow Table（缓存优先，首次读取时生成缓存）"""
+    if pa is None:
+        return None
+    target = sidecar_path(path, **read_kwargs)
+    table = read_sidecar_table(target)
+    if table is None:
+        write_sidecar(pd.read_excel(path, **read_kwargs), target)
+        table = read_sidecar_table(target)
+    return table
+
+
+def read_excel_frame(path: str, **read_kwargs: Any) -> pd.DataFrame:
+    """pd.read_excel 的缓存版本，参数与返回值一致（仅支持单个 sheet）"""
+    if pa is not None:
+        try:
+            table = read_excel_table(path, **read_kwargs)
+        except (OSError, TypeError, pa.ArrowInvalid, pa.ArrowTypeError):
+            table = None
+        if table is not None:
+            return _to_pandas(table)
+    return pd.read_excel(path, **read_kwargs)
+
+
+def ensure_sidecar(path: str, **read_kwargs: Any) -> Optional[str]:
+    """导入阶段预生成缓存；已存在时直接返回路径"""
+    if pa is None:
+        return None
+    target = sidecar_path(path, **read_kwargs)
+    if not os.path.exists(target):
+        write_sidecar(pd.read_excel(path, **read_kwargs), target)
+    return target
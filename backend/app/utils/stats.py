@@ -1,52 +1,17 @@
-import os
 import pandas as pd
 from typing import Dict, Any, List, Optional
-from .scanner import DATA_ROOT, scan_data_directory, get_relative_path
+from .file_index import get_file_index
 from .reader import read_excel_data
 from .mock_data import get_mock_stations_by_type
+from .reservoir import mock_capacity_curve
 
 # --- Helper to find specific files ---
 def find_files_by_keywords(keywords: List[str], exclude_keywords: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """
-    扫描数据目录，根据关键词查找文件
+    根据关键词查找数据目录中的文件（基于共享的文件名倒排索引）
     返回文件节点列表，包含 full_path 和 relative_path
     """
-    all_nodes = scan_data_directory(DATA_ROOT)
-    found_files = []
-
-    def traverse(nodes, current_path_parts: List[str]):
-        for node in nodes:
-            node_name = node['label']
-            
-            # Construct a path string for keyword matching
-            current_full_name = "/".join(current_path_parts + [node_name])
-            
-            if node['type'] == 'directory':
-                # Check directory name first
-                if any(k in node_name for k in keywords):
-                    traverse(node.get('children', []), current_path_parts + [node_name])
-                else: # If directory itself doesn't match, still check its children for file matches
-                    traverse(node.get('children', []), current_path_parts + [node_name])
-            elif node['type'] == 'file':
-                file_name = node['label']
-                # Check if file path (including parent directories) contains any keyword
-                if any(k in current_full_name for k in keywords):
-                    # Check for exclude keywords
-                    if exclude_keywords and any(k in current_full_name for k in exclude_keywords):
-                        continue # Skip if excluded
-                    found_files.append({
-                        "full_path": node['path'],
-                        "relative_path": get_relative_path(node['path']),
-                        "filename": file_name,
-                        "parent_dir": os.path.basename(os.path.dirname(node['path']))
-                    })
-    
-    # Start traversal from the top-level nodes of the data root
-    data_root_nodes = scan_data_directory(DATA_ROOT)
-    for node in data_root_nodes:
-        traverse([node], []) 
-    
-    return found_files
+    return get_file_index().query(keywords, exclude_keywords)
 
 
 # --- 统计总览数据 ---
@@ -78,9 +43,9 @@ def calculate_overview_stats() -> Dict[str, Any]:
     # Mock alerts
     stats["today_alerts"] = 2 + len([s for s in mock_res + mock_hydro + mock_rain if s["status"] != "normal"])
 
-    # 库容占比 (Real + Mock)
+    # 库容占比 (Real + Mock)：按水位-库容曲线换算库容后取平均
     water_level_files = find_files_by_keywords(["水位", "Df-"])
-    reservoir_levels_ratio_sum = 0
+    reservoir_capacity_sum = 0.0
     reservoir_count_with_data = 0
     
     mock_guarantee_levels = {
@@ -99,7 +64,7 @@ def calculate_overview_stats() -> Dict[str, Any]:
                     file_name = file_meta["filename"]
                     if file_name in mock_guarantee_levels:
                         guarantee_level = mock_guarantee_levels[file_name]["guarantee_level"]
-                        reservoir_levels_ratio_sum += (current_level / guarantee_level)
+                        reservoir_capacity_sum += float(mock_capacity_curve(guarantee_level).percent(current_level))
                         reservoir_count_with_data += 1
                 except (ValueError, TypeError):
                     pass 
@@ -107,13 +72,11 @@ def calculate_overview_stats() -> Dict[str, Any]:
     # Mock Data
     for s in mock_res:
         if "waterLevel" in s and "guaranteeLevel" in s:
-             reservoir_levels_ratio_sum += (s["waterLevel"] / s["guaranteeLevel"])
+             reservoir_capacity_sum += float(mock_capacity_curve(s["guaranteeLevel"]).percent(s["waterLevel"]))
              reservoir_count_with_data += 1
 
     if reservoir_count_with_data > 0:
-        stats["reservoir_capacity_percent"] = round(reservoir_levels_ratio_sum / reservoir_count_with_data * 100, 1)
-    else:
-        stats["reservoir_capacity_percent"] = 68.5 
+        stats["reservoir_capacity_percent"] = round(reservoir_capacity_sum / reservoir_count_with_data, 1)
 
     # 平均降雨 (Real + Mock)
     rain_files = find_files_by_keywords(["雨量", "降雨", "rain"], exclude_keywords=["渗压"]) 
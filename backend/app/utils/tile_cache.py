@@ -0,0 +1,98 @@
+"""
+瓦片两级缓存（内存 LRU + 磁盘），矢量瓦片与栅格 PNG 瓦片共用
+
+瓦片按 (图层, 版本标识, z, x, y) 缓存。版本标识由图层依赖表的版本号
+（app.utils.versions，数据库 table_versions，重启与多 worker 之间一致）和最新值时间桶组成：
+几何/元数据的任何写入都会使其失效，读数最多延迟一个时间桶。
+图层版本变化后旧版本的磁盘目录整体删除；按时间桶滚动的图层应只用内存缓存（cache_dir=None）。
+"""
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.utils.versions import content_token
+
+TileKey = Tuple[str, str, int, int, int]
+
+
+def version_token(tables: Iterable[str], ttl_sec: float = 0) -> str:
+    """图层内容版本标识；ttl_sec > 0 时按时间桶滚动（用于携带最新读数的图层）"""
+    bucket = int(time.time() // ttl_sec) if ttl_sec > 0 else 0
+    return content_token(tables, bucket)
+
+
+class TileCache:
+    def __init__(self, cache_dir: Optional[str], max_items: int = 2048, suffix: str = "mvt"):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.suffix = suffix
+        self._memory: "OrderedDict[TileKey, bytes]" = OrderedDict()
+        self._tokens: Dict[str, str] = {}
+
+    def _disk_path(self, key: TileKey) -> str:
+        layer, token, z, x, y = key
+        return os.path.join(self.cache_dir, layer, token, str(z), str(x), f"{y}.{self.suffix}")
+
+    def _remember(self, key: TileKey, data: bytes):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _check_token(self, layer: str, token: str):
+        """图层版本变化时丢弃旧版本（内存立即清理，磁盘在后台线程删除）"""
+        previous = self._tokens.get(layer)
+        if previous == token:
+            return
+        self._tokens[layer] = token
+        for key in [k for k in self._memory if k[0] == layer and k[1] != token]:
+            del self._memory[key]
+        if self.cache_dir:
+            asyncio.get_running_loop().run_in_executor(None, self._prune_disk, layer, token)
+
+    def _prune_disk(self, layer: str, keep: str):
+        layer_dir = os.path.join(self.cache_dir, layer)
+        if not os.path.isdir(layer_dir):
+            return
+        for name in os.listdir(layer_dir):
+            if name != keep:
+                shutil.rmtree(os.path.join(layer_dir, name), ignore_errors=True)
+
+    def _read_disk(self, key: TileKey) -> Optional[bytes]:
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: TileKey, data: bytes):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[tile_cache] 写入磁盘缓存失败 {path}: {e}")
+
+    async def get(self, key: TileKey) -> Optional[bytes]:
+        self._check_token(key[0], key[1])
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            return data
+        if self.cache_dir:
+            data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                self._remember(key, data)
+        return data
+
+    async def put(self, key: TileKey, data: bytes):
+        self._remember(key, data)
+        if self.cache_dir:
+            await asyncio.to_thread(self._write_disk, key, data)
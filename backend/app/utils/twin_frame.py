@@ -0,0 +1,93 @@
+"""
+三维孪生场景的二进制帧
+
+帧为小端序紧凑缓冲区，客户端可按偏移直接构造 TypedArray，无需 JSON 解析：
+
+    偏移            内容
+    0               magic "TWF1"
+    4               uint16 格式版本、uint16 标志位（bit0：包含位置）
+    8               uint32 点数 n、uint32 保留
+    16              8 字节位置版本（与 X-Twin-Positions-Version 相同的 16 位十六进制）
+    24              float64[3n] ECEF 坐标（x, y, z 交错；不含位置时省略）
+    …               int32[n] 传感器 id
+    …               float32[n] 最新值（无读数为 NaN）
+    …               uint8[n] 告警级别（ALERT_LEVELS 下标，0 为 normal）
+
+各段起始偏移均满足对应类型的对齐要求。ECEF 坐标按传感器目录版本缓存，
+客户端携带已有位置版本请求时只下发 id/数值/告警级别。
+"""
+import struct
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+
+FRAME_MAGIC = b"TWF1"
+FRAME_FORMAT_VERSION = 1
+FLAG_POSITIONS = 1
+_HEADER = struct.Struct("<4sHHII8s")
+
+# WGS84 椭球
+_WGS84_A = 6378137.0
+_WGS84_E2 = 6.69437999014e-3
+
+
+def lnglat_to_ecef(lng, lat, height=None) -> np.ndarray:
+    """经纬度（度）与椭球高（m）→ ECEF (n, 3) float64"""
+    lam = np.radians(np.asarray(lng, dtype=float))
+    phi = np.radians(np.asarray(lat, dtype=float))
+    h = np.zeros_like(phi) if height is None else np.nan_to_num(np.asarray(height, dtype=float))
+    sin_phi = np.sin(phi)
+    n = _WGS84_A / np.sqrt(1 - _WGS84_E2 * sin_phi * sin_phi)
+    cos_phi = np.cos(phi)
+    return np.column_stack([
+        (n + h) * cos_phi * np.cos(lam),
+        (n + h) * cos_phi * np.sin(lam),
+        (n * (1 - _WGS84_E2) + h) * sin_phi,
+    ])
+
+
+@dataclass(frozen=True)
+class TwinLayout:
+    """某一目录版本下的点位布局：传感器 id 顺序与对应 ECEF 坐标"""
+    version: str
+    sensor_ids: np.ndarray
+    positions: np.ndarray
+
+    @classmethod
+    def build(cls, version: str, sensor_ids: Sequence[int], lng, lat, height=None) -> "TwinLayout":
+        return cls(
+            version=version,
+            sensor_ids=np.asarray(sensor_ids, dtype=np.int32),
+            positions=np.ascontiguousarray(lnglat_to_ecef(lng, lat, height), dtype="<f8"),
+        )
+
+
+def pack_frame(layout: TwinLayout, values: np.ndarray, levels: np.ndarray, include_positions: bool = True) -> bytes:
+    n = len(layout.sensor_ids)
+    flags = FLAG_POSITIONS if include_positions else 0
+    parts = [_HEADER.pack(FRAME_MAGIC, FRAME_FORMAT_VERSION, flags, n, 0, bytes.fromhex(layout.version))]
+    if include_positions:
+        parts.append(layout.positions.tobytes())
+    parts.append(layout.sensor_ids.astype("<i4").tobytes())
+    parts.append(np.asarray(values, dtype="<f4").tobytes())
+    parts.append(np.asarray(levels, dtype=np.uint8).tobytes())
+    return b"".join(parts)
+
+
+class LayoutCache:
+    """只保留当前目录版本的布局"""
+
+    def __init__(self):
+        self.layout: Optional[TwinLayout] = None
+
+    def get(self, version: str) -> Optional[TwinLayout]:
+        layout = self.layout
+        return layout if layout is not None and layout.version == version else None
+
+    def put(self, layout: TwinLayout) -> TwinLayout:
+        self.layout = layout
+        return layout
+
+
+twin_layouts = LayoutCache()
@@ -0,0 +1,162 @@
+"""
+表版本号与条件请求（ETag）
+
+表版本保存在数据库 table_versions 中，由各表的语句级触发器在写入所在事务内递增
+（app.models.table_version）：导入脚本、种子数据、其他进程或 worker 的写入同样生效，
+版本号在重启和多 worker 之间一致。进程内保留一份快照，最多每
+version_sync_interval_sec 秒从数据库读取一次；本进程提交写入后快照立即过期。
+
+尚未执行迁移（table_versions 不存在）时退回进程内计数器：只覆盖本进程的 ORM 写入，
+并加入进程启动标识，避免重启后与旧 ETag 误匹配。
+
+目录类接口以相关表的版本号 + 请求路径/参数生成强 ETag，客户端携带 If-None-Match
+且版本未变时直接返回 304，不做查询也不做序列化。
+"""
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.exc import ProgrammingError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models import TableVersion
+
+# 进程启动标识：仅在退回进程内计数器时加入版本摘要
+_EPOCH = f"{time.time_ns():x}"
+_versions: Dict[str, int] = {}
+_lock = threading.Lock()
+_sync_lock = asyncio.Lock()
+# synced_at: 快照读取时刻（monotonic，None 表示已过期）；generation: 本进程提交次数；db: 是否使用数据库版本
+_state: Dict[str, Any] = {"synced_at": None, "generation": 0, "db": True}
+
+
+def bump(*tables: str):
+    """本进程提交了对 tables 的写入：数据库版本已由触发器递增，只需让快照过期"""
+    with _lock:
+        _state["generation"] += 1
+        _state["synced_at"] = None
+        if not _state["db"]:
+            for table in tables:
+                _versions[table] = _versions.get(table, 0) + 1
+
+
+async def sync_versions():
+    """快照过期时从 table_versions 重新读取（并发调用只查询一次）"""
+    interval = get_settings().version_sync_interval_sec
+
+    def fresh() -> bool:
+        synced = _state["synced_at"]
+        return not _state["db"] or (synced is not None and time.monotonic() - synced < interval)
+
+    if fresh():
+        return
+    async with _sync_lock:
+        if fresh():
+            return
+        started, generation = time.monotonic(), _state["generation"]
+        try:
+            async with AsyncSessionLocal() as session:
+                rows = (await session.execute(select(TableVersion.table_name, TableVersion.version))).all()
+        except ProgrammingError as e:
+            if "table_versions" not in str(e):
+                raise
+            print("[versions] table_versions is missing (run alembic upgrade head); using in-process counters")
+            with _lock:
+                _state["db"] = False
+            return
+        except (OSError, SQLAlchemyError) as e:
+            # 数据库暂不可用：沿用当前快照，间隔后重试
+            print(f"[versions] Failed to read table_versions: {e}")
+            with _lock:
+                if _state["generation"] == generation:
+                    _state["synced_at"] = started
+            return
+        with _lock:
+            _versions.clear()
+            _versions.update(rows)
+            # 查询期间本进程又有提交时保持过期，下次访问再读
+            if _state["generation"] == generation:
+                _state["synced_at"] = started
+
+
+def get_versions(tables: Iterable[str]) -> Tuple[int, ...]:
+    return tuple(_versions.get(t, 0) for t in tables)
+
+
+def _epoch() -> str:
+    return "" if _state["db"] else _EPOCH
+
+
+def content_token(tables: Iterable[str], extra: Any = None) -> str:
+    """表版本的短摘要，用作缓存键中的内容版本"""
+    tables = tuple(tables)
+    key = f"{_epoch()}|{tables}|{get_versions(tables)}|{extra}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def make_etag(tables: Iterable[str], request: Request, extra: Any = None) -> str:
+    tables = tuple(tables)
+    key = f"{_epoch()}|{tables}|{get_versions(tables)}|{extra}|{request.url.path}|{request.url.query}"
+    return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest() + '"'
+
+
+# 压缩中间件为每种编码生成独立 ETag（"abc" → "abc-gzip"），比较时去掉后缀
+_ENCODING_SUFFIX = re.compile(r'-(?:gzip|br|zstd)"$')
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (_ENCODING_SUFFIX.sub('"', tag.strip()) for tag in header.split(","))
+
+
+def etag_guard(*tables: str, extra: Optional[Callable[[], Any]] = None):
+    """
+    路由依赖：版本未变时以 304 结束请求，否则在响应上设置 ETag。
+
+    extra 为可选的版本函数，用于不在数据库中的内容（如数据目录树）。
+    用法：@router.get("/path", dependencies=[Depends(etag_guard("sensors"))])
+    """
+
+    async def dependency(request: Request, response: Response):
+        if tables:
+            await sync_versions()
+        etag = make_etag(tables, request, extra() if extra else None)
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+
+    return dependency
+
+
+# --- 会话事件：flush 时记录被修改的表，提交后使快照过期（未迁移时递增进程内计数器） ---
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_tables(session, flush_context):
+    changed = session.info.setdefault("changed_tables", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            changed.add(table)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_changed_tables(session):
+    changed = session.info.pop("changed_tables", None)
+    if changed:
+        bump(*changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_tables(session):
+    session.info.pop("changed_tables", None)
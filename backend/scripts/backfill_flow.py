@@ -0,0 +1,45 @@
+"""
+按流速-面积法为缺失流量的时刻回填 flow_rate（quality_flag='derived'）。
+Usage: PYTHONPATH=. python -m scripts.backfill_flow [--station 1 --station 2] [--start 2024-06-01] [--end ...]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from app.utils.flow_backfill import BACKFILL_BATCH_SIZE, backfill_stations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill derived flow_rate from velocity and cross-section area")
+    parser.add_argument("--station", type=int, action="append", help="站点 id，可重复；缺省为全部有断面的站点")
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    parser.add_argument("--velocity-coefficient", type=float, default=1.0, help="表面流速 → 断面平均流速系数")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(
+        backfill_stations(
+            args.station,
+            concurrency=args.concurrency,
+            start=args.start,
+            end=args.end,
+            velocity_coefficient=args.velocity_coefficient,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+        )
+    )
+    total = 0
+    for r in results:
+        if r.skipped:
+            print(f"[skip] {r.station_code} (#{r.station_id}): {r.skipped}")
+        else:
+            print(f"{r.station_code} (#{r.station_id}): {r.inserted} 条")
+            total += r.inserted
+    print(f"完成: {'预计' if args.dry_run else '写入'} {total} 条推算流量")
+
+
+if __name__ == "__main__":
+    main()
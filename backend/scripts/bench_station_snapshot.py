@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+水文站最新读数查询基准测试
+
+在一个事务内写入 N 个模拟站点（默认 200 个）及其读数，对比旧版逐站点/逐指标查询
+与单条 SQL 站点快照的耗时，结束后回滚，不在数据库中留下数据。
+Usage: PYTHONPATH=. python -m scripts.bench_station_snapshot [--stations 200] [--readings 288]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import select, desc, insert
+
+# 添加 backend 到 path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import AsyncSessionLocal
+from app.models import (
+    MonitoringFacility,
+    MonitoringSection,
+    SensorType,
+    Sensor,
+    SensorMetric,
+    SensorReading,
+    HydrologicalStation,
+)
+from app.api.hydrological import STATION_METRICS, get_station_snapshots
+
+
+async def legacy_latest_readings(session, station_id: int) -> dict:
+    """旧版实现：站点 → 传感器 → 指标，逐条查询"""
+    sensors = (await session.execute(select(Sensor).where(Sensor.hydrological_station_id == station_id))).scalars().all()
+    latest = {"flow_rate": None, "velocity": None, "water_level": None, "time": None}
+    for sensor in sensors:
+        for metric_key in STATION_METRICS:
+            metric = (
+                await session.execute(
+                    select(SensorMetric).where(
+                        SensorMetric.sensor_id == sensor.id,
+                        SensorMetric.metric_key == metric_key,
+                    )
+                )
+            ).scalars().first()
+            if metric:
+                reading = (
+                    await session.execute(
+                        select(SensorReading)
+                        .where(SensorReading.metric_id == metric.id)
+                        .order_by(desc(SensorReading.reading_time))
+                        .limit(1)
+                    )
+                ).scalars().first()
+                if reading:
+                    latest[metric_key] = reading.value_num
+                    time_str = reading.reading_time.isoformat()
+                    if latest["time"] is None or time_str > latest["time"]:
+                        latest["time"] = time_str
+    return latest
+
+
+async def seed(session, n_stations: int, n_readings: int) -> list[int]:
+    facility = MonitoringFacility(code="BENCH_FACILITY", name="基准测试设施", is_simulated=True)
+    sensor_type = SensorType(code="bench_radar", name="基准雷达流量计", is_simulated=True)
+    session.add_all([facility, sensor_type])
+    await session.flush()
+    section = MonitoringSection(facility_id=facility.id, code="BENCH_MAIN", name="基准断面", is_simulated=True)
+    session.add(section)
+    await session.flush()
+
+    station_ids = []
+    now = datetime.now()
+    for i in range(n_stations):
+        station = HydrologicalStation(
+            facility_id=facility.id,
+            station_code=f"BENCH_{i:04d}",
+            station_name=f"基准站{i}",
+            is_simulated=True,
+        )
+        session.add(station)
+        await session.flush()
+        sensor = Sensor(
+            section_id=section.id,
+            sensor_type_id=sensor_type.id,
+            hydrological_station_id=station.id,
+            point_code=f"BENCH_{i:04d}_RADAR",
+            is_simulated=True,
+        )
+        session.add(sensor)
+        await session.flush()
+        rows = []
+        for key in STATION_METRICS:
+            metric = SensorMetric(sensor_id=sensor.id, metric_key=key, is_simulated=True)
+            session.add(metric)
+            await session.flush()
+            rows.extend(
+                {
+                    "sensor_id": sensor.id,
+                    "metric_id": metric.id,
+                    "reading_time": now - timedelta(minutes=5 * k),
+                    "value_num": random.uniform(0.1, 2.0),
+                    "is_simulated": True,
+                }
+                for k in range(n_readings)
+            )
+        await session.execute(insert(SensorReading), rows)
+        station_ids.append(station.id)
+    return station_ids
+
+
+async def timed(label: str, repeat: int, func):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<24} {best * 1000:9.1f} ms (best of {repeat})")
+    return best
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark station latest-reading queries")
+    parser.add_argument("--stations", type=int, default=200)
+    parser.add_argument("--readings", type=int, default=288, help="每个指标的读数条数")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as session:
+        print(f"[准备] {args.stations} 个站点, 每指标 {args.readings} 条读数")
+        station_ids = await seed(session, args.stations, args.readings)
+
+        async def legacy():
+            return [await legacy_latest_readings(session, sid) for sid in station_ids]
+
+        async def snapshot():
+            return [latest for _, latest in await get_station_snapshots(session, station_ids)]
+
+        try:
+            old = await timed("legacy (N+1)", args.repeat, legacy)
+            new = await timed("snapshot (1 query)", args.repeat, snapshot)
+            print(f"  speedup                  {old / new:9.1f}x")
+            assert await legacy() == await snapshot(), "结果不一致"
+        finally:
+            # 基准数据仅存在于当前事务中
+            await session.rollback()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+"""
+为数据目录下的全部 Excel 工作簿预生成 Arrow 列式缓存。
+Usage: PYTHONPATH=. python -m scripts.build_sidecars [--root /path/to/data]
+"""
+import argparse
+
+from app.utils.file_index import FileIndex
+from app.utils.scanner import DATA_ROOT, scan_data_directory
+from app.utils.sidecar import ensure_sidecar, pa
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build Arrow sidecars for Excel workbooks")
+    parser.add_argument("--root", default=DATA_ROOT)
+    args = parser.parse_args()
+
+    if pa is None:
+        print("pyarrow 未安装，跳过")
+        return
+
+    files = FileIndex(scan_data_directory(args.root)).query([".xls"])
+    built = failed = 0
+    for f in files:
+        try:
+            ensure_sidecar(f["full_path"])
+            built += 1
+        except Exception as e:
+            failed += 1
+            print(f"[skip] {f['relative_path']}: {e}")
+    print(f"完成: {built} 个缓存, {failed} 个失败")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,8 @@ import sys
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import numpy as np
+from geoalchemy2 import WKTElement
 from sqlalchemy import select
 
 # 添加 backend 到 path
@@ -24,6 +26,7 @@ from app.models import (
     SensorReading,
     HydrologicalStation,
 )
+from app.utils.hydraulics import HydraulicTable
 
 # 模拟站点配置
 SIMULATED_STATIONS = [
@@ -32,27 +35,37 @@ SIMULATED_STATIONS = [
         "name": "板房沟水文站",
         "river_name": "板房沟",
         "basin_name": "乌鲁木齐河流域",
-        "base_flow": 0.8,  # 基准流量 m³/s
         "base_velocity": 0.6,  # 基准流速 m/s
         "base_level": 0.15,  # 基准水位 m
+        # 梯形断面：底宽 m、边坡 1:m、岸高 m、断面起点 (EPSG:4549)
+        "bottom_width": 8.0,
+        "side_slope": 1.5,
+        "bank_height": 1.5,
+        "origin": (533200.0, 4822400.0),
     },
     {
         "code": "HYC",
         "name": "红雁池水文站",
         "river_name": "乌鲁木齐河",
         "basin_name": "乌鲁木齐河流域",
-        "base_flow": 1.2,
         "base_velocity": 0.7,
         "base_level": 0.2,
+        "bottom_width": 8.2,
+        "side_slope": 1.5,
+        "bank_height": 2.0,
+        "origin": (540800.0, 4840100.0),
     },
     {
         "code": "WLB",
         "name": "乌拉泊水文站",
         "river_name": "乌拉泊河",
         "basin_name": "乌鲁木齐河流域",
-        "base_flow": 0.5,
         "base_velocity": 0.45,
         "base_level": 0.12,
+        "bottom_width": 9.0,
+        "side_slope": 1.5,
+        "bank_height": 1.2,
+        "origin": (545600.0, 4831700.0),
     },
 ]
 
@@ -64,6 +77,23 @@ METRICS_CONFIG = {
     "surface_elevation": {"name_cn": "水面高程", "unit": "m"},
 }
 
+# 断面高程以水尺零点为 0，水尺零点高程（假设）
+DATUM_ELEVATION = 2130.0
+
+
+def section_coords(config: dict) -> np.ndarray:
+    """梯形断面顶点 (x, y, z)，沿 x 方向横跨河道"""
+    width, slope, bank = config["bottom_width"], config["side_slope"], config["bank_height"]
+    offsets = np.array([0.0, slope * bank, slope * bank + width, 2 * slope * bank + width])
+    bed = np.array([bank, 0.0, 0.0, bank])
+    x0, y0 = config["origin"]
+    return np.column_stack([x0 + offsets, np.full(4, y0), bed])
+
+
+def section_wkt(coords: np.ndarray) -> WKTElement:
+    points = ", ".join(f"{x:.3f} {y:.3f} {z:.3f}" for x, y, z in coords)
+    return WKTElement(f"LINESTRING Z ({points})", srid=4549)
+
 
 async def get_or_create_sensor_type(session, code: str, name: str) -> SensorType:
     """获取或创建传感器类型"""
@@ -132,7 +162,10 @@ async def get_or_create_station(session, facility: MonitoringFacility, config: d
             is_simulated=True,
         )
         session.add(station)
-        await session.flush()
+    if station.cross_section is None:
+        station.cross_section = section_wkt(section_coords(config))
+        station.datum_elevation = DATUM_ELEVATION
+    await session.flush()
     return station
 
 
@@ -188,7 +221,8 @@ def generate_readings(
     days: int = 7,
     interval_minutes: int = 5,
 ) -> list[SensorReading]:
-    """生成模拟读数"""
+    """生成模拟读数；流量由流速 × 断面过水面积计算，与水位、断面几何一致"""
+    table = HydraulicTable.from_coords(section_coords(config))
     readings = []
     now = datetime.now()
     start_time = now - timedelta(days=days)
@@ -199,13 +233,10 @@ def generate_readings(
         hour = current_time.hour
         # 日变化因子：白天流量稍大
         day_factor = 1.0 + 0.1 * (1 - abs(hour - 12) / 12)
-        # 随机波动 ±10%
-        random_factor = random.uniform(0.9, 1.1)
-
-        flow_rate = config["base_flow"] * day_factor * random_factor
+        water_level = config["base_level"] * day_factor * random.uniform(0.9, 1.1)
         velocity = config["base_velocity"] * day_factor * random.uniform(0.95, 1.05)
-        water_level = config["base_level"] * random.uniform(0.9, 1.1)
-        surface_elevation = 2130 + water_level  # 假设基准高程 2130m
+        flow_rate = velocity * float(table.evaluate(water_level)["area"])
+        surface_elevation = DATUM_ELEVATION + water_level
 
         for metric_key, value in [
             ("water_level", water_level),